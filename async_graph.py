@@ -0,0 +1,91 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import metrics
+from async_utils import run_sync
+
+
+class AsyncGraphClient:
+    def __init__(self, uri="http://localhost:7474", username="neo4j", password="1",
+                 pool_size=4, timeout=10.0, graph_factory=None):
+        """asyncio front end that fans Cypher queries out over a bounded connection pool
+
+        py2neo is blocking, so each query runs on a worker thread holding one
+        pooled `Graph`; at most `pool_size` queries are in flight at once.
+        `graph_factory` builds a connection and defaults to py2neo's
+        `Graph(uri, auth=...)`, imported only when a connection is made.
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._graph_factory = graph_factory or (lambda: _connect(uri, (username, password)))
+        self._connections = queue.LifoQueue()
+        self._created = 0
+        self._create_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="cypher")
+
+    def _acquire(self):
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            pass
+        with self._create_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return self._graph_factory()
+        return self._connections.get()
+
+    def _release(self, graph):
+        self._connections.put(graph)
+
+    def _call_blocking(self, func, args, kwargs):
+        graph = self._acquire()
+        try:
+            return func(graph, *args, **kwargs)
+        finally:
+            self._release(graph)
+
+    def _run_blocking(self, graph, name, query, params):
+        with metrics.timer(f"cypher.async.{name}"):
+            return graph.run(query, **params).data()
+
+    async def call(self, func, *args, timeout=None, **kwargs):
+        """Run `func(graph, *args, **kwargs)` with a pooled connection; raises asyncio.TimeoutError after `timeout` seconds
+
+        A timed-out call is abandoned, not cancelled server-side: its worker
+        thread returns the connection to the pool once Neo4j answers.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._call_blocking, func, args, kwargs)
+        return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+
+    def call_sync(self, func, *args, timeout=None, **kwargs):
+        """Blocking wrapper around `call`, e.g. to bound a registered template with a timeout"""
+        return run_sync(self.call(func, *args, timeout=timeout, **kwargs))
+
+    async def run(self, query, name="query", timeout=None, **params):
+        """Run one query on the pool; raises asyncio.TimeoutError after `timeout` seconds"""
+        return await self.call(self._run_blocking, name, query, params, timeout=timeout)
+
+    async def run_many(self, queries, timeout=None, return_exceptions=False):
+        """Run independent `(name, query, params)` tuples concurrently, preserving order"""
+        tasks = [self.run(query, name=name, timeout=timeout, **params) for name, query, params in queries]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    def run_many_sync(self, queries, timeout=None, return_exceptions=False):
+        """Blocking wrapper around `run_many` for non-async callers"""
+        return run_sync(self.run_many(queries, timeout=timeout, return_exceptions=return_exceptions))
+
+    def close(self):
+        """Shut down worker threads; pooled connections are dropped"""
+        self._executor.shutdown(wait=True)
+        while not self._connections.empty():
+            self._connections.get_nowait()
+        self._created = 0
+
+
+def _connect(uri, auth):
+    from py2neo import Graph
+
+    return Graph(uri, auth=auth)
+
@@ -0,0 +1,29 @@
+import asyncio
+import threading
+
+
+def run_sync(coroutine):
+    """Run a coroutine to completion from synchronous code
+
+    Inside an already running event loop (e.g. a notebook) the coroutine is
+    run on a helper thread with its own loop instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result = {}
+
+    def target():
+        try:
+            result["value"] = asyncio.run(coroutine)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
@@ -0,0 +1,290 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import metrics
+from entity_resolution import canonical_id, course_key as make_course_key
+from jsonl_io import load_course_data
+
+# Header columns per node label, in neo4j-admin import notation; `uid` is
+# the same canonical ID the staged build merges on
+NODE_COLUMNS = {
+    "Course": ("uid:ID", "name", "description", "course_key", ":LABEL"),
+    "Chapter": ("uid:ID", "name", "description", "order:int", "course_key", ":LABEL"),
+    "Topic": ("uid:ID", "name", "description", "course_key", ":LABEL"),
+    "Resource": ("uid:ID", "name", "type", "url", "course_key", ":LABEL"),
+}
+
+RELATIONSHIP_TYPES = ("CONTAINS", "HAS_RESOURCE")
+RELATIONSHIP_COLUMNS = (":START_ID", ":END_ID", ":TYPE")
+
+
+def _shard_path(directory, kind, name, shard):
+    return os.path.join(directory, f"{kind}-{name}-{shard:05d}.csv")
+
+
+def _header_path(directory, name):
+    return os.path.join(directory, f"{name}_header.csv")
+
+
+def _write_shard(task):
+    """Write the node and relationship shards for a run of chapters; runs in a worker process
+
+    IDs are derived from names and parent IDs, so every worker computes the
+    same ID for a parent without asking anyone else.
+    """
+    directory, shard, key, course_uid, chapters = task
+    rows = {name: [] for name in (*NODE_COLUMNS, *RELATIONSHIP_TYPES)}
+    seen = set()
+
+    def add(label, name, parent_uid, rel_type, values):
+        uid = canonical_id(label, name, parent_uid)
+        if uid in seen:
+            return uid
+        seen.add(uid)
+        rows[label].append((uid, name, *values, key, label))
+        rows[rel_type].append((parent_uid, uid, rel_type))
+        return uid
+
+    for chapter in chapters:
+        chapter_uid = add("Chapter", chapter["name"], course_uid, "CONTAINS",
+                          (chapter.get("description"), chapter.get("order")))
+        for topic in chapter["topics"]:
+            topic_uid = add("Topic", topic["name"], chapter_uid, "CONTAINS", (topic.get("description"),))
+            for resource in topic.get("resources", []):
+                add("Resource", resource["name"], topic_uid, "HAS_RESOURCE",
+                    (resource.get("type"), resource.get("url")))
+
+    files = {}
+    for name, name_rows in rows.items():
+        if not name_rows or name == "Course":
+            continue
+        kind = "nodes" if name in NODE_COLUMNS else "relationships"
+        path = _shard_path(directory, kind, name, shard)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(name_rows)
+        files[name] = (path, len(name_rows))
+    return files
+
+
+class BulkExporter:
+    def __init__(self, output_dir="data/import", shard_rows=200000, max_workers=None):
+        """Offline import files for `neo4j-admin database import full`
+
+        Each label and relationship type gets a header file plus data shards
+        of roughly `shard_rows` rows, written in parallel by worker processes.
+        Shards are cut on chapter boundaries, and node IDs are the canonical
+        IDs of the staged build (`canonical_id` of label, name and parent
+        ID), so the same input always produces the same files. A
+        `manifest.json` records the files and row counts, which
+        `validate()` checks against the data and `verify_import()` against
+        the imported database.
+        """
+        self.output_dir = output_dir
+        self.shard_rows = shard_rows
+        self.max_workers = max_workers
+        self.manifest_file = os.path.join(output_dir, "manifest.json")
+
+    def _plan(self, course, chapters, next_shard):
+        """Split a course into shard tasks of whole chapters"""
+        key = course.get("key") or make_course_key(course["name"])
+        course_uid = canonical_id("Course", course["name"], None)
+        # Repeated chapters share an ID, so they must land in the same shard
+        groups = {}
+        for chapter in chapters:
+            groups.setdefault(canonical_id("Chapter", chapter["name"], course_uid), []).append(chapter)
+        tasks, chapters, size = [], [], 0
+        for group in groups.values():
+            chapters.extend(group)
+            size += sum(1 + sum(1 + len(topic.get("resources", [])) for topic in chapter["topics"])
+                        for chapter in group)
+            if size >= self.shard_rows:
+                tasks.append((self.output_dir, next_shard + len(tasks), key, course_uid, chapters))
+                chapters, size = [], 0
+        if chapters:
+            tasks.append((self.output_dir, next_shard + len(tasks), key, course_uid, chapters))
+        course_row = (course_uid, course["name"], course.get("description"), key, "Course")
+        return course_row, tasks
+
+    def _write_headers(self):
+        for label, columns in NODE_COLUMNS.items():
+            with open(_header_path(self.output_dir, label), 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerow(columns)
+        for rel_type in RELATIONSHIP_TYPES:
+            with open(_header_path(self.output_dir, rel_type), 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerow(RELATIONSHIP_COLUMNS)
+
+    def _clear(self):
+        """Remove the files of the previous export, and nothing else
+
+        A non-empty directory without a manifest was not written by an
+        export, so it is refused rather than cleared.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not os.path.exists(self.manifest_file):
+            if os.listdir(self.output_dir):
+                raise ValueError(f"{self.output_dir} is not empty and has no manifest.json; "
+                                 f"export to an empty directory")
+            return
+        manifest = self.load_manifest()
+        paths = [_header_path(self.output_dir, name) for name in manifest["files"]]
+        paths += [path for name_paths in manifest["files"].values() for path in name_paths]
+        directory = os.path.abspath(self.output_dir)
+        for path in paths:
+            # Only files inside the export directory, whatever the manifest says
+            if os.path.dirname(os.path.abspath(path)) == directory and os.path.exists(path):
+                os.remove(path)
+
+    def export(self, sources):
+        """Write import files for course data files or in-memory course data; returns the manifest"""
+        self._clear()
+        self._write_headers()
+        # The same course from several sources is one course node with all their chapters
+        courses = {}
+        for source in sources:
+            course_data = source if isinstance(source, dict) else load_course_data(source)
+            course = course_data["course"]
+            entry = courses.setdefault(canonical_id("Course", course["name"], None), (course, []))
+            entry[1].extend(course_data["chapters"])
+        course_rows, tasks = [], []
+        for course, chapters in courses.values():
+            course_row, course_tasks = self._plan(course, chapters, len(tasks))
+            course_rows.append(course_row)
+            tasks.extend(course_tasks)
+
+        files = {name: [] for name in (*NODE_COLUMNS, *RELATIONSHIP_TYPES)}
+        counts = dict.fromkeys(files, 0)
+        course_path = _shard_path(self.output_dir, "nodes", "Course", 0)
+        with open(course_path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(course_rows)
+        files["Course"].append(course_path)
+        counts["Course"] = len(course_rows)
+
+        with metrics.timer("bulk_import.export"), ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for shard_files in executor.map(_write_shard, tasks):
+                for name, (path, rows) in shard_files.items():
+                    files[name].append(path)
+                    counts[name] += rows
+        metrics.increment("bulk_import.shards", len(tasks))
+
+        manifest = {
+            "nodes": {label: counts[label] for label in NODE_COLUMNS},
+            "relationships": {rel_type: counts[rel_type] for rel_type in RELATIONSHIP_TYPES},
+            "files": {name: sorted(paths) for name, paths in files.items()},
+            "shards": len(tasks),
+        }
+        manifest["command"] = self.import_command(manifest)
+        temp_file = self.manifest_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.manifest_file)
+        print(f"Wrote {sum(manifest['nodes'].values())} nodes and {sum(manifest['relationships'].values())} "
+              f"relationships in {len(tasks)} shards to {self.output_dir}")
+        return manifest
+
+    def import_command(self, manifest, database="neo4j"):
+        """The `neo4j-admin` command line that loads the exported files into an empty database"""
+        args = ["neo4j-admin", "database", "import", "full"]
+        for label in NODE_COLUMNS:
+            if manifest["files"][label]:
+                args.append(f"--nodes={label}=" + ",".join([_header_path(self.output_dir, label)] + manifest["files"][label]))
+        for rel_type in RELATIONSHIP_TYPES:
+            if manifest["files"][rel_type]:
+                args.append(f"--relationships={rel_type}=" +
+                            ",".join([_header_path(self.output_dir, rel_type)] + manifest["files"][rel_type]))
+        args += ["--multiline-fields=true", database]
+        return " ".join(args)
+
+    def load_manifest(self):
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def validate(self, sources=None):
+        """Check the shards on disk without Neo4j; returns a list of problems (empty if valid)
+
+        Every row must have as many fields as its header, node IDs must be
+        unique, every relationship must connect exported nodes, and row
+        counts must match the manifest and, with `sources`, the distinct
+        entities in the course data.
+        """
+        manifest = self.load_manifest()
+        problems = []
+        node_ids = set()
+        counts = {}
+        for name, paths in manifest["files"].items():
+            with open(_header_path(self.output_dir, name), 'r', encoding='utf-8', newline='') as f:
+                width = len(next(csv.reader(f)))
+            counts[name] = 0
+            for path in paths:
+                with open(path, 'r', encoding='utf-8', newline='') as f:
+                    for line_number, row in enumerate(csv.reader(f), 1):
+                        counts[name] += 1
+                        if len(row) != width:
+                            problems.append(f"{path}:{line_number}: {len(row)} fields, header has {width}")
+                        if name in NODE_COLUMNS:
+                            if row[0] in node_ids:
+                                problems.append(f"{path}:{line_number}: duplicate ID {row[0]}")
+                            node_ids.add(row[0])
+
+        for rel_type in RELATIONSHIP_TYPES:
+            for path in manifest["files"][rel_type]:
+                with open(path, 'r', encoding='utf-8', newline='') as f:
+                    for line_number, row in enumerate(csv.reader(f), 1):
+                        missing = [uid for uid in row[:2] if uid not in node_ids]
+                        if missing:
+                            problems.append(f"{path}:{line_number}: unknown node IDs {missing}")
+
+        expected = {**manifest["nodes"], **manifest["relationships"]}
+        if sources is not None:
+            expected_from_data = self.expected_counts(sources)
+            for name, count in expected_from_data.items():
+                if expected[name] != count:
+                    problems.append(f"{name}: manifest has {expected[name]} rows, course data has {count}")
+        for name, count in expected.items():
+            if counts.get(name, 0) != count:
+                problems.append(f"{name}: {counts.get(name, 0)} rows on disk, manifest has {count}")
+        return problems
+
+    @staticmethod
+    def expected_counts(sources):
+        """Distinct nodes per label and relationships per type in course data"""
+        seen = {label: set() for label in NODE_COLUMNS}
+        for source in sources:
+            course_data = source if isinstance(source, dict) else load_course_data(source)
+            course = course_data["course"]
+            course_uid = canonical_id("Course", course["name"], None)
+            seen["Course"].add(course_uid)
+            for chapter in course_data["chapters"]:
+                chapter_uid = canonical_id("Chapter", chapter["name"], course_uid)
+                seen["Chapter"].add(chapter_uid)
+                for topic in chapter["topics"]:
+                    topic_uid = canonical_id("Topic", topic["name"], chapter_uid)
+                    seen["Topic"].add(topic_uid)
+                    seen["Resource"].update(canonical_id("Resource", resource["name"], topic_uid)
+                                            for resource in topic.get("resources", []))
+        counts = {label: len(uids) for label, uids in seen.items()}
+        # Every node but a course hangs off exactly one parent
+        counts["CONTAINS"] = counts["Chapter"] + counts["Topic"]
+        counts["HAS_RESOURCE"] = counts["Resource"]
+        return counts
+
+    def verify_import(self, kg):
+        """Compare node and relationship counts in Neo4j with the manifest; returns a list of mismatches"""
+        manifest = self.load_manifest()
+        nodes = {row["label"]: row["count"] for row in kg.query("bulk_node_counts")}
+        relationships = {row["type"]: row["count"] for row in kg.query("bulk_relationship_counts")}
+        problems = []
+        for label, count in manifest["nodes"].items():
+            if nodes.get(label, 0) != count:
+                problems.append(f"{label}: {nodes.get(label, 0)} nodes in Neo4j, {count} exported")
+        for rel_type, count in manifest["relationships"].items():
+            if relationships.get(rel_type, 0) != count:
+                problems.append(f"{rel_type}: {relationships.get(rel_type, 0)} relationships in Neo4j, {count} exported")
+        if problems:
+            print("Import verification failed:")
+            for problem in problems:
+                print(f"- {problem}")
+        else:
+            print(f"Import verified: {sum(manifest['nodes'].values())} nodes and "
+                  f"{sum(manifest['relationships'].values())} relationships")
+        return problems
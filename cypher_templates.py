@@ -0,0 +1,634 @@
+import json
+import os
+import threading
+import time
+from instrumentation import metrics
+
+
+class CypherTemplate:
+    __slots__ = ("name", "query", "batched")
+
+    def __init__(self, name, query, batched=None):
+        """A named, parameterised Cypher statement
+
+        `batched`, if given, is the same lookup over a list: it takes
+        `$keys`, UNWINDs them and returns each row with a `key` column, so
+        many lookups share one round trip and one cached plan.
+        """
+        self.name = name
+        self.query = query
+        self.batched = batched
+
+    def __repr__(self):
+        return f"CypherTemplate({self.name!r})"
+
+
+def _plan_db_hits(plan):
+    """Total db hits of a profiled plan tree (py2neo ProfiledPlan or plain dict)"""
+    if plan is None:
+        return None
+    if isinstance(plan, dict):
+        hits = plan.get("dbHits", plan.get("db_hits", 0)) or 0
+        children = plan.get("children", [])
+    else:
+        hits = getattr(plan, "db_hits", 0) or 0
+        children = getattr(plan, "children", [])
+    return hits + sum(_plan_db_hits(child) or 0 for child in children)
+
+
+class CypherRegistry:
+    def __init__(self):
+        """Central set of Cypher templates, looked up by name
+
+        Query text never varies between calls, only parameters do, so
+        Neo4j compiles each template once and reuses the cached plan.
+        Labels and relationship types stay fixed in the text; values are
+        always passed as `$parameters`. With `profiling` on (or `profile=True`
+        for one call), templates are prefixed with `PROFILE` and their db
+        hits collected per name in `profiles`.
+        """
+        self.templates = {}
+        self.profiling = False
+        self.profiles = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, query, batched=None):
+        if name in self.templates:
+            raise ValueError(f"Cypher template {name} is already registered")
+        self.templates[name] = CypherTemplate(name, query, batched)
+        return self.templates[name]
+
+    def __getitem__(self, name):
+        return self.templates[name]
+
+    def __contains__(self, name):
+        return name in self.templates
+
+    def __iter__(self):
+        return iter(self.templates.values())
+
+    def run(self, graph, name, profile=False, **params):
+        """Run a template on a py2neo `Graph`, timed as `cypher.<name>`"""
+        return self._run(graph, name, self.templates[name].query, profile, params)
+
+    def stream(self, graph, name, **params):
+        """Run a template and return its result cursor, to read a large result record by record"""
+        return graph.run(self.templates[name].query, **params)
+
+    def run_batch(self, graph, name, keys, profile=False, **params):
+        """Run the batched variant for many keys at once; returns `{key: rows}` in key order"""
+        query, keys = self.batch_query(name, keys)
+        if not keys:
+            return {}
+        return self.group_rows(keys, self._run(graph, f"{name}.batch", query, profile, dict(params, keys=keys)))
+
+    def batch_query(self, name, keys):
+        """Batched variant of a template and the distinct keys to pass as `$keys`"""
+        template = self.templates[name]
+        if template.batched is None:
+            raise ValueError(f"Cypher template {name} has no batched variant")
+        return template.batched, list(dict.fromkeys(keys))
+
+    @staticmethod
+    def group_rows(keys, rows):
+        """Rows of a batched template as `{key: rows}` in key order"""
+        grouped = {key: [] for key in keys}
+        for row in rows:
+            grouped[row.pop("key")].append(row)
+        return grouped
+
+    def _run(self, graph, name, query, profile, params):
+        profile = profile or self.profiling
+        with metrics.timer(f"cypher.{name}"):
+            cursor = graph.run("PROFILE " + query if profile else query, **params)
+            result = cursor.data()
+        metrics.increment(f"cypher.{name}.rows", len(result))
+        if profile:
+            self._record_profile(name, _plan_db_hits(cursor.plan()), len(result))
+        return result
+
+    def _record_profile(self, name, db_hits, rows):
+        with self._lock:
+            entry = self.profiles.setdefault(name, {"calls": 0, "db_hits": 0, "max_db_hits": 0, "rows": 0})
+            entry["calls"] += 1
+            entry["rows"] += rows
+            if db_hits is not None:
+                entry["db_hits"] += db_hits
+                entry["max_db_hits"] = max(entry["max_db_hits"], db_hits)
+            entry["last_profiled"] = time.time()
+
+    def export_profiles(self, file_path="data/cypher_profiles.json"):
+        """Write the collected db-hit counts per template to a JSON file"""
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            profiles = {name: dict(entry, mean_db_hits=entry["db_hits"] / entry["calls"])
+                        for name, entry in self.profiles.items()}
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, ensure_ascii=False, indent=2)
+        return file_path
+
+
+CYPHER = CypherRegistry()
+
+# Whole-graph lookups
+
+CYPHER.register("query_course_info", """
+MATCH (c:Course)
+RETURN c.name AS course_name, c.description AS course_description
+LIMIT 2
+""")
+
+CYPHER.register("query_chapters", """
+MATCH (c:Chapter)
+RETURN c.name AS chapter_name, c.description AS chapter_description, c.order AS chapter_order
+ORDER BY c.order
+""")
+
+CYPHER.register("query_topics_by_chapter", """
+MATCH (c:Chapter {name: $chapter_name})-[:CONTAINS]->(t:Topic)
+RETURN t.name AS topic_name, t.description AS topic_description
+""", batched="""
+UNWIND $keys AS key
+MATCH (c:Chapter {name: key})-[:CONTAINS]->(t:Topic)
+RETURN key, t.name AS topic_name, t.description AS topic_description
+""")
+
+CYPHER.register("query_resources_by_topic", """
+MATCH (t:Topic {name: $topic_name})-[:HAS_RESOURCE]->(r:Resource)
+RETURN r.name AS resource_name, r.type AS resource_type, r.url AS resource_url, r.link_ok AS link_ok
+""", batched="""
+UNWIND $keys AS key
+MATCH (t:Topic {name: key})-[:HAS_RESOURCE]->(r:Resource)
+RETURN key, r.name AS resource_name, r.type AS resource_type, r.url AS resource_url, r.link_ok AS link_ok
+""")
+
+CYPHER.register("indexed_nodes", """
+MATCH (n) WHERE n:Course OR n:Chapter OR n:Topic OR n:Resource
+RETURN id(n) AS id, labels(n)[0] AS label, n.name AS name, n.description AS description, n.type AS type, n.url AS url
+""")
+
+CYPHER.register("hierarchy_nodes", """
+MATCH (n) WHERE n:Course OR n:Chapter OR n:Topic OR n:Resource
+RETURN id(n) AS id, labels(n)[0] AS label, n.name AS name, n.order AS order
+ORDER BY id(n)
+""")
+
+CYPHER.register("hierarchy_edges", """
+MATCH (p)-[:CONTAINS|HAS_RESOURCE]->(c)
+RETURN id(p) AS parent, id(c) AS child
+ORDER BY id(c)
+""")
+
+# Course-anchored variants: every node carries its course's `course_key`, and
+# lookups seek the (course_key, name) index or walk down from one Course node,
+# so their cost depends on the size of that course, not of the whole graph.
+
+CYPHER.register("list_courses", """
+MATCH (c:Course)
+RETURN c.course_key AS course_key, c.name AS course_name, c.description AS course_description
+ORDER BY c.name
+""")
+
+CYPHER.register("course_info_by_key", """
+MATCH (c:Course {course_key: $course_key})
+RETURN c.name AS course_name, c.description AS course_description
+""")
+
+CYPHER.register("chapters_by_course", """
+MATCH (c:Chapter {course_key: $course_key})
+RETURN c.name AS chapter_name, c.description AS chapter_description, c.order AS chapter_order
+ORDER BY c.order
+""")
+
+CYPHER.register("course_topics_by_chapter", """
+MATCH (c:Chapter {course_key: $course_key, name: $chapter_name})-[:CONTAINS]->(t:Topic)
+RETURN t.name AS topic_name, t.description AS topic_description
+""", batched="""
+UNWIND $keys AS key
+MATCH (c:Chapter {course_key: $course_key, name: key})-[:CONTAINS]->(t:Topic)
+RETURN key, t.name AS topic_name, t.description AS topic_description
+""")
+
+CYPHER.register("course_resources_by_topic", """
+MATCH (t:Topic {course_key: $course_key, name: $topic_name})-[:HAS_RESOURCE]->(r:Resource)
+RETURN r.name AS resource_name, r.type AS resource_type, r.url AS resource_url, r.link_ok AS link_ok
+""", batched="""
+UNWIND $keys AS key
+MATCH (t:Topic {course_key: $course_key, name: key})-[:HAS_RESOURCE]->(r:Resource)
+RETURN key, r.name AS resource_name, r.type AS resource_type, r.url AS resource_url, r.link_ok AS link_ok
+""")
+
+CYPHER.register("course_indexed_nodes", """
+MATCH (:Course {course_key: $course_key})-[:CONTAINS|HAS_RESOURCE*0..]->(n)
+RETURN id(n) AS id, labels(n)[0] AS label, n.name AS name, n.description AS description, n.type AS type, n.url AS url
+""")
+
+CYPHER.register("course_hierarchy_nodes", """
+MATCH (:Course {course_key: $course_key})-[:CONTAINS|HAS_RESOURCE*0..]->(n)
+RETURN id(n) AS id, labels(n)[0] AS label, n.name AS name, n.order AS order
+ORDER BY id(n)
+""")
+
+CYPHER.register("course_hierarchy_edges", """
+MATCH (:Course {course_key: $course_key})-[:CONTAINS|HAS_RESOURCE*0..]->(p)-[:CONTAINS|HAS_RESOURCE]->(c)
+RETURN id(p) AS parent, id(c) AS child
+ORDER BY id(c)
+""")
+
+# Course partition writes
+
+CYPHER.register("delete_course", """
+MATCH (co:Course {course_key: $course_key})
+OPTIONAL MATCH (co)-[:CONTAINS|HAS_RESOURCE*]->(n)
+DETACH DELETE co, n
+""")
+
+CYPHER.register("load_course", """
+CREATE (:Course {course_key: $course_key, name: $name, description: $description, build_version: $build_version})
+""")
+
+# Every load stamps its Course with a fresh `build_version`, so the MySQL
+# sync can tell that a partition was rebuilt and lost its `mysql_id`s
+CYPHER.register("course_build_versions", """
+MATCH (c:Course)
+WHERE c.build_version IS NOT NULL
+RETURN c.course_key AS course_key, c.build_version AS version
+""")
+
+CYPHER.register("load_chapters", """
+MATCH (co:Course {course_key: $course_key})
+UNWIND $rows AS row
+CREATE (co)-[:CONTAINS]->(:Chapter {course_key: $course_key, name: row.name,
+                                   description: row.description, order: row.order})
+""")
+
+CYPHER.register("load_topics", """
+UNWIND $rows AS row
+MATCH (c:Chapter {course_key: $course_key, name: row.chapter})
+CREATE (c)-[:CONTAINS]->(:Topic {course_key: $course_key, name: row.name, description: row.description})
+""")
+
+CYPHER.register("load_resources", """
+UNWIND $rows AS row
+MATCH (:Chapter {course_key: $course_key, name: row.chapter})-[:CONTAINS]->(t:Topic {name: row.topic})
+CREATE (t)-[:HAS_RESOURCE]->(:Resource {course_key: $course_key, name: row.name, type: row.type, url: row.url})
+""")
+
+# Promotion of a staged build (staged_build.py), in bounded batches: the old
+# partition's chapters, topics and resources are deleted, the staged ones
+# relabelled, and finally the Course node is swapped in one statement.
+# Nodes of the build being promoted are never deleted, so a batch can be rerun.
+
+CYPHER.register("promote_delete_chapters", """
+MATCH (n:Chapter {course_key: $course_key})
+WHERE coalesce(n.build_version, '') <> $version
+WITH n LIMIT $limit
+DETACH DELETE n
+RETURN count(*) AS done
+""")
+
+CYPHER.register("promote_delete_topics", """
+MATCH (n:Topic {course_key: $course_key})
+WHERE coalesce(n.build_version, '') <> $version
+WITH n LIMIT $limit
+DETACH DELETE n
+RETURN count(*) AS done
+""")
+
+CYPHER.register("promote_delete_resources", """
+MATCH (n:Resource {course_key: $course_key})
+WHERE coalesce(n.build_version, '') <> $version
+WITH n LIMIT $limit
+DETACH DELETE n
+RETURN count(*) AS done
+""")
+
+CYPHER.register("promote_relabel_chapters", """
+MATCH (n:StagedChapter {build_version: $version})
+WITH n LIMIT $limit
+REMOVE n:StagedChapter
+SET n:Chapter
+RETURN count(*) AS done
+""")
+
+CYPHER.register("promote_relabel_topics", """
+MATCH (n:StagedTopic {build_version: $version})
+WITH n LIMIT $limit
+REMOVE n:StagedTopic
+SET n:Topic
+RETURN count(*) AS done
+""")
+
+CYPHER.register("promote_relabel_resources", """
+MATCH (n:StagedResource {build_version: $version})
+WITH n LIMIT $limit
+REMOVE n:StagedResource
+SET n:Resource
+RETURN count(*) AS done
+""")
+
+CYPHER.register("promote_swap_course", """
+MATCH (n:StagedCourse {build_version: $version})
+OPTIONAL MATCH (old:Course {course_key: $course_key})
+WHERE coalesce(old.build_version, '') <> $version
+DETACH DELETE old
+WITH DISTINCT n
+REMOVE n:StagedCourse
+SET n:Course
+RETURN count(n) AS done
+""")
+
+# One-off migration of nodes created before course partitions (no `course_key`)
+
+CYPHER.register("unkeyed_courses", """
+MATCH (c:Course)
+WHERE c.course_key IS NULL
+RETURN id(c) AS id, c.name AS name
+""")
+
+CYPHER.register("key_unkeyed_course", """
+MATCH (c:Course)
+WHERE id(c) = $id
+OPTIONAL MATCH (c)-[:CONTAINS|HAS_RESOURCE*]->(n)
+WHERE n.course_key IS NULL
+WITH c, collect(DISTINCT n) AS nodes
+SET c.course_key = $course_key
+FOREACH (n IN nodes | SET n.course_key = $course_key)
+RETURN size(nodes) AS keyed
+""")
+
+CYPHER.register("delete_unkeyed_course", """
+MATCH (c:Course)
+WHERE id(c) = $id
+OPTIONAL MATCH (c)-[:CONTAINS|HAS_RESOURCE*]->(n)
+WHERE n.course_key IS NULL
+DETACH DELETE c, n
+""")
+
+CYPHER.register("delete_unkeyed_nodes", """
+MATCH (n)
+WHERE (n:Course OR n:Chapter OR n:Topic OR n:Resource) AND n.course_key IS NULL
+DETACH DELETE n
+RETURN count(*) AS deleted
+""")
+
+# Graph built by intelligent_data_engineering_kg.py, which links with 包含
+
+CYPHER.register("legacy_course", """
+MATCH (c:Course)
+RETURN c.name AS name, c.description AS description
+LIMIT 1
+""")
+
+CYPHER.register("legacy_chapters", """
+MATCH (c:Chapter)
+RETURN c.name AS name, c.description AS description
+""")
+
+CYPHER.register("legacy_topics_by_chapter", """
+MATCH (c:Chapter {name: $chapter_name})-[:`包含`]->(t:Topic)
+RETURN t.name AS name
+""", batched="""
+UNWIND $keys AS key
+MATCH (c:Chapter {name: key})-[:`包含`]->(t:Topic)
+RETURN key, t.name AS name
+""")
+
+# Counts checked after an offline neo4j-admin import
+
+CYPHER.register("bulk_node_counts", """
+MATCH (n) WHERE n:Course OR n:Chapter OR n:Topic OR n:Resource
+RETURN labels(n)[0] AS label, count(*) AS count
+""")
+
+CYPHER.register("bulk_relationship_counts", """
+MATCH ()-[r:CONTAINS|HAS_RESOURCE]->()
+RETURN type(r) AS type, count(r) AS count
+""")
+
+# Indexes, one fixed statement per label
+
+for _label in ("Course", "Chapter", "Topic", "Resource"):
+    CYPHER.register(f"partition_index_{_label.lower()}", f"""
+CREATE INDEX {_label.lower()}_course_key IF NOT EXISTS FOR (n:{_label}) ON (n.course_key, n.name)
+""")
+    CYPHER.register(f"partition_key_index_{_label.lower()}", f"""
+CREATE INDEX {_label.lower()}_partition IF NOT EXISTS FOR (n:{_label}) ON (n.course_key)
+""")
+    CYPHER.register(f"sync_index_{_label.lower()}", f"""
+CREATE INDEX {_label.lower()}_mysql_id IF NOT EXISTS FOR (n:{_label}) ON (n.mysql_id)
+""")
+    CYPHER.register(f"staged_index_{_label.lower()}", f"""
+CREATE INDEX staged{_label.lower()}_uid IF NOT EXISTS FOR (n:Staged{_label}) ON (n.uid)
+""")
+    CYPHER.register(f"staged_clear_{_label.lower()}", f"""
+MATCH (n:Staged{_label} {{course_key: $course_key}})
+WHERE n.build_version <> $version OR $version IS NULL
+DETACH DELETE n
+""")
+del _label
+
+# Staged build (staged_build.py): idempotent batch upserts keyed by `uid`
+
+CYPHER.register("staged_upsert_course", """
+UNWIND $rows AS row
+MERGE (n:StagedCourse {uid: row.uid})
+SET n += row.properties, n.build_version = $version
+""")
+
+CYPHER.register("staged_upsert_chapter", """
+UNWIND $rows AS row
+MERGE (n:StagedChapter {uid: row.uid})
+SET n += row.properties, n.build_version = $version
+WITH n, row
+MATCH (p:StagedCourse {uid: row.parent_uid})
+MERGE (p)-[:CONTAINS]->(n)
+""")
+
+CYPHER.register("staged_upsert_topic", """
+UNWIND $rows AS row
+MERGE (n:StagedTopic {uid: row.uid})
+SET n += row.properties, n.build_version = $version
+WITH n, row
+MATCH (p:StagedChapter {uid: row.parent_uid})
+MERGE (p)-[:CONTAINS]->(n)
+""")
+
+CYPHER.register("staged_upsert_resource", """
+UNWIND $rows AS row
+MERGE (n:StagedResource {uid: row.uid})
+SET n += row.properties, n.build_version = $version
+WITH n, row
+MATCH (p:StagedTopic {uid: row.parent_uid})
+MERGE (p)-[:HAS_RESOURCE]->(n)
+""")
+
+CYPHER.register("staged_live_version", """
+MATCH (c:Course {course_key: $course_key})
+RETURN c.build_version AS version
+""")
+
+# MySQL sync (graph_sync.py): upserts keyed by `mysql_id`. A child drops the
+# link to a previous parent before attaching to its current one; a course
+# keeps the partition key it got when it first arrived, so renames keep it.
+
+CYPHER.register("sync_upsert_courses", """
+UNWIND $rows AS row
+MERGE (n:Course {mysql_id: row.id})
+SET n.name = row.name, n.description = row.description
+SET n.course_key = coalesce(n.course_key, row.course_key)
+""")
+
+CYPHER.register("sync_upsert_chapters", """
+UNWIND $rows AS row
+MERGE (n:Chapter {mysql_id: row.id})
+SET n.name = row.name, n.description = row.description, n.order = row.order
+WITH n, row
+OPTIONAL MATCH (old:Course)-[r:CONTAINS]->(n)
+WHERE old.mysql_id <> row.parent_id OR row.parent_id IS NULL
+DELETE r
+WITH DISTINCT n, row
+WHERE row.parent_id IS NOT NULL
+MERGE (p:Course {mysql_id: row.parent_id})
+MERGE (p)-[:CONTAINS]->(n)
+SET n.course_key = p.course_key
+""")
+
+CYPHER.register("sync_upsert_topics", """
+UNWIND $rows AS row
+MERGE (n:Topic {mysql_id: row.id})
+SET n.name = row.name, n.description = row.description
+WITH n, row
+OPTIONAL MATCH (old:Chapter)-[r:CONTAINS]->(n)
+WHERE old.mysql_id <> row.parent_id OR row.parent_id IS NULL
+DELETE r
+WITH DISTINCT n, row
+WHERE row.parent_id IS NOT NULL
+MERGE (p:Chapter {mysql_id: row.parent_id})
+MERGE (p)-[:CONTAINS]->(n)
+SET n.course_key = p.course_key
+""")
+
+CYPHER.register("sync_upsert_resources", """
+UNWIND $rows AS row
+MERGE (n:Resource {mysql_id: row.id})
+SET n.name = row.name, n.type = row.type, n.url = row.url
+WITH n, row
+OPTIONAL MATCH (old:Topic)-[r:HAS_RESOURCE]->(n)
+WHERE old.mysql_id <> row.parent_id OR row.parent_id IS NULL
+DELETE r
+WITH DISTINCT n, row
+WHERE row.parent_id IS NOT NULL
+MERGE (p:Topic {mysql_id: row.parent_id})
+MERGE (p)-[:HAS_RESOURCE]->(n)
+SET n.course_key = p.course_key
+""")
+
+# Backfill: give nodes built without MySQL the `mysql_id` of their row,
+# matched on course key and name for a course, on name under the already
+# mapped parent for everything else
+
+CYPHER.register("sync_backfill_courses", """
+UNWIND $rows AS row
+MATCH (n:Course {name: row.name})
+WHERE n.mysql_id IS NULL AND coalesce(n.course_key, row.course_key) = row.course_key
+WITH row, head(collect(n)) AS n
+SET n.mysql_id = row.id, n.course_key = coalesce(n.course_key, row.course_key)
+RETURN count(n) AS mapped
+""")
+
+CYPHER.register("sync_backfill_chapters", """
+UNWIND $rows AS row
+MATCH (:Course {mysql_id: row.parent_id})-[:CONTAINS]->(n:Chapter {name: row.name})
+WHERE n.mysql_id IS NULL
+WITH row, head(collect(n)) AS n
+SET n.mysql_id = row.id
+RETURN count(n) AS mapped
+""")
+
+CYPHER.register("sync_backfill_topics", """
+UNWIND $rows AS row
+MATCH (:Chapter {mysql_id: row.parent_id})-[:CONTAINS]->(n:Topic {name: row.name})
+WHERE n.mysql_id IS NULL
+WITH row, head(collect(n)) AS n
+SET n.mysql_id = row.id
+RETURN count(n) AS mapped
+""")
+
+CYPHER.register("sync_backfill_resources", """
+UNWIND $rows AS row
+MATCH (:Topic {mysql_id: row.parent_id})-[:HAS_RESOURCE]->(n:Resource {name: row.name})
+WHERE n.mysql_id IS NULL
+WITH row, head(collect(n)) AS n
+SET n.mysql_id = row.id
+RETURN count(n) AS mapped
+""")
+
+# A tombstone removes the whole subtree: cascaded child deletes fire no trigger
+
+CYPHER.register("sync_delete_courses", """
+UNWIND $ids AS id
+MATCH (n:Course {mysql_id: id})
+OPTIONAL MATCH (n)-[:CONTAINS|HAS_RESOURCE*0..]->(d)
+DETACH DELETE d
+""")
+
+CYPHER.register("sync_delete_chapters", """
+UNWIND $ids AS id
+MATCH (n:Chapter {mysql_id: id})
+OPTIONAL MATCH (n)-[:CONTAINS|HAS_RESOURCE*0..]->(d)
+DETACH DELETE d
+""")
+
+CYPHER.register("sync_delete_topics", """
+UNWIND $ids AS id
+MATCH (n:Topic {mysql_id: id})
+OPTIONAL MATCH (n)-[:CONTAINS|HAS_RESOURCE*0..]->(d)
+DETACH DELETE d
+""")
+
+CYPHER.register("sync_delete_resources", """
+UNWIND $ids AS id
+MATCH (n:Resource {mysql_id: id})
+OPTIONAL MATCH (n)-[:CONTAINS|HAS_RESOURCE*0..]->(d)
+DETACH DELETE d
+""")
+
+# Graph analytics (graph_analytics.py); nodes and edges are streamed, see `stream`
+
+CYPHER.register("analytics_nodes", """
+MATCH (n) WHERE n:Course OR n:Chapter OR n:Topic OR n:Resource
+RETURN id(n) AS id, labels(n)[0] AS label
+""")
+
+CYPHER.register("analytics_edges", """
+MATCH (a)-[:CONTAINS|HAS_RESOURCE]->(b)
+RETURN id(a) AS source, id(b) AS target
+""")
+
+CYPHER.register("analytics_write_scores", """
+UNWIND $rows AS row
+MATCH (n) WHERE id(n) = row.id
+SET n.degree = row.degree, n.pagerank = row.pagerank, n.component = row.component, n.community = row.community
+""")
+
+CYPHER.register("analytics_names", """
+MATCH (n) WHERE id(n) IN $ids
+RETURN id(n) AS id, n.name AS name
+""")
+
+# Link checker (link_checker.py); every Resource sharing a URL gets the same result
+
+CYPHER.register("linkcheck_urls", """
+MATCH (r:Resource) WHERE r.url IS NOT NULL AND r.url <> ''
+RETURN DISTINCT r.url AS url
+""")
+
+CYPHER.register("linkcheck_write_back", """
+UNWIND $rows AS row
+MATCH (r:Resource {url: row.url})
+SET r.link_status = row.status, r.link_ok = row.ok, r.link_title = row.title,
+    r.link_size = row.size, r.link_checked_at = row.checked_at
+""")
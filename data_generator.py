@@ -1,6 +1,7 @@
 import random
 import json
 import os
+from jsonl_io import is_jsonl_path, write_jsonl, iter_course_records, load_course_data
 
 class DataEngineeringDataGenerator:
     def __init__(self):
@@ -218,9 +219,14 @@ class DataEngineeringDataGenerator:
         return course_data
         
     def save_to_json(self, file_path="data/course_data.json"):
-        """Save course data to JSON file"""
+        """Save course data to JSON file, or one record per line for a `.jsonl[.gz|.zst]` path"""
         course_data = self.generate_course_data()
         
+        if is_jsonl_path(file_path):
+            write_jsonl(file_path, iter_course_records(course_data))
+            print(f"Course data saved to {file_path}")
+            return file_path
+            
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
@@ -231,12 +237,9 @@ class DataEngineeringDataGenerator:
         return file_path
         
     def load_from_json(self, file_path="data/course_data.json"):
-        """Load course data from JSON file"""
+        """Load course data from a JSON or JSON Lines file"""
         if not os.path.exists(file_path):
             print(f"File {file_path} does not exist")
             return None
             
-        with open(file_path, 'r', encoding='utf-8') as f:
-            course_data = json.load(f)
-            
-        return course_data 
\ No newline at end of file
+        return load_course_data(file_path) 
\ No newline at end of file
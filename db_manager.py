@@ -1,6 +1,90 @@
+import gzip
+import os
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.constants import FieldType
 import pandas as pd
+from instrumentation import metrics, log_verbose
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Compact dtypes for the course tables' columns, applied to each exported chunk
+EXPORT_DTYPES = {
+    "course_id": "Int32",
+    "chapter_id": "Int32",
+    "topic_id": "Int32",
+    "resource_id": "Int32",
+    "chapter_order": "Int16",
+    "course_name": "string",
+    "chapter_name": "string",
+    "topic_name": "string",
+    "resource_name": "string",
+    "resource_type": "string",
+    "resource_url": "string",
+    "description": "string",
+    "created_at": "datetime64[ns]",
+    "updated_at": "datetime64[ns]",
+}
+
+# Fallback dtypes by MySQL column type, for exported columns not listed above
+SQL_TYPE_DTYPES = {
+    "TINY": "Int8",
+    "SHORT": "Int16",
+    "INT24": "Int32",
+    "LONG": "Int64",
+    "LONGLONG": "Int64",
+    "YEAR": "Int16",
+    "FLOAT": "Float32",
+    "DOUBLE": "Float64",
+    "DECIMAL": "Float64",
+    "NEWDECIMAL": "Float64",
+    "DATE": "datetime64[ns]",
+    "DATETIME": "datetime64[ns]",
+    "TIMESTAMP": "datetime64[ns]",
+}
+
+
+def export_dtypes(description, dtypes=None):
+    """Dtype of every column of a result set: `dtypes`, then `EXPORT_DTYPES`, then its SQL type
+
+    Declaring all of them up front means the output schema never depends on
+    which values happen to be in the first chunk.
+    """
+    declared = dict(EXPORT_DTYPES, **(dtypes or {}))
+    return {column[0]: declared.get(column[0]) or SQL_TYPE_DTYPES.get(FieldType.get_info(column[1]), "string")
+            for column in description}
+
+COURSE_TABLES = ("courses", "chapters", "topics", "resources")
+
+# Link check results stored on the resources table
+LINK_STATUS_COLUMNS = {
+    "link_status": "SMALLINT",
+    "link_ok": "BOOLEAN",
+    "link_title": "VARCHAR(255)",
+    "link_size": "BIGINT",
+    "link_checked_at": "DATETIME",
+}
+
+PRIMARY_KEYS = {
+    "courses": "course_id",
+    "chapters": "chapter_id",
+    "topics": "topic_id",
+    "resources": "resource_id",
+}
+
+# Restricts each course table to the rows of one course (parameter: course_id)
+COURSE_FILTERS = {
+    "courses": "course_id = %s",
+    "chapters": "course_id = %s",
+    "topics": "chapter_id IN (SELECT chapter_id FROM chapters WHERE course_id = %s)",
+    "resources": "topic_id IN (SELECT t.topic_id FROM topics t JOIN chapters c ON t.chapter_id = c.chapter_id "
+                 "WHERE c.course_id = %s)",
+}
 
 class MySQLManager:
     def __init__(self, host="localhost", user="root", password="1234", database="mysql80"):
@@ -24,7 +108,7 @@ class MySQLManager:
                 cursor = self.connection.cursor()
                 
                 # Create database if it doesn't exist
-                cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+                self._execute(cursor, "create_database", f"CREATE DATABASE IF NOT EXISTS {self.database}")
                 cursor.close()
                 
                 # Close the initial connection
@@ -46,6 +130,17 @@ class MySQLManager:
             print(f"Error connecting to MySQL database: {e}")
             return False
             
+    def _execute(self, cursor, name, sql, params=None):
+        """Execute one SQL statement, timing it under `sql.<name>`"""
+        log_verbose("SQL %s: %s", name, sql)
+        with metrics.timer(f"sql.{name}"):
+            cursor.execute(sql, params)
+            
+    def _commit(self):
+        """Commit the current transaction, timing it under `sql.commit`"""
+        with metrics.timer("sql.commit"):
+            self.connection.commit()
+            
     def disconnect(self):
         """Close the database connection"""
         if self.connection and self.connection.is_connected():
@@ -63,70 +158,192 @@ class MySQLManager:
             cursor = self.connection.cursor()
             
             # Create courses table
-            cursor.execute("""
+            self._execute(cursor, "create_table_courses", """
             CREATE TABLE IF NOT EXISTS courses (
                 course_id INT AUTO_INCREMENT PRIMARY KEY,
                 course_name VARCHAR(100) NOT NULL,
                 description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX idx_courses_updated (updated_at, course_id)
             )
             """)
             
             # Create chapters table
-            cursor.execute("""
+            self._execute(cursor, "create_table_chapters", """
             CREATE TABLE IF NOT EXISTS chapters (
                 chapter_id INT AUTO_INCREMENT PRIMARY KEY,
                 course_id INT,
                 chapter_name VARCHAR(100) NOT NULL,
                 description TEXT,
                 chapter_order INT,
+                updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX idx_chapters_updated (updated_at, chapter_id),
                 FOREIGN KEY (course_id) REFERENCES courses(course_id) ON DELETE CASCADE
             )
             """)
             
             # Create topics table
-            cursor.execute("""
+            self._execute(cursor, "create_table_topics", """
             CREATE TABLE IF NOT EXISTS topics (
                 topic_id INT AUTO_INCREMENT PRIMARY KEY,
                 chapter_id INT,
                 topic_name VARCHAR(100) NOT NULL,
                 description TEXT,
+                updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX idx_topics_updated (updated_at, topic_id),
                 FOREIGN KEY (chapter_id) REFERENCES chapters(chapter_id) ON DELETE CASCADE
             )
             """)
             
             # Create resources table
-            cursor.execute("""
+            self._execute(cursor, "create_table_resources", """
             CREATE TABLE IF NOT EXISTS resources (
                 resource_id INT AUTO_INCREMENT PRIMARY KEY,
                 topic_id INT,
                 resource_name VARCHAR(100) NOT NULL,
                 resource_type VARCHAR(50),
                 resource_url TEXT,
+                updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX idx_resources_updated (updated_at, resource_id),
                 FOREIGN KEY (topic_id) REFERENCES topics(topic_id) ON DELETE CASCADE
             )
             """)
             
-            self.connection.commit()
+            self._commit()
             cursor.close()
             print("Course tables created successfully")
-            return True
+            return self.enable_change_tracking()
             
         except Error as e:
             print(f"Error creating course tables: {e}")
             return False
         
+    def enable_change_tracking(self):
+        """Add `updated_at` high-water-mark columns and delete tombstones to the course tables
+
+        Safe to run repeatedly; tables created before change tracking existed
+        are migrated in place. Deletes are recorded by triggers in
+        `sync_tombstones`; rows removed by ON DELETE CASCADE fire no trigger,
+        so consumers must treat a tombstone as deleting the whole subtree.
+        """
+        if not self.connection or not self.connection.is_connected():
+            if not self.connect():
+                print("Failed to establish database connection")
+                return False
+                
+        try:
+            cursor = self.connection.cursor()
+            for table in COURSE_TABLES:
+                key = PRIMARY_KEYS[table]
+                self._execute(
+                    cursor, "check_updated_at",
+                    "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                    "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = 'updated_at'",
+                    (self.database, table)
+                )
+                if cursor.fetchone()[0] == 0:
+                    self._execute(cursor, "add_updated_at", f"""
+                    ALTER TABLE {table}
+                    ADD COLUMN updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                    ADD INDEX idx_{table}_updated (updated_at, {key})
+                    """)
+                    
+            self._execute(cursor, "create_table_sync_tombstones", """
+            CREATE TABLE IF NOT EXISTS sync_tombstones (
+                tombstone_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                table_name VARCHAR(50) NOT NULL,
+                row_id INT NOT NULL,
+                deleted_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6)
+            )
+            """)
+            
+            for table in COURSE_TABLES:
+                trigger = f"trg_{table}_tombstone"
+                self._execute(
+                    cursor, "check_trigger",
+                    "SELECT COUNT(*) FROM information_schema.TRIGGERS "
+                    "WHERE TRIGGER_SCHEMA = %s AND TRIGGER_NAME = %s",
+                    (self.database, trigger)
+                )
+                if cursor.fetchone()[0] == 0:
+                    self._execute(cursor, "create_tombstone_trigger", f"""
+                    CREATE TRIGGER {trigger} AFTER DELETE ON {table} FOR EACH ROW
+                    INSERT INTO sync_tombstones (table_name, row_id) VALUES ('{table}', OLD.{PRIMARY_KEYS[table]})
+                    """)
+                    
+            self._commit()
+            cursor.close()
+            return True
+            
+        except Error as e:
+            print(f"Error enabling change tracking: {e}")
+            return False
+            
+    def fetch_changed_rows(self, table, since_updated_at=None, since_id=0, limit=1000, lag_seconds=1.0,
+                           course_id=None):
+        """Rows of `table` changed after the `(updated_at, id)` high-water mark, oldest first
+
+        Rows touched in the last `lag_seconds` are held back so that a
+        transaction still in flight cannot commit a timestamp below a mark
+        that has already been passed. `course_id` limits the rows to one course.
+        """
+        if table not in COURSE_TABLES:
+            raise ValueError(f"Unknown table {table}")
+        if not self.connection or not self.connection.is_connected():
+            self.connect()
+            
+        key = PRIMARY_KEYS[table]
+        params = [since_updated_at or "1970-01-01 00:00:01", since_updated_at or "1970-01-01 00:00:01",
+                  since_id, int(lag_seconds * 1000000)]
+        course_filter = ""
+        if course_id is not None:
+            course_filter = f"AND {COURSE_FILTERS[table]} "
+            params.append(course_id)
+        cursor = self.connection.cursor(dictionary=True)
+        self._execute(
+            cursor, f"fetch_changed_{table}",
+            f"SELECT * FROM {table} "
+            f"WHERE (updated_at > %s OR (updated_at = %s AND {key} > %s)) "
+            f"AND updated_at <= NOW(6) - INTERVAL %s MICROSECOND "
+            f"{course_filter}"
+            f"ORDER BY updated_at, {key} LIMIT %s",
+            tuple(params + [limit])
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        # End the implicit read transaction so the next poll sees new commits
+        self._commit()
+        return rows
+        
+    def fetch_tombstones(self, since_id=0, limit=1000):
+        """Delete tombstones recorded after `since_id`, oldest first"""
+        if not self.connection or not self.connection.is_connected():
+            self.connect()
+            
+        cursor = self.connection.cursor(dictionary=True)
+        self._execute(
+            cursor, "fetch_tombstones",
+            "SELECT * FROM sync_tombstones WHERE tombstone_id > %s ORDER BY tombstone_id LIMIT %s",
+            (since_id, limit)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        self._commit()
+        return rows
+        
     def insert_course_data(self, course_name, description):
         """Insert a new course into the database"""
         if not self.connection or not self.connection.is_connected():
             self.connect()
             
         cursor = self.connection.cursor()
-        cursor.execute(
+        self._execute(
+            cursor, "insert_course_data",
             "INSERT INTO courses (course_name, description) VALUES (%s, %s)",
             (course_name, description)
         )
-        self.connection.commit()
+        self._commit()
         course_id = cursor.lastrowid
         cursor.close()
         return course_id
@@ -137,11 +354,12 @@ class MySQLManager:
             self.connect()
             
         cursor = self.connection.cursor()
-        cursor.execute(
+        self._execute(
+            cursor, "insert_chapter_data",
             "INSERT INTO chapters (course_id, chapter_name, description, chapter_order) VALUES (%s, %s, %s, %s)",
             (course_id, chapter_name, description, chapter_order)
         )
-        self.connection.commit()
+        self._commit()
         chapter_id = cursor.lastrowid
         cursor.close()
         return chapter_id
@@ -152,11 +370,12 @@ class MySQLManager:
             self.connect()
             
         cursor = self.connection.cursor()
-        cursor.execute(
+        self._execute(
+            cursor, "insert_topic_data",
             "INSERT INTO topics (chapter_id, topic_name, description) VALUES (%s, %s, %s)",
             (chapter_id, topic_name, description)
         )
-        self.connection.commit()
+        self._commit()
         topic_id = cursor.lastrowid
         cursor.close()
         return topic_id
@@ -167,11 +386,12 @@ class MySQLManager:
             self.connect()
             
         cursor = self.connection.cursor()
-        cursor.execute(
+        self._execute(
+            cursor, "insert_resource_data",
             "INSERT INTO resources (topic_id, resource_name, resource_type, resource_url) VALUES (%s, %s, %s, %s)",
             (topic_id, resource_name, resource_type, resource_url)
         )
-        self.connection.commit()
+        self._commit()
         resource_id = cursor.lastrowid
         cursor.close()
         return resource_id
@@ -184,9 +404,9 @@ class MySQLManager:
         cursor = self.connection.cursor(dictionary=True)
         
         if course_id:
-            cursor.execute("SELECT * FROM courses WHERE course_id = %s", (course_id,))
+            self._execute(cursor, "get_course_data", "SELECT * FROM courses WHERE course_id = %s", (course_id,))
         else:
-            cursor.execute("SELECT * FROM courses")
+            self._execute(cursor, "get_course_data", "SELECT * FROM courses")
             
         courses = cursor.fetchall()
         cursor.close()
@@ -198,7 +418,8 @@ class MySQLManager:
             self.connect()
             
         cursor = self.connection.cursor(dictionary=True)
-        cursor.execute(
+        self._execute(
+            cursor, "get_chapters_by_course",
             "SELECT * FROM chapters WHERE course_id = %s ORDER BY chapter_order",
             (course_id,)
         )
@@ -212,7 +433,8 @@ class MySQLManager:
             self.connect()
             
         cursor = self.connection.cursor(dictionary=True)
-        cursor.execute(
+        self._execute(
+            cursor, "get_topics_by_chapter",
             "SELECT * FROM topics WHERE chapter_id = %s",
             (chapter_id,)
         )
@@ -226,7 +448,8 @@ class MySQLManager:
             self.connect()
             
         cursor = self.connection.cursor(dictionary=True)
-        cursor.execute(
+        self._execute(
+            cursor, "get_resources_by_topic",
             "SELECT * FROM resources WHERE topic_id = %s",
             (topic_id,)
         )
@@ -234,9 +457,141 @@ class MySQLManager:
         cursor.close()
         return resources
         
+    def get_resource_urls(self):
+        """Distinct non-empty resource URLs"""
+        if not self.connection or not self.connection.is_connected():
+            self.connect()
+            
+        cursor = self.connection.cursor()
+        self._execute(
+            cursor, "get_resource_urls",
+            "SELECT DISTINCT resource_url FROM resources WHERE resource_url IS NOT NULL AND resource_url <> ''"
+        )
+        urls = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return urls
+        
+    def enable_link_status(self):
+        """Add the link check columns to the resources table; safe to run repeatedly"""
+        if not self.connection or not self.connection.is_connected():
+            self.connect()
+            
+        cursor = self.connection.cursor()
+        self._execute(
+            cursor, "check_link_columns",
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'resources'",
+            (self.database,)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [f"ADD COLUMN {column} {sql_type}" for column, sql_type in LINK_STATUS_COLUMNS.items()
+                   if column not in existing]
+        if missing:
+            self._execute(cursor, "add_link_columns", f"ALTER TABLE resources {', '.join(missing)}")
+        cursor.close()
+        self._commit()
+        
+    def update_link_status(self, rows):
+        """Store link check results on every resource with the URL
+
+        `rows` are `(status, ok, title, size, checked_at, url)` tuples. The
+        updated_at column is kept as it is, so a link check does not make
+        the resources look changed to the graph sync.
+        """
+        if not self.connection or not self.connection.is_connected():
+            self.connect()
+            
+        cursor = self.connection.cursor()
+        with metrics.timer("sql.update_link_status"):
+            cursor.executemany(
+                "UPDATE resources SET link_status = %s, link_ok = %s, link_title = LEFT(%s, 255), "
+                "link_size = %s, link_checked_at = %s, updated_at = updated_at WHERE resource_url = %s",
+                rows
+            )
+        cursor.close()
+        self._commit()
+        
     def export_to_dataframe(self, query):
         """Export query results to a pandas DataFrame"""
         if not self.connection or not self.connection.is_connected():
             self.connect()
             
-        return pd.read_sql_query(query, self.connection) 
\ No newline at end of file
+        with metrics.timer("sql.export_to_dataframe"):
+            return pd.read_sql_query(query, self.connection)
+            
+    def export_in_chunks(self, query, output_file, chunk_size=50000, dtypes=None, params=None,
+                         output_format="auto", compression=None):
+        """Stream query results to a compressed columnar file in bounded batches
+
+        Rows are read through an unbuffered cursor, so the server streams the
+        result set and at most `chunk_size` rows are held in memory. Every
+        batch is cast to the same dtypes (see `export_dtypes`) and appended
+        to a Parquet file when pyarrow is installed, otherwise to a
+        gzip-compressed CSV. `compression` names the Parquet codec (default
+        zstd). An empty result still writes the file: a Parquet file with
+        just the schema, or a CSV with just the header. Returns the path
+        written and row/chunk counts.
+        """
+        if not self.connection or not self.connection.is_connected():
+            self.connect()
+            
+        if output_format == "auto":
+            output_format = "parquet" if pq is not None else "csv"
+        if output_format == "parquet" and pq is None:
+            raise ImportError("pyarrow is required for Parquet export")
+        
+        directory = os.path.dirname(output_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            
+        cursor = self.connection.cursor(buffered=False)
+        writer = None
+        rows_written = 0
+        chunks = 0
+        try:
+            self._execute(cursor, "export_in_chunks", query, params)
+            column_dtypes = export_dtypes(cursor.description, dtypes)
+            columns = list(column_dtypes)
+            empty = pd.DataFrame({c: pd.Series(dtype=t) for c, t in column_dtypes.items()})
+            if output_format == "parquet":
+                schema = pa.Schema.from_pandas(empty, preserve_index=False)
+                writer = pq.ParquetWriter(output_file, schema, compression=compression or "zstd")
+            else:
+                writer = gzip.open(output_file, 'wt', encoding='utf-8', newline='')
+                empty.to_csv(writer, index=False)
+            while True:
+                with metrics.timer("sql.export_in_chunks.fetch"):
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                frame = pd.DataFrame.from_records(rows, columns=columns)
+                frame = frame.astype(column_dtypes)
+                
+                with metrics.timer("sql.export_in_chunks.write"):
+                    if output_format == "parquet":
+                        writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                    else:
+                        frame.to_csv(writer, header=False, index=False)
+                        
+                rows_written += len(frame)
+                chunks += 1
+                log_verbose("Exported chunk %d (%d rows) to %s", chunks, len(frame), output_file)
+        finally:
+            if writer is not None:
+                writer.close()
+            cursor.close()
+            
+        metrics.increment("sql.export_in_chunks.rows", rows_written)
+        print(f"Exported {rows_written} rows in {chunks} chunks to {output_file}")
+        return {"path": output_file, "rows": rows_written, "chunks": chunks, "format": output_format}
+        
+    def export_table(self, table, output_dir="data/export", chunk_size=50000, output_format="auto"):
+        """Export one of the course tables with `export_in_chunks`"""
+        if table not in COURSE_TABLES:
+            raise ValueError(f"Unknown table {table}; expected one of {', '.join(COURSE_TABLES)}")
+        if output_format == "auto":
+            output_format = "parquet" if pq is not None else "csv"
+        extension = "parquet" if output_format == "parquet" else "csv.gz"
+        output_file = os.path.join(output_dir, f"{table}.{extension}")
+        return self.export_in_chunks(f"SELECT * FROM {table}", output_file, chunk_size=chunk_size,
+                                     output_format=output_format)
\ No newline at end of file
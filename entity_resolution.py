@@ -0,0 +1,119 @@
+import hashlib
+import re
+import unicodedata
+
+MERGE_POLICIES = ("first", "last", "longest", "concat")
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = "。，,.;；:：!！?？、 "
+
+
+def normalize_name(name):
+    """Normalised form used for matching: NFKC, lower case, single spaces, no trailing punctuation"""
+    if name is None:
+        return ""
+    name = unicodedata.normalize("NFKC", str(name))
+    name = _WHITESPACE.sub(" ", name).strip().lower()
+    return name.rstrip(_TRAILING_PUNCTUATION)
+
+
+def canonical_id(entity_type, name, parent=None):
+    """Stable 16-hex-digit ID from entity type, normalised name and normalised parent name"""
+    key = "\x1f".join((entity_type, normalize_name(name), normalize_name(parent)))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def course_key(course_name, tenant=None):
+    """Partition key shared by a course and every node below it; `tenant` keeps equal names apart"""
+    return canonical_id("Course", course_name, tenant)
+
+
+class EntityResolver:
+    def __init__(self, description_policy="longest", max_description_length=2000):
+        """Collapse repeated mentions of the same entity onto one canonical record
+
+        Memory grows with the number of distinct entities, not mentions, and
+        each mention costs one hash and one dict lookup.
+        """
+        if description_policy not in MERGE_POLICIES:
+            raise ValueError(f"Unknown description policy {description_policy}; expected one of {MERGE_POLICIES}")
+        self.description_policy = description_policy
+        self.max_description_length = max_description_length
+        self.records = {}
+        self.mentions = 0
+        self._relationship_keys = set()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.records
+
+    def add(self, entity_type, entity, parent=None):
+        """Resolve one mention; returns `(canonical record, is_new)`
+
+        A new record is the mention itself with an `id` added; for a known
+        entity the stored record absorbs the mention's description and any
+        fields it did not have yet.
+        """
+        self.mentions += 1
+        entity_id = canonical_id(entity_type, entity.get("name"), parent)
+        record = self.records.get(entity_id)
+        if record is None:
+            entity["id"] = entity_id
+            self.records[entity_id] = entity
+            return entity, True
+        self._merge(record, entity)
+        return record, False
+
+    def rekey(self, entity_type, record, parent):
+        """Move a record resolved before its parent was known to its ID under `parent`
+
+        Returns the canonical record, which is an existing one (having
+        absorbed `record`) if the entity was already known under that parent.
+        """
+        self.records.pop(record["id"], None)
+        entity_id = canonical_id(entity_type, record.get("name"), parent)
+        existing = self.records.get(entity_id)
+        if existing is None:
+            record["id"] = entity_id
+            self.records[entity_id] = record
+            return record
+        self._merge(existing, record)
+        return existing
+
+    def _merge(self, record, entity):
+        for field, value in entity.items():
+            if field == "description":
+                record["description"] = self._merge_description(record.get("description") or "", value or "")
+            elif value not in (None, "") and record.get(field) in (None, ""):
+                record[field] = value
+
+    def _merge_description(self, current, new):
+        policy = self.description_policy
+        if not new or new == current:
+            return current
+        if policy == "first":
+            return current or new
+        if policy == "last":
+            return new
+        if policy == "longest":
+            return new if len(new) > len(current) else current
+        # concat: keep distinct descriptions, capped so hot entities cannot grow without bound
+        if not current:
+            return new[:self.max_description_length]
+        if new in current.split("；") or len(current) >= self.max_description_length:
+            return current
+        return (current + "；" + new)[:self.max_description_length]
+
+    def add_relationship(self, relationship):
+        """True if this (source, type, target) triple has not been seen before"""
+        key = (
+            normalize_name(relationship.get("source")),
+            relationship.get("type"),
+            normalize_name(relationship.get("target")),
+        )
+        if key in self._relationship_keys:
+            return False
+        self._relationship_keys.add(key)
+        return True
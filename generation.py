@@ -0,0 +1,377 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from instrumentation import metrics
+
+DEFAULT_SYSTEM_PROMPT = "你是智能数据工程课程的助教，请只根据给出的知识图谱内容回答学生的问题。\n"
+
+PROMPT_TEMPLATE = "知识图谱内容：\n{context}\n"
+QUESTION_TEMPLATE = "问题：{question}\n回答："
+
+
+class StubLanguageModel:
+    def __init__(self, step_delay=0.0, prefill_delay_per_token=0.0):
+        """Tiny deterministic model for tests and offline runs
+
+        Tokens are Unicode code points. The "answer" is the knowledge-graph
+        context contained in the prompt, emitted one character per step, so
+        output is fully predictable. The optional delays simulate compute cost
+        per decode step (shared by the whole batch) and per prefilled token.
+        """
+        self.step_delay = step_delay
+        self.prefill_delay_per_token = prefill_delay_per_token
+        self.eos_token_id = 0
+        self.prefilled_tokens = 0
+        self.steps = 0
+
+    def encode(self, text):
+        return [ord(ch) for ch in text]
+
+    def decode(self, token_ids):
+        return "".join(chr(token) for token in token_ids if token != self.eos_token_id)
+
+    def prefill(self, token_ids, cache=None):
+        """Return a new cache extended by `token_ids`; the input cache is never modified"""
+        if self.prefill_delay_per_token:
+            time.sleep(self.prefill_delay_per_token * len(token_ids))
+        self.prefilled_tokens += len(token_ids)
+        return (cache or ()) + tuple(token_ids)
+
+    def step(self, caches):
+        """Produce the next token for every sequence in the batch"""
+        if self.step_delay:
+            time.sleep(self.step_delay)
+        self.steps += 1
+        next_tokens = []
+        new_caches = []
+        for cache in caches:
+            text = self.decode(cache)
+            start = text.find("知识图谱内容：\n")
+            end = text.find("\n问题：", start)
+            answer = text[start + len("知识图谱内容：\n"):end] if start >= 0 and end >= 0 else ""
+            emitted = len(text) - text.rfind("回答：") - len("回答：") if "回答：" in text else 0
+            token = ord(answer[emitted]) if emitted < len(answer) else self.eos_token_id
+            next_tokens.append(token)
+            new_caches.append(cache + (token,))
+        return next_tokens, new_caches
+
+
+class TransformersBackend:
+    def __init__(self, model_name, quantize=True, num_threads=None):
+        """Small causal LM on CPU through transformers, optionally int8 dynamically quantized
+
+        The cache handed around is `(past_key_values, next_token_logits)`.
+        Every step decodes all sequences in one forward pass: shorter caches
+        are left-padded to the longest, with an attention mask hiding the
+        padding and position ids continuing each sequence's own length.
+        """
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.torch = torch
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.eos_token_id = self.tokenizer.eos_token_id
+
+    def encode(self, text):
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def decode(self, token_ids):
+        return self.tokenizer.decode(token_ids, skip_special_tokens=True)
+
+    @staticmethod
+    def _legacy(past):
+        return past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+
+    @staticmethod
+    def _as_model_cache(past):
+        """Wrap legacy tuples in a fresh DynamicCache where supported
+
+        Appending to the wrapper concatenates into new tensors, so the cached
+        prefix tuples shared between requests are never modified.
+        """
+        if past is None:
+            return None
+        try:
+            from transformers import DynamicCache
+        except ImportError:
+            return past
+        return DynamicCache.from_legacy_cache(past)
+
+    def prefill(self, token_ids, cache=None):
+        if not token_ids:
+            return cache
+        torch = self.torch
+        past = self._as_model_cache(cache[0]) if cache else None
+        with torch.no_grad():
+            output = self.model(torch.tensor([token_ids]), past_key_values=past, use_cache=True)
+        return self._legacy(output.past_key_values), output.logits[0, -1]
+
+    def _left_pad(self, tensor, length):
+        """Pad a `(batch, heads, seq, dim)` cache tensor with zeros on the left to `length` positions"""
+        return self.torch.nn.functional.pad(tensor, (0, 0, length - tensor.shape[2], 0))
+
+    def step(self, caches):
+        torch = self.torch
+        if not caches:
+            return [], []
+        tokens = [int(torch.argmax(logits)) for _, logits in caches]
+        lengths = [past[0][0].shape[2] for past, _ in caches]
+        longest = max(lengths)
+        past = tuple(
+            tuple(torch.cat([self._left_pad(cache[0][layer][part], longest) for cache in caches]) for part in range(2))
+            for layer in range(len(caches[0][0]))
+        )
+        attention_mask = torch.tensor([[0] * (longest - length) + [1] * (length + 1) for length in lengths])
+        position_ids = torch.tensor([[length] for length in lengths])
+        with torch.no_grad():
+            output = self.model(torch.tensor([[token] for token in tokens]),
+                                past_key_values=self._as_model_cache(past), attention_mask=attention_mask,
+                                position_ids=position_ids, use_cache=True)
+        merged = self._legacy(output.past_key_values)
+        # Each sequence keeps its own unpadded cache, so padding never outlives a step
+        new_caches = [
+            (tuple(tuple(layer[part][row:row + 1, :, longest - length:] for part in range(2)) for layer in merged),
+             output.logits[row, -1])
+            for row, length in enumerate(lengths)
+        ]
+        return tokens, new_caches
+
+
+class PrefixCache:
+    def __init__(self, max_entries=64):
+        """LRU of model caches for prompt prefixes (system prompt, then system prompt + context)"""
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def prefill(self, backend, segments):
+        """Cache state after consuming `segments` in order, reusing the longest cached prefix"""
+        cache = None
+        for depth in range(len(segments)):
+            key = tuple(segments[:depth + 1])
+            with self._lock:
+                cached = self._entries.get(key)
+                if cached is not None:
+                    self._entries.move_to_end(key)
+            if cached is not None:
+                self.hits += 1
+                cache = cached
+                continue
+            self.misses += 1
+            cache = backend.prefill(backend.encode(segments[depth]), cache)
+            with self._lock:
+                self._entries[key] = cache
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return cache
+
+
+class GenerationRequest:
+    def __init__(self, question, context, max_new_tokens):
+        """One question in flight; tokens are streamed through `tokens` as text deltas"""
+        self.question = question
+        self.context = context
+        self.max_new_tokens = max_new_tokens
+        self.tokens = queue.Queue()
+        self.token_ids = []
+        self.text = ""
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    @property
+    def time_to_first_token(self):
+        return self.first_token_at - self.submitted_at if self.first_token_at else None
+
+    @property
+    def tokens_per_second(self):
+        if not self.finished_at or not self.first_token_at or len(self.token_ids) < 2:
+            return None
+        return (len(self.token_ids) - 1) / max(self.finished_at - self.first_token_at, 1e-9)
+
+    def stream(self):
+        """Yield text deltas as they are generated"""
+        while True:
+            delta = self.tokens.get()
+            if delta is None:
+                break
+            yield delta
+        if self.error:
+            raise self.error
+
+    def result(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError("Generation did not finish in time")
+        if self.error:
+            raise self.error
+        return self.text
+
+
+class AnswerGenerator:
+    def __init__(self, kg=None, backend=None, system_prompt=DEFAULT_SYSTEM_PROMPT, max_new_tokens=256,
+                 max_batch_size=8, max_wait_ms=5.0, prefix_cache_entries=64):
+        """Generative answers over knowledge-graph context with continuous batching
+
+        A single worker thread owns the model. Questions that arrive while
+        others are decoding join the running batch at the next step (after
+        `max_wait_ms` at most when the batch is idle); every step decodes one
+        token for all active questions. The system prompt and each retrieved
+        context are prefilled once and reused from `PrefixCache`.
+        """
+        self.kg = kg
+        self.backend = backend or StubLanguageModel()
+        self.system_prompt = system_prompt
+        self.max_new_tokens = max_new_tokens
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.prefix_cache = PrefixCache(prefix_cache_entries)
+        self._pending = queue.Queue()
+        self._stop = threading.Event()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "tokens": 0, "ttft_s": 0.0, "steps": 0, "step_s": 0.0, "batched": 0}
+
+    def retrieve_context(self, question):
+        """Knowledge-graph facts for the question, via the structured QA layer"""
+        if self.kg is None:
+            return ""
+        with metrics.timer("generation.retrieve"):
+            return self.kg.answer_question(question).strip()
+
+    def start(self):
+        with self._lock:
+            if self._worker is None:
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name="answer-generator", daemon=True)
+                self._worker.start()
+        return self
+
+    def close(self):
+        """Stop the worker after every queued question has been answered"""
+        self._stop.set()
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.join()
+        # Anything submitted while the worker was exiting is failed, never left waiting
+        while True:
+            try:
+                request = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            self._finish(request, RuntimeError("Answer generator is closed"))
+
+    def submit(self, question, context=None, max_new_tokens=None):
+        """Queue a question; returns a `GenerationRequest` to stream from or wait on"""
+        self.start()
+        if context is None:
+            context = self.retrieve_context(question)
+        request = GenerationRequest(question, context, max_new_tokens or self.max_new_tokens)
+        self._pending.put(request)
+        return request
+
+    def generate(self, question, context=None):
+        return self.submit(question, context).result()
+
+    def stream(self, question, context=None):
+        return self.submit(question, context).stream()
+
+    def generate_batch(self, questions):
+        """Generate answers for several questions concurrently"""
+        requests = [self.submit(question) for question in questions]
+        return [request.result() for request in requests]
+
+    def _admit(self, request):
+        segments = [self.system_prompt, PROMPT_TEMPLATE.format(context=request.context)]
+        with metrics.timer("generation.prefill"):
+            cache = self.prefix_cache.prefill(self.backend, segments)
+            return self.backend.prefill(self.backend.encode(QUESTION_TEMPLATE.format(question=request.question)), cache)
+
+    def _finish(self, request, error=None):
+        request.error = error
+        request.finished_at = time.perf_counter()
+        request.tokens.put(None)
+        request.done.set()
+        metrics.increment("generation.requests")
+        metrics.increment("generation.tokens", len(request.token_ids))
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["tokens"] += len(request.token_ids)
+            self._stats["ttft_s"] += request.time_to_first_token or 0.0
+            
+    def stats(self):
+        """Throughput and latency so far: tokens/sec over decode time, mean time to first token, mean batch size"""
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "requests": stats["requests"],
+            "tokens": stats["tokens"],
+            "tokens_per_second": stats["tokens"] / stats["step_s"] if stats["step_s"] else 0.0,
+            "mean_time_to_first_token_s": stats["ttft_s"] / stats["requests"] if stats["requests"] else 0.0,
+            "mean_batch_size": stats["batched"] / stats["steps"] if stats["steps"] else 0.0,
+            "prefix_cache_hits": self.prefix_cache.hits,
+            "prefix_cache_misses": self.prefix_cache.misses,
+        }
+
+    def _run(self):
+        active = []
+        while not self._stop.is_set() or active or not self._pending.empty():
+            # Block briefly when idle, otherwise just pick up whatever has arrived
+            timeout = self.max_wait_ms / 1000 if active else 0.1
+            while len(active) < self.max_batch_size:
+                try:
+                    request = self._pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                timeout = 0
+                try:
+                    active.append((request, self._admit(request)))
+                except Exception as e:
+                    self._finish(request, e)
+            if not active:
+                continue
+
+            requests = [request for request, _ in active]
+            started = time.perf_counter()
+            try:
+                with metrics.timer("generation.step"):
+                    next_tokens, caches = self.backend.step([cache for _, cache in active])
+            except Exception as e:
+                for request in requests:
+                    self._finish(request, e)
+                active = []
+                continue
+            with self._lock:
+                self._stats["steps"] += 1
+                self._stats["step_s"] += time.perf_counter() - started
+                self._stats["batched"] += len(active)
+
+            still_active = []
+            for request, token, cache in zip(requests, next_tokens, caches):
+                if token == self.backend.eos_token_id:
+                    self._finish(request)
+                    continue
+                if request.first_token_at is None:
+                    request.first_token_at = time.perf_counter()
+                    metrics.observe("generation.time_to_first_token", request.time_to_first_token)
+                request.token_ids.append(token)
+                text = self.backend.decode(request.token_ids)
+                request.tokens.put(text[len(request.text):])
+                request.text = text
+                if len(request.token_ids) >= request.max_new_tokens:
+                    self._finish(request)
+                else:
+                    still_active.append((request, cache))
+            active = still_active
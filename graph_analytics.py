@@ -0,0 +1,239 @@
+from array import array
+import numpy as np
+from instrumentation import metrics
+from cypher_templates import CYPHER
+
+ANALYTICS_LABELS = ("Course", "Chapter", "Topic", "Resource")
+
+class CSRGraph:
+    def __init__(self, node_ids, labels, indptr, indices):
+        """Directed graph in compressed sparse row form
+
+        Nodes are numbered 0..n-1; `node_ids` maps them back to graph IDs
+        and `labels` holds an index into `ANALYTICS_LABELS` (-1 if unknown).
+        The targets of node i are `indices[indptr[i]:indptr[i + 1]]`.
+        A million edges take about 4 MB of int32 indices.
+        """
+        self.node_ids = node_ids
+        self.labels = labels
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, sources, targets, node_ids=None, labels=None):
+        """Build from parallel arrays of source and target graph IDs
+
+        `node_ids` (with matching `labels`) adds nodes that may have no
+        edges; IDs seen only in edges get label -1.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        known = np.asarray(node_ids if node_ids is not None else [], dtype=np.int64)
+        all_ids, inverse = np.unique(np.concatenate([known, sources, targets]), return_inverse=True)
+        node_labels = np.full(len(all_ids), -1, dtype=np.int8)
+        if labels is not None:
+            node_labels[inverse[:len(known)]] = labels
+        offset = len(known)
+        src = inverse[offset:offset + len(sources)].astype(np.int32)
+        dst = inverse[offset + len(sources):].astype(np.int32)
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(len(all_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(all_ids)), out=indptr[1:])
+        return cls(all_ids, node_labels, indptr, dst[order])
+
+    @classmethod
+    def from_neo4j(cls, kg):
+        """Stream the Course/Chapter/Topic/Resource graph out of Neo4j
+
+        Records are read straight off the result cursor into flat integer
+        buffers, so no per-row dicts are kept while loading.
+        """
+        label_codes = {label: code for code, label in enumerate(ANALYTICS_LABELS)}
+        node_ids, labels, sources, targets = array("q"), array("b"), array("q"), array("q")
+        with metrics.timer("analytics.load"):
+            for record in CYPHER.stream(kg.g, "analytics_nodes"):
+                node_ids.append(record[0])
+                labels.append(label_codes.get(record[1], -1))
+            for record in CYPHER.stream(kg.g, "analytics_edges"):
+                sources.append(record[0])
+                targets.append(record[1])
+            graph = cls.from_edges(np.frombuffer(sources, dtype=np.int64), np.frombuffer(targets, dtype=np.int64),
+                                   np.frombuffer(node_ids, dtype=np.int64), np.frombuffer(labels, dtype=np.int8))
+        metrics.increment("analytics.nodes", graph.num_nodes)
+        metrics.increment("analytics.edges", graph.num_edges)
+        return graph
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def sources(self):
+        """Source node of every edge, aligned with `indices`"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def in_degree(self):
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def degree(self):
+        return self.out_degree() + self.in_degree()
+
+    def symmetric(self):
+        """Undirected view: every edge in both directions"""
+        src, dst = self.sources(), self.indices
+        return CSRGraph.from_edges(self.node_ids[np.concatenate([src, dst])],
+                                   self.node_ids[np.concatenate([dst, src])], self.node_ids, self.labels)
+
+
+def pagerank(graph, damping=0.85, tol=1e-8, max_iter=100):
+    """PageRank by power iteration; rank of dangling nodes is spread evenly"""
+    n = graph.num_nodes
+    if n == 0:
+        return np.zeros(0)
+    out_degree = graph.out_degree()
+    dangling = out_degree == 0
+    inverse_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+    sources = graph.sources()
+    edge_weights = np.repeat(inverse_degree, out_degree)
+    rank = np.full(n, 1.0 / n)
+    with metrics.timer("analytics.pagerank"):
+        for _ in range(max_iter):
+            # Sum of rank[source] / out_degree[source] over incoming edges, per target
+            spread = np.bincount(graph.indices, weights=rank[sources] * edge_weights, minlength=n)
+            new_rank = (1.0 - damping) / n + damping * (spread + rank[dangling].sum() / n)
+            converged = np.abs(new_rank - rank).sum() < tol
+            rank = new_rank
+            if converged:
+                break
+    return rank
+
+
+def connected_components(graph):
+    """Weakly connected components by min-label propagation with pointer jumping
+
+    Returns the component of every node, numbered 0..k-1 by first node.
+    """
+    component = np.arange(graph.num_nodes)
+    if graph.num_edges == 0:
+        return component
+    src, dst = graph.sources(), graph.indices
+    with metrics.timer("analytics.components"):
+        while True:
+            smaller = np.minimum(component[src], component[dst])
+            updated = component.copy()
+            np.minimum.at(updated, src, smaller)
+            np.minimum.at(updated, dst, smaller)
+            # Follow label chains so long paths collapse in a few rounds
+            while True:
+                jumped = updated[updated]
+                if np.array_equal(jumped, updated):
+                    break
+                updated = jumped
+            if np.array_equal(updated, component):
+                break
+            component = updated
+    return np.unique(component, return_inverse=True)[1]
+
+
+def label_propagation(graph, max_iter=20):
+    """Communities by synchronous label propagation on the undirected graph
+
+    Every node takes the most frequent label among itself and its
+    neighbours, ties going to the smaller label, until labels stop
+    changing. Returns the community of every node, numbered 0..k-1.
+    """
+    n = graph.num_nodes
+    community = np.arange(n)
+    # Without edges every node is its own community (and reduceat cannot take empty input)
+    if n == 0 or graph.num_edges == 0:
+        return community
+    nodes = np.arange(n)
+    src = np.concatenate([graph.sources(), graph.indices, nodes])
+    dst = np.concatenate([graph.indices, graph.sources(), nodes])
+    with metrics.timer("analytics.communities"):
+        for _ in range(max_iter):
+            # Count (node, neighbour label) pairs, then keep the best pair per node
+            pairs = src.astype(np.int64) * n + community[dst]
+            keys, counts = np.unique(pairs, return_counts=True)
+            owner, label = keys // n, keys % n
+            starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+            best = np.repeat(np.maximum.reduceat(counts, starts), np.diff(np.r_[starts, len(keys)]))
+            # Keys are sorted by (node, label), so the first best pair of a node has the smallest label
+            candidates = np.flatnonzero(counts == best)
+            first = np.r_[True, owner[candidates][1:] != owner[candidates][:-1]]
+            updated = np.empty(n, dtype=community.dtype)
+            updated[owner[candidates[first]]] = label[candidates[first]]
+            if np.array_equal(updated, community):
+                break
+            community = updated
+    return np.unique(community, return_inverse=True)[1]
+
+
+class GraphAnalytics:
+    def __init__(self, kg, batch_size=10000, damping=0.85):
+        """Degree, PageRank, components and communities of the course graph
+
+        Scores are computed on the undirected containment graph, so a topic
+        linked from many chapters or a resource shared by many topics ranks
+        as a hub, and are written back as node properties in batches.
+        """
+        self.kg = kg
+        self.batch_size = batch_size
+        self.damping = damping
+        self.graph = None
+        self.scores = None
+
+    def compute(self, graph=None):
+        """Load the graph unless given and compute all scores; returns `{name: array}`"""
+        self.graph = graph if graph is not None else CSRGraph.from_neo4j(self.kg)
+        undirected = self.graph.symmetric()
+        self.scores = {
+            "degree": self.graph.degree(),
+            "pagerank": pagerank(undirected, damping=self.damping),
+            "component": connected_components(self.graph),
+            "community": label_propagation(self.graph),
+        }
+        return self.scores
+
+    def write_back(self):
+        """Store the scores on their nodes, `batch_size` nodes per statement"""
+        with metrics.timer("analytics.write_back"):
+            for start in range(0, self.graph.num_nodes, self.batch_size):
+                end = start + self.batch_size
+                columns = {name: values[start:end].tolist() for name, values in self.scores.items()}
+                rows = [{"id": node_id, **{name: values[i] for name, values in columns.items()}}
+                        for i, node_id in enumerate(self.graph.node_ids[start:end].tolist())]
+                self.kg.query("analytics_write_scores", rows=rows)
+        return self.graph.num_nodes
+
+    def top(self, score="pagerank", k=10, label=None):
+        """Graph IDs and scores of the `k` highest-scoring nodes, optionally of one label"""
+        values = self.scores[score]
+        candidates = np.arange(len(values))
+        if label is not None:
+            candidates = candidates[self.graph.labels == ANALYTICS_LABELS.index(label)]
+        best = candidates[np.argsort(-values[candidates], kind="stable")[:k]]
+        return [(int(self.graph.node_ids[i]), values[i].item()) for i in best]
+
+    def run(self, k=5):
+        """Compute all scores, write them back and print the top hub topics and resources"""
+        self.compute()
+        self.write_back()
+        components = self.scores["component"].max() + 1 if self.graph.num_nodes else 0
+        communities = self.scores["community"].max() + 1 if self.graph.num_nodes else 0
+        print(f"Analysed {self.graph.num_nodes} nodes and {self.graph.num_edges} edges: "
+              f"{components} components, {communities} communities")
+        for label in ("Topic", "Resource"):
+            hubs = self.top("pagerank", k, label)
+            names = {row["id"]: row["name"]
+                     for row in self.kg.query("analytics_names", ids=[node_id for node_id, _ in hubs])}
+            print(f"Top {label} hubs by PageRank:")
+            for node_id, score in hubs:
+                print(f"- {names.get(node_id)}: {score:.6f}")
+        return self.scores
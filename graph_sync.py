@@ -0,0 +1,212 @@
+import json
+import os
+import time
+from instrumentation import metrics
+from entity_resolution import course_key
+
+# How each MySQL course table maps onto the graph, parents before children;
+# its statements are the `sync_*_<table>` templates in cypher_templates.py
+SYNC_TABLES = [
+    {
+        "table": "courses",
+        "key": "course_id",
+        "label": "Course",
+        "properties": {"name": "course_name", "description": "description"},
+        "parent": None,
+    },
+    {
+        "table": "chapters",
+        "key": "chapter_id",
+        "label": "Chapter",
+        "properties": {"name": "chapter_name", "description": "description", "order": "chapter_order"},
+        "parent": ("course_id", "Course", "CONTAINS"),
+    },
+    {
+        "table": "topics",
+        "key": "topic_id",
+        "label": "Topic",
+        "properties": {"name": "topic_name", "description": "description"},
+        "parent": ("chapter_id", "Chapter", "CONTAINS"),
+    },
+    {
+        "table": "resources",
+        "key": "resource_id",
+        "label": "Resource",
+        "properties": {"name": "resource_name", "type": "resource_type", "url": "resource_url"},
+        "parent": ("topic_id", "Topic", "HAS_RESOURCE"),
+    },
+]
+
+
+class GraphSync:
+    def __init__(self, db_manager, kg, checkpoint_file=None, batch_size=500, course_id=None):
+        """Incrementally mirror the MySQL course tables into Neo4j
+
+        Changed rows are read past a per-table `(updated_at, id)` high-water
+        mark, deletions past the last applied tombstone id. Every applied
+        batch advances the checkpoint file, so an interrupted run resumes
+        from the last batch that reached the graph. Graph nodes are keyed by
+        their MySQL primary key in the `mysql_id` property (nodes built
+        without MySQL are mapped by `backfill()`, again whenever a course's
+        partition is rebuilt), and inherit the
+        `course_key` partition of their course. With `course_id` set only that
+        course's rows are synced, under a checkpoint file of its own.
+        """
+        if checkpoint_file is None:
+            checkpoint_file = ("data/.sync_checkpoint.json" if course_id is None
+                               else f"data/.sync_checkpoint.course{course_id}.json")
+        self.db = db_manager
+        self.kg = kg
+        self.course_id = course_id
+        self.checkpoint_file = checkpoint_file
+        self.batch_size = batch_size
+        self.checkpoint = self._load_checkpoint()
+        self._indexes_ready = False
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file):
+            return {}
+        with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_checkpoint(self):
+        directory = os.path.dirname(self.checkpoint_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write then rename so a crash never leaves a truncated checkpoint
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def reset(self):
+        """Forget all high-water marks so the next run re-reads every row"""
+        self.checkpoint = {}
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        for spec in SYNC_TABLES:
+            self.kg.query(f"sync_index_{spec['label'].lower()}")
+        self.kg.create_partition_indexes()
+        self._indexes_ready = True
+
+    @staticmethod
+    def _to_graph_row(spec, row):
+        graph_row = {"id": row[spec["key"]]}
+        for prop, column in spec["properties"].items():
+            graph_row[prop] = row.get(column)
+        if spec["parent"] is not None:
+            graph_row["parent_id"] = row.get(spec["parent"][0])
+        else:
+            graph_row["course_key"] = course_key(graph_row["name"])
+        return graph_row
+
+    def _build_versions(self):
+        """`{course_key: build_version}` of the courses built from JSON rather than by the sync"""
+        return {row["course_key"]: row["version"] for row in self.kg.query("course_build_versions")}
+
+    def backfill(self, versions=None):
+        """Map nodes that already exist in the graph onto their MySQL rows
+
+        A graph built from JSON has no `mysql_id`s, so without this the
+        first sync would create a second copy of every node. Tables are
+        mapped parents first, so each child can be found under its parent.
+        The checkpoint remembers the courses' build versions it mapped, so
+        `run_once` backfills again after a partition is rebuilt. Returns the
+        number of nodes mapped per table.
+        """
+        if versions is None:
+            versions = self._build_versions()
+        mapped = {}
+        for spec in SYNC_TABLES:
+            table = spec["table"]
+            mapped[table] = 0
+            mark = {}
+            while True:
+                rows = self.db.fetch_changed_rows(table, mark.get("updated_at"), mark.get("id", 0),
+                                                  limit=self.batch_size, lag_seconds=0, course_id=self.course_id)
+                if not rows:
+                    break
+                with metrics.timer(f"sync.backfill.{table}"):
+                    result = self.kg.query(f"sync_backfill_{table}",
+                                           rows=[self._to_graph_row(spec, row) for row in rows])
+                mapped[table] += sum(row["mapped"] for row in result)
+                mark = {"updated_at": str(rows[-1]["updated_at"]), "id": rows[-1][spec["key"]]}
+                if len(rows) < self.batch_size:
+                    break
+        self.checkpoint["backfilled"] = versions
+        self._save_checkpoint()
+        print("Mapped existing nodes to MySQL rows: " + ", ".join(f"{name}={count}" for name, count in mapped.items()))
+        return mapped
+
+    def sync_table(self, spec):
+        """Apply every pending change of one table; returns the number of rows applied"""
+        table = spec["table"]
+        mark = self.checkpoint.get(table, {})
+        applied = 0
+        while True:
+            rows = self.db.fetch_changed_rows(
+                table, mark.get("updated_at"), mark.get("id", 0), limit=self.batch_size, course_id=self.course_id
+            )
+            if not rows:
+                break
+            with metrics.timer(f"sync.apply.{table}"):
+                self.kg.query(f"sync_upsert_{table}", rows=[self._to_graph_row(spec, row) for row in rows])
+            last = rows[-1]
+            mark = {"updated_at": str(last["updated_at"]), "id": last[spec["key"]]}
+            self.checkpoint[table] = mark
+            self._save_checkpoint()
+            applied += len(rows)
+            metrics.increment(f"sync.rows.{table}", len(rows))
+            if len(rows) < self.batch_size:
+                break
+        return applied
+
+    def sync_deletes(self):
+        """Apply pending tombstones; returns the number of tombstones applied"""
+        tables = {spec["table"] for spec in SYNC_TABLES}
+        applied = 0
+        while True:
+            since_id = self.checkpoint.get("tombstones", {}).get("id", 0)
+            tombstones = self.db.fetch_tombstones(since_id, limit=self.batch_size)
+            if not tombstones:
+                break
+            by_table = {}
+            for tombstone in tombstones:
+                by_table.setdefault(tombstone["table_name"], []).append(tombstone["row_id"])
+            with metrics.timer("sync.apply.tombstones"):
+                for table, ids in by_table.items():
+                    if table in tables:
+                        self.kg.query(f"sync_delete_{table}", ids=ids)
+            self.checkpoint["tombstones"] = {"id": tombstones[-1]["tombstone_id"]}
+            self._save_checkpoint()
+            applied += len(tombstones)
+            metrics.increment("sync.tombstones", len(tombstones))
+            if len(tombstones) < self.batch_size:
+                break
+        return applied
+
+    def run_once(self):
+        """Apply all pending upserts (parents first) and then all pending deletes"""
+        self._ensure_indexes()
+        versions = self._build_versions()
+        if self.checkpoint.get("backfilled") != versions:
+            self.backfill(versions)
+        summary = {}
+        for spec in SYNC_TABLES:
+            summary[spec["table"]] = self.sync_table(spec)
+        summary["deleted"] = self.sync_deletes()
+        print("Sync applied: " + ", ".join(f"{name}={count}" for name, count in summary.items()))
+        return summary
+
+    def run_forever(self, interval=5.0):
+        """Poll for changes every `interval` seconds until interrupted"""
+        try:
+            while True:
+                self.run_once()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Sync stopped")
@@ -2,119 +2,160 @@ import re
 import json
 import os
 from collections import defaultdict
+from instrumentation import metrics
+from entity_resolution import EntityResolver
+from records import StringPool, RelationshipRecord, make_record
+from jsonl_io import is_jsonl_path, read_jsonl, write_jsonl
+from text_loader import TextReader, read_text, iter_text_files
+
+ENTITY_TYPES = ("Course", "Chapter", "Topic", "Resource")
 
 class InformationExtractor:
-    def __init__(self):
+    def __init__(self, resolve_entities=True, description_policy="longest"):
+        """Regex-based extractor; with `resolve_entities` repeated mentions collapse onto canonical IDs"""
+        # Entities and relationships are slotted records with a dict-like interface, see records.py
         self.entities = defaultdict(list)
         self.relationships = []
+        self.strings = StringPool()
+        self.description_policy = description_policy
+        self.resolver = EntityResolver(description_policy) if resolve_entities else None
+        # Parent lookups for canonical keys, bounded by the number of distinct entities
+        self._reset_parents()
+        # Encoding and malformed byte regions of every file read, see text_loader.py
+        self.read_reports = []
         
     def extract_entities(self, text, entity_type):
         """Extract entities of a specific type from text"""
         # This is a simple implementation that can be enhanced with NLP libraries
         # For now, we'll use basic pattern matching
         
-        if entity_type == "Course":
-            # Extract course name and description
-            course_pattern = r"课程名称[:：]\s*([^\n]+)"
-            desc_pattern = r"课程描述[:：]\s*([^\n]+)"
+        before = len(self.entities[entity_type])
+        with metrics.timer(f"regex.entity.{entity_type}"):
+            if entity_type == "Course":
+                # Extract course name and description
+                course_pattern = r"课程名称[:：]\s*([^\n]+)"
+                desc_pattern = r"课程描述[:：]\s*([^\n]+)"
             
-            course_match = re.search(course_pattern, text)
-            desc_match = re.search(desc_pattern, text)
+                course_match = re.search(course_pattern, text)
+                desc_match = re.search(desc_pattern, text)
             
-            if course_match:
-                self.entities["Course"].append({
-                    "name": course_match.group(1).strip(),
-                    "description": desc_match.group(1).strip() if desc_match else ""
-                })
+                if course_match:
+                    self.entities["Course"].append(make_record(
+                        "Course", self.strings,
+                        name=course_match.group(1).strip(),
+                        description=desc_match.group(1).strip() if desc_match else ""
+                    ))
                 
-        elif entity_type == "Chapter":
-            # Extract chapter information
-            chapter_pattern = r"第(\d+)章\s*([^\n]+)[:：]\s*([^\n]+)"
+            elif entity_type == "Chapter":
+                # Extract chapter information
+                chapter_pattern = r"第(\d+)章\s*([^\n]+)[:：]\s*([^\n]+)"
             
-            for match in re.finditer(chapter_pattern, text):
-                chapter_num = int(match.group(1))
-                chapter_name = match.group(2).strip()
-                chapter_desc = match.group(3).strip()
+                for match in re.finditer(chapter_pattern, text):
+                    chapter_num = int(match.group(1))
+                    chapter_name = match.group(2).strip()
+                    chapter_desc = match.group(3).strip()
                 
-                self.entities["Chapter"].append({
-                    "name": chapter_name,
-                    "description": chapter_desc,
-                    "order": chapter_num
-                })
+                    self.entities["Chapter"].append(make_record(
+                        "Chapter", self.strings,
+                        name=chapter_name,
+                        description=chapter_desc,
+                        order=chapter_num
+                    ))
                 
-        elif entity_type == "Topic":
-            # Extract topic information
-            topic_pattern = r"(\d+\.\d+)\s*([^\n]+)[:：]\s*([^\n]+)"
+            elif entity_type == "Topic":
+                # Extract topic information
+                topic_pattern = r"(\d+\.\d+)\s*([^\n]+)[:：]\s*([^\n]+)"
             
-            for match in re.finditer(topic_pattern, text):
-                topic_num = match.group(1)
-                topic_name = match.group(2).strip()
-                topic_desc = match.group(3).strip()
+                for match in re.finditer(topic_pattern, text):
+                    topic_num = match.group(1)
+                    topic_name = match.group(2).strip()
+                    topic_desc = match.group(3).strip()
                 
-                self.entities["Topic"].append({
-                    "name": topic_name,
-                    "description": topic_desc,
-                    "number": topic_num
-                })
+                    self.entities["Topic"].append(make_record(
+                        "Topic", self.strings,
+                        name=topic_name,
+                        description=topic_desc,
+                        number=topic_num
+                    ))
                 
-        elif entity_type == "Resource":
-            # Extract resource information
-            resource_pattern = r"资源[:：]\s*([^\n]+)\s*类型[:：]\s*([^\n]+)\s*链接[:：]\s*([^\n]+)"
-            
-            for match in re.finditer(resource_pattern, text):
-                resource_name = match.group(1).strip()
-                resource_type = match.group(2).strip()
-                resource_url = match.group(3).strip()
+            elif entity_type == "Resource":
+                # Extract resource information
+                resource_pattern = r"资源[:：]\s*([^\n]+)\s*类型[:：]\s*([^\n]+)\s*链接[:：]\s*([^\n]+)"
+            
+                for match in re.finditer(resource_pattern, text):
+                    resource_name = match.group(1).strip()
+                    resource_type = match.group(2).strip()
+                    resource_url = match.group(3).strip()
                 
-                self.entities["Resource"].append({
-                    "name": resource_name,
-                    "type": resource_type,
-                    "url": resource_url
-                })
+                    self.entities["Resource"].append(make_record(
+                        "Resource", self.strings,
+                        name=resource_name,
+                        type=resource_type,
+                        url=resource_url
+                    ))
+                    
+        metrics.increment(f"regex.entity.{entity_type}.matches", len(self.entities[entity_type]) - before)
                 
     def extract_relationships(self, text):
         """Extract relationships between entities from text"""
         # Extract course-chapter relationships
         course_chapter_pattern = r"课程\s*([^\n]+)\s*包含\s*章节\s*([^\n]+)"
         
-        for match in re.finditer(course_chapter_pattern, text):
-            course_name = match.group(1).strip()
-            chapter_name = match.group(2).strip()
+        with metrics.timer("regex.relationship.course_chapter"):
+            for match in re.finditer(course_chapter_pattern, text):
+                course_name = match.group(1).strip()
+                chapter_name = match.group(2).strip()
             
-            self.relationships.append({
-                "source": course_name,
-                "target": chapter_name,
-                "type": "CONTAINS"
-            })
+                self.relationships.append(RelationshipRecord(
+                    self.strings,
+                    source=course_name,
+                    target=chapter_name,
+                    type="CONTAINS"
+                ))
             
         # Extract chapter-topic relationships
         chapter_topic_pattern = r"章节\s*([^\n]+)\s*包含\s*知识点\s*([^\n]+)"
         
-        for match in re.finditer(chapter_topic_pattern, text):
-            chapter_name = match.group(1).strip()
-            topic_name = match.group(2).strip()
+        with metrics.timer("regex.relationship.chapter_topic"):
+            for match in re.finditer(chapter_topic_pattern, text):
+                chapter_name = match.group(1).strip()
+                topic_name = match.group(2).strip()
             
-            self.relationships.append({
-                "source": chapter_name,
-                "target": topic_name,
-                "type": "CONTAINS"
-            })
+                self.relationships.append(RelationshipRecord(
+                    self.strings,
+                    source=chapter_name,
+                    target=topic_name,
+                    type="CONTAINS"
+                ))
             
         # Extract topic-resource relationships
         topic_resource_pattern = r"知识点\s*([^\n]+)\s*有\s*资源\s*([^\n]+)"
         
-        for match in re.finditer(topic_resource_pattern, text):
-            topic_name = match.group(1).strip()
-            resource_name = match.group(2).strip()
+        with metrics.timer("regex.relationship.topic_resource"):
+            for match in re.finditer(topic_resource_pattern, text):
+                topic_name = match.group(1).strip()
+                resource_name = match.group(2).strip()
             
-            self.relationships.append({
-                "source": topic_name,
-                "target": resource_name,
-                "type": "HAS_RESOURCE"
-            })
+                self.relationships.append(RelationshipRecord(
+                    self.strings,
+                    source=topic_name,
+                    target=resource_name,
+                    type="HAS_RESOURCE"
+                ))
             
     def process_text(self, text):
-        """Process text to extract entities and relationships"""
+        """Process text to extract entities and relationships
+
+        The records accumulate in `entities` and `relationships`; call
+        `as_dict()` once at the end for a plain-dict copy ready for
+        `json.dumps`, rather than copying everything after every call.
+        """
+        self._process_chunk(text)
+        
+    def _process_chunk(self, text):
+        entity_marks = {entity_type: len(self.entities[entity_type]) for entity_type in ENTITY_TYPES}
+        relationship_mark = len(self.relationships)
+        
         # Extract all entity types
         self.extract_entities(text, "Course")
         self.extract_entities(text, "Chapter")
@@ -124,17 +165,142 @@ class InformationExtractor:
         # Extract relationships
         self.extract_relationships(text)
         
+        if self.resolver is not None:
+            with metrics.timer("extract.resolve"):
+                self._resolve_new_mentions(entity_marks, relationship_mark)
+        
+    def _reset_parents(self):
+        # Course the text is currently about, and chapters seen before any course
+        self._course = None
+        self._orphan_chapters = []
+        # (course, chapter order) -> chapter name
+        self._chapters_by_order = {}
+        self._resource_topics = {}
+        
+    def _parent_of(self, entity_type, entity):
+        """Name of the containing entity, used as part of the canonical key"""
+        if entity_type == "Chapter":
+            return self._course
+        if entity_type == "Topic":
+            chapter_order = str(entity.get("number", "")).split(".")[0]
+            if not chapter_order.isdigit():
+                return None
+            return self._chapters_by_order.get((self._course, int(chapter_order)))
+        if entity_type == "Resource":
+            return self._resource_topics.get(entity.get("name"))
+        return None
+        
+    def _resolve_new_mentions(self, entity_marks, relationship_mark):
+        """Replace the mentions appended since the marks by their canonical records"""
+        new_relationships = self.relationships[relationship_mark:]
+        del self.relationships[relationship_mark:]
+        for relationship in new_relationships:
+            if relationship["type"] == "HAS_RESOURCE":
+                self._resource_topics.setdefault(relationship["target"], relationship["source"])
+            if self.resolver.add_relationship(relationship):
+                self.relationships.append(relationship)
+                
+        # Parents are resolved before children so their names are available
+        for entity_type in ENTITY_TYPES:
+            mentions = self.entities[entity_type][entity_marks[entity_type]:]
+            del self.entities[entity_type][entity_marks[entity_type]:]
+            metrics.increment(f"extract.mentions.{entity_type}", len(mentions))
+            for mention in mentions:
+                parent = self._parent_of(entity_type, mention)
+                if entity_type == "Topic" and parent:
+                    mention["chapter"] = parent
+                elif entity_type == "Resource" and parent:
+                    mention["topic"] = parent
+                record, is_new = self.resolver.add(entity_type, mention, parent)
+                if is_new:
+                    self.entities[entity_type].append(record)
+                    if entity_type == "Chapter":
+                        self._chapters_by_order.setdefault((parent, record["order"]), record["name"])
+                        if parent is None:
+                            self._orphan_chapters.append(record)
+                if entity_type == "Course":
+                    self._course = record["name"]
+                    self._adopt_orphan_chapters()
+                    
+    def _adopt_orphan_chapters(self):
+        """Re-resolve chapters seen before any course (e.g. in an earlier chunk) under the current course"""
+        for record in self._orphan_chapters:
+            canonical = self.resolver.rekey("Chapter", record, self._course)
+            if canonical is not record:
+                self.entities["Chapter"].remove(record)
+            if self._chapters_by_order.get((None, record["order"])) == record["name"]:
+                del self._chapters_by_order[(None, record["order"])]
+            self._chapters_by_order.setdefault((self._course, canonical["order"]), canonical["name"])
+        self._orphan_chapters = []
+        
+    def process_stream(self, lines, chunk_chars=1 << 20, max_chunk_chars=None):
+        """Extract from an iterable of lines (e.g. an open file) in bounded chunks
+
+        Chunks are cut at blank lines once they exceed `chunk_chars`, so no
+        record is split; input without blank lines is cut at any line once a
+        chunk reaches `max_chunk_chars` (default 8 x `chunk_chars`). With
+        entity resolution on, memory is bounded by the number of distinct
+        entities rather than the size of the input.
+        """
+        if max_chunk_chars is None:
+            max_chunk_chars = 8 * chunk_chars
+        buffer = []
+        size = 0
+        for line in lines:
+            buffer.append(line)
+            size += len(line)
+            if (size >= chunk_chars and not line.strip()) or size >= max_chunk_chars:
+                self._process_chunk("".join(buffer))
+                buffer = []
+                size = 0
+        if buffer:
+            self._process_chunk("".join(buffer))
+        
+    def process_file(self, input_file, encoding=None, chunk_chars=1 << 20):
+        """Stream a text file through `process_stream`
+
+        The encoding is detected from the start of the file unless given;
+        undecodable bytes are recorded in `read_reports` rather than raised.
+        """
+        with TextReader(input_file, encoding) as reader:
+            self.process_stream(reader, chunk_chars)
+        self.read_reports.append(reader.summary())
+        
+    def process_folder(self, folder, suffixes=(".txt", ".md")):
+        """Extract from every text file under a folder, each read once in its own encoding"""
+        for path in iter_text_files(folder, suffixes):
+            self.process_file(path)
+        
+    def as_dict(self):
+        """Plain-dict copy of the extracted records, e.g. for JSON output"""
         return {
-            "entities": self.entities,
-            "relationships": self.relationships
+            "entities": {
+                entity_type: [record.to_dict() for record in records]
+                for entity_type, records in self.entities.items()
+            },
+            "relationships": [relationship.to_dict() for relationship in self.relationships]
         }
         
+    def iter_records(self):
+        """Yield each entity and relationship as a flat dict tagged with its kind"""
+        for entity_type, records in self.entities.items():
+            for record in records:
+                yield {"kind": "entity", "entity_type": entity_type, **record.to_dict()}
+        for relationship in self.relationships:
+            yield {"kind": "relationship", **relationship.to_dict()}
+            
     def save_extracted_data(self, output_file="data/extracted_data.json"):
-        """Save extracted data to JSON file"""
-        extracted_data = {
-            "entities": self.entities,
-            "relationships": self.relationships
-        }
+        """Save extracted data to JSON file
+
+        A `.jsonl` path (optionally `.gz`/`.zst`) writes one record per line
+        as it goes instead of building the whole document first.
+        """
+        if is_jsonl_path(output_file):
+            count = write_jsonl(output_file, self.iter_records())
+            print(f"Extracted data saved to {output_file} ({count} records)")
+            return output_file
+            
+        extracted_data = self.as_dict()
         
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -146,18 +312,41 @@ class InformationExtractor:
         return output_file
         
     def load_extracted_data(self, input_file="data/extracted_data.json"):
-        """Load extracted data from JSON file"""
+        """Load extracted data from a JSON or JSON Lines file
+
+        Returns the loaded records as plain dicts (see `as_dict`), whichever
+        format the file is in.
+        """
         if not os.path.exists(input_file):
             print(f"File {input_file} does not exist")
             return None
             
-        with open(input_file, 'r', encoding='utf-8') as f:
-            extracted_data = json.load(f)
-            
-        self.entities = defaultdict(list, extracted_data["entities"])
-        self.relationships = extracted_data["relationships"]
+        self.strings = StringPool()
+        self.entities = defaultdict(list)
+        self.relationships = []
+        
+        if is_jsonl_path(input_file):
+            # Records are built line by line; no intermediate document is held
+            for line_record in read_jsonl(input_file):
+                if line_record.pop("kind") == "relationship":
+                    self.relationships.append(RelationshipRecord(self.strings, **line_record))
+                else:
+                    entity_type = line_record.pop("entity_type")
+                    self.entities[entity_type].append(make_record(entity_type, self.strings, **line_record))
+        else:
+            extracted_data = json.loads(read_text(input_file))
+            for entity_type, entities in extracted_data["entities"].items():
+                self.entities[entity_type] = [make_record(entity_type, self.strings, **entity) for entity in entities]
+            self.relationships = [RelationshipRecord(self.strings, **relationship)
+                                  for relationship in extracted_data["relationships"]]
+        
+        # Re-register loaded records so later text merges into them
+        if self.resolver is not None:
+            self.resolver = EntityResolver(self.description_policy)
+            self._reset_parents()
+            self._resolve_new_mentions({entity_type: 0 for entity_type in ENTITY_TYPES}, 0)
         
-        return extracted_data
+        return self.as_dict()
         
     def convert_to_knowledge_graph_format(self):
         """Convert extracted data to knowledge graph format"""
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger("knowledgegraph")
+
+# Checked before any message formatting so disabled verbose logging costs one global lookup
+_verbose = False
+
+
+def set_verbose(enabled=True):
+    """Turn per-operation log lines (node creation, statements) on or off"""
+    global _verbose
+    _verbose = bool(enabled)
+    if _verbose and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG if _verbose else logging.WARNING)
+
+
+def log_verbose(message, *args):
+    """Log a %-style message only when verbose mode is on; args are not formatted otherwise"""
+    if _verbose:
+        logger.debug(message, *args)
+
+
+class _NullTimer:
+    """Shared no-op context manager returned while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, failed=exc_type is not None)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        """Thread-safe registry of counters and timers"""
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        # name -> [count, total, min, max, errors]
+        self._timers = {}
+        self._hooks = []
+
+    def timer(self, name):
+        """Context manager that records the elapsed time of its block under `name`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorator form of `timer`"""
+        def decorator(func):
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorator
+
+    def increment(self, name, value=1):
+        """Add `value` to counter `name`"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, elapsed, failed=False):
+        """Record one timed observation and notify profiler hooks"""
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                self._timers[name] = [1, elapsed, elapsed, elapsed, int(failed)]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed < stats[2]:
+                    stats[2] = elapsed
+                if elapsed > stats[3]:
+                    stats[3] = elapsed
+                stats[4] += int(failed)
+            hooks = list(self._hooks)
+        for hook in hooks:
+            hook(name, elapsed)
+
+    def add_hook(self, hook):
+        """Register `hook(name, elapsed)` to be called after every timed block"""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def reset(self):
+        """Clear all recorded counters and timers"""
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def snapshot(self):
+        """Return a JSON-serialisable copy of the current counters and timers"""
+        with self._lock:
+            timers = {
+                name: {
+                    "count": count,
+                    "total_s": total,
+                    "mean_s": total / count,
+                    "min_s": low,
+                    "max_s": high,
+                    "errors": errors,
+                }
+                for name, (count, total, low, high, errors) in self._timers.items()
+            }
+            return {
+                "timestamp": time.time(),
+                "counters": dict(self._counters),
+                "timers": timers,
+            }
+
+    def export(self, file_path="data/metrics.json"):
+        """Write a metrics snapshot to a JSON file"""
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return file_path
+
+    def print_report(self, top=20):
+        """Print the slowest timers by total time"""
+        timers = self.snapshot()["timers"]
+        rows = sorted(timers.items(), key=lambda item: item[1]["total_s"], reverse=True)[:top]
+        print("\n=== 耗时统计 ===")
+        for name, stats in rows:
+            print(f"{name:40} {stats['count']:8d} calls  {stats['total_s'] * 1000:10.1f} ms  "
+                  f"{stats['mean_s'] * 1000:8.3f} ms/call")
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_depth=20):
+        """Statistical profiler that samples every thread's stack from a background thread
+
+        Each sample holds the GIL while it walks the stack of every thread,
+        stalling the profiled threads for that long; the overhead grows with
+        the number of threads and `max_depth` and shrinks with a longer
+        `interval`. Meant for diagnostic runs rather than always-on use.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                depth = 0
+                while frame is not None and depth < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                    depth += 1
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return self
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def top_functions(self, n=20):
+        """Functions ranked by the number of samples in which they were on the stack"""
+        inclusive = Counter()
+        for stack, count in self.samples.items():
+            for frame_name in set(stack.split(";")):
+                inclusive[frame_name] += count
+        return inclusive.most_common(n)
+
+    def export_collapsed(self, file_path="data/profile.folded"):
+        """Write samples in collapsed-stack format (one `stack count` line each) for flame graphs"""
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return file_path
+
+
+# Process-wide registry used by the graph, database and extraction layers
+metrics = Metrics()
@@ -1,5 +1,6 @@
 from py2neo import Graph, Node, Relationship
 import re
+from cypher_templates import CYPHER
 
 class IntelligentDataEngineeringKG:
     def __init__(self):
@@ -74,20 +75,21 @@ class IntelligentDataEngineeringKG:
         question = question.lower()
         
         if "课程" in question or "智能数据工程" in question:
-            course = self.g.nodes.match("Course").first()
-            return f"智能数据工程是{course['description']}"
+            courses = CYPHER.run(self.g, "legacy_course")
+            if courses:
+                return f"智能数据工程是{courses[0]['description']}"
             
         if "章节" in question or "内容" in question:
-            chapters = self.g.nodes.match("Chapter").all()
+            chapters = CYPHER.run(self.g, "legacy_chapters")
             response = "课程包含以下章节：\n"
             for chapter in chapters:
                 response += f"- {chapter['name']}: {chapter['description']}\n"
             return response
             
-        # 查找特定章节的知识点
-        for chapter in self.g.nodes.match("Chapter").all():
+        # 查找特定章节的知识点（章节名作为参数传入，不拼接进查询文本）
+        for chapter in CYPHER.run(self.g, "legacy_chapters"):
             if chapter['name'] in question:
-                topics = self.g.nodes.match("Topic").where(f"MATCH (c:Chapter)-[:包含]->(t:Topic) WHERE c.name = '{chapter['name']}' RETURN t")
+                topics = CYPHER.run(self.g, "legacy_topics_by_chapter", chapter_name=chapter['name'])
                 response = f"{chapter['name']}章节包含以下知识点：\n"
                 for topic in topics:
                     response += f"- {topic['name']}\n"
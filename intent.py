@@ -0,0 +1,190 @@
+import json
+import re
+import time
+from instrumentation import metrics
+
+# Intent name -> (required entity slot or None, {keyword: weight})
+DEFAULT_INTENTS = {
+    "course_info": (None, {"课程": 1.0, "这门课": 2.0, "智能数据工程": 1.5, "是什么": 1.0, "介绍": 0.5, "简介": 1.5}),
+    "chapter_list": (None, {"章节": 2.5, "哪些章": 2.5, "目录": 2.5, "大纲": 2.5, "几章": 2.5, "内容": 1.0}),
+    "topics_of_chapter": ("chapter", {"知识点": 1.5, "包含": 0.5, "哪些": 0.5, "内容": 0.5, "讲": 0.5, "学什么": 1.0}),
+    "resources_of_topic": ("topic", {"资源": 2.0, "资料": 2.0, "教程": 1.5, "视频": 1.5, "文档": 1.5, "链接": 1.5,
+                                     "学习": 0.5, "参考": 1.0}),
+    "prerequisites": ("topic", {"前置": 3.0, "先学": 3.0, "依赖": 3.0, "之前": 2.0, "基础": 1.0}),
+    "following_topics": ("topic", {"之后": 3.0, "后续": 3.0, "接下来": 3.0, "下一步": 3.0, "然后学": 3.0}),
+}
+
+# Bonus for an intent whose required entity was found in the question
+ENTITY_BONUS = 3.0
+
+# Smaller bonus when the entity is only remembered from an earlier question,
+# so a follow-up's own keywords still decide between intents
+CONTEXT_BONUS = 1.0
+
+FALLBACK_INTENT = "keyword_search"
+
+
+class IntentResult:
+    __slots__ = ("intent", "entities", "score", "elapsed_ms", "remembered")
+
+    def __init__(self, intent, entities, score, elapsed_ms, remembered=()):
+        self.intent = intent
+        self.entities = entities
+        self.score = score
+        self.elapsed_ms = elapsed_ms
+        # Slots filled from the conversation context rather than the question
+        self.remembered = remembered
+
+    def __repr__(self):
+        return f"IntentResult({self.intent!r}, {self.entities!r}, score={self.score:.2f})"
+
+
+class IntentClassifier:
+    def __init__(self, intents=None, latency_budget_ms=2.0):
+        """Single-pass linear intent classifier over keyword and entity features
+
+        All keywords and entity names are compiled into one alternation inside
+        a lookahead, longest first, so a single scan finds the longest term at
+        every position; terms nested inside a longer match (e.g. the keyword
+        "学习" inside the topic "机器学习算法") are dropped, while partially
+        overlapping entities such as "数据可视化" / "可视化工具" are both kept.
+        Each intent scores the sum of its matched keyword weights, plus
+        `ENTITY_BONUS` when the entity slot it needs is filled; intents whose
+        slot is empty are not eligible. A conversation `context` passed to
+        `classify` fills slots the question leaves empty, worth `CONTEXT_BONUS`
+        only to intents whose keywords the question matches.
+        """
+        self.intents = dict(DEFAULT_INTENTS if intents is None else intents)
+        self.latency_budget_ms = latency_budget_ms
+        self.entities = {}
+        self._pattern = None
+        self._features = {}
+
+    def register_intent(self, name, slot, keywords):
+        """Add or replace an intent; `slot` is the entity type it needs (or None)"""
+        self.intents[name] = (slot, dict(keywords))
+        self._pattern = None
+
+    def add_entities(self, slot, names):
+        """Make entity names of one type (e.g. "chapter", "topic") recognisable"""
+        self.entities.setdefault(slot, set()).update(names)
+        self._pattern = None
+
+    def compile(self):
+        """Build the combined pattern and the surface-form -> features table"""
+        features = {}
+        for intent, (_, keywords) in self.intents.items():
+            for keyword, weight in keywords.items():
+                features.setdefault(keyword.lower(), []).append(("keyword", intent, weight))
+        for slot, names in self.entities.items():
+            for name in names:
+                features.setdefault(name.lower(), []).append(("entity", slot, name))
+        alternatives = sorted(features, key=len, reverse=True)
+        self._features = features
+        self._pattern = re.compile("(?=(" + "|".join(map(re.escape, alternatives)) + "))") if alternatives else None
+        return self
+
+    def classify(self, question, context=None):
+        """Return the best `IntentResult` for a question
+
+        `context` maps slots to the entity remembered from earlier in the
+        conversation, e.g. `{"chapter": "数据采集"}`; it is used only for
+        slots the question itself does not fill.
+        """
+        start = time.perf_counter()
+        if self._pattern is None:
+            self.compile()
+        keyword_scores = {}
+        found = {}
+        if self._pattern is not None:
+            covered_to = 0
+            for match in self._pattern.finditer(question.lower()):
+                term = match.group(1)
+                end = match.start() + len(term)
+                if end <= covered_to:
+                    continue
+                covered_to = end
+                for kind, key, value in self._features[term]:
+                    if kind == "keyword":
+                        keyword_scores[key] = keyword_scores.get(key, 0.0) + value
+                    elif value not in found.setdefault(key, []):
+                        found[key].append(value)
+        remembered = set()
+        for slot, name in (context or {}).items():
+            if slot in self.entities and slot not in found and name:
+                found[slot] = [name]
+                remembered.add(slot)
+
+        best, best_score = FALLBACK_INTENT, 0.0
+        for intent, (slot, _) in self.intents.items():
+            score = keyword_scores.get(intent, 0.0)
+            if slot is not None:
+                if slot not in found:
+                    continue
+                if slot not in remembered:
+                    score += ENTITY_BONUS
+                elif score > 0:
+                    score += CONTEXT_BONUS
+                else:
+                    # A remembered entity alone does not make a question about it ("你好")
+                    continue
+            if score > best_score:
+                best, best_score = intent, score
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.increment(f"intent.{best}")
+        if elapsed_ms > self.latency_budget_ms:
+            metrics.increment("intent.over_budget")
+        return IntentResult(best, found, best_score, elapsed_ms, remembered)
+
+
+def classifier_from_course_data(course_data, **kwargs):
+    """Classifier whose entities are the chapters and topics of nested course data"""
+    classifier = IntentClassifier(**kwargs)
+    classifier.add_entities("chapter", [chapter["name"] for chapter in course_data["chapters"]])
+    classifier.add_entities("topic", [topic["name"] for chapter in course_data["chapters"]
+                                      for topic in chapter["topics"]])
+    return classifier.compile()
+
+
+def load_eval_set(file_path="intent_eval.jsonl"):
+    """Labelled questions, one `{"question", "intent", "entities"}` object per line"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(classifier, examples, repeat=50):
+    """Accuracy (intent and entities) and per-question CPU cost of a classifier
+
+    Each question is classified `repeat` times and timed with the process
+    CPU clock, so the cost figures are not skewed by scheduling noise.
+    """
+    correct = 0
+    entity_correct = 0
+    cpu_us = []
+    errors = []
+    for example in examples:
+        started = time.process_time_ns()
+        for _ in range(repeat):
+            result = classifier.classify(example["question"])
+        cpu_us.append((time.process_time_ns() - started) / repeat / 1000)
+        if result.intent == example["intent"]:
+            correct += 1
+        else:
+            errors.append({"question": example["question"], "expected": example["intent"], "got": result.intent})
+        expected_entities = example.get("entities", {})
+        if all(sorted(result.entities.get(slot, [])) == sorted(names) for slot, names in expected_entities.items()):
+            entity_correct += 1
+
+    cpu_us.sort()
+    count = len(examples) or 1
+    return {
+        "questions": len(examples),
+        "accuracy": correct / count,
+        "entity_accuracy": entity_correct / count,
+        "mean_cpu_us": sum(cpu_us) / count,
+        "p95_cpu_us": cpu_us[int(0.95 * (len(cpu_us) - 1))] if cpu_us else 0.0,
+        "max_cpu_us": cpu_us[-1] if cpu_us else 0.0,
+        "within_budget": all(us / 1000 <= classifier.latency_budget_ms for us in cpu_us),
+        "errors": errors,
+    }
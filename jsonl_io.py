@@ -0,0 +1,114 @@
+import gzip
+import io
+import json
+import os
+from text_loader import read_text
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSONL_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+
+
+def is_jsonl_path(path):
+    """True for `.jsonl` files, optionally compressed as `.gz` or `.zst`"""
+    return str(path).endswith(JSONL_SUFFIXES)
+
+
+def dumps_line(obj):
+    """Serialise one record as a UTF-8 JSON line, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def loads_line(line):
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def open_compressed(path, mode="rb"):
+    """Open a binary stream, compressing by file suffix (.gz via gzip, .zst via zstandard)"""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("zstandard is required for .zst files")
+        if "w" in mode:
+            return zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, mode)
+
+
+def write_jsonl(path, records):
+    """Write records one per line as they are produced; returns the number written"""
+    directory = os.path.dirname(str(path))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    count = 0
+    with open_compressed(path, "wb") as f:
+        for record in records:
+            f.write(dumps_line(record))
+            count += 1
+    return count
+
+
+def read_jsonl(path):
+    """Yield records one line at a time; blank lines are skipped"""
+    with open_compressed(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield loads_line(line)
+
+
+def iter_course_records(course_data):
+    """Flatten nested course data into course/chapter/topic/resource line records, parents first"""
+    yield {"kind": "course", **course_data["course"]}
+    for chapter in course_data["chapters"]:
+        yield {"kind": "chapter", **{k: v for k, v in chapter.items() if k != "topics"}}
+        for topic in chapter["topics"]:
+            yield {"kind": "topic", "chapter": chapter["name"],
+                   **{k: v for k, v in topic.items() if k != "resources"}}
+            for resource in topic.get("resources", []):
+                yield {"kind": "resource", "chapter": chapter["name"], "topic": topic["name"], **resource}
+
+
+def assemble_course_data(records):
+    """Rebuild the nested course structure from line records in a single pass"""
+    course_data = {"course": {}, "chapters": []}
+    chapters = {}
+    topics = {}
+    for record in records:
+        kind = record.pop("kind")
+        if kind == "course":
+            course_data["course"] = record
+        elif kind == "chapter":
+            record["topics"] = []
+            chapters[record["name"]] = record
+            course_data["chapters"].append(record)
+        elif kind == "topic":
+            record["resources"] = []
+            chapter_name = record.pop("chapter")
+            topics[(chapter_name, record["name"])] = record
+            chapters[chapter_name]["topics"].append(record)
+        elif kind == "resource":
+            key = (record.pop("chapter"), record.pop("topic"))
+            topics[key]["resources"].append(record)
+    return course_data
+
+
+def load_course_data(path):
+    """Load course data from either a JSON document (in any detected encoding) or a JSON Lines file"""
+    if is_jsonl_path(path):
+        return assemble_course_data(read_jsonl(path))
+    # JSON documents may come in any encoding (e.g. GBK course material)
+    return loads_line(read_text(path))
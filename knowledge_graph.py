@@ -1,178 +1,587 @@
-from py2neo import Graph, Node, Relationship
 import json
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import metrics, log_verbose
+from async_graph import AsyncGraphClient
+from text_index import InvertedIndex
+from reachability import HierarchyIndex
+from jsonl_io import load_course_data
+from intent import IntentClassifier, FALLBACK_INTENT
+from entity_resolution import course_key as make_course_key
+from staged_build import StagedBuild
+from cypher_templates import CYPHER
+
+try:
+    from py2neo import Graph, Node, Relationship
+except ImportError:
+    # Only needed to connect; snapshots and tests can use the query logic without it
+    Graph = Node = Relationship = None
+
+# Labels partitioned by `course_key`; the queries themselves live in cypher_templates.py
+PARTITIONED_LABELS = ("Course", "Chapter", "Topic", "Resource")
 
 class KnowledgeGraph:
-    def __init__(self, uri="http://localhost:7474", username="neo4j", password="1"):
-        """Initialize connection to Neo4j database"""
+    def __init__(self, uri="http://localhost:7474", username="neo4j", password="1", pool_size=4, course_key=None,
+                 query_timeout=None):
+        """Initialize connection to Neo4j database
+
+        With `course_key` set, queries and in-memory indexes are scoped to
+        that course's partition; without it they span the whole graph.
+        With `query_timeout` (seconds), registered templates run on the
+        pooled async client and give up after that long, as the QA paths do.
+        """
+        if Graph is None:
+            raise ImportError("py2neo is required to connect to Neo4j")
         self.g = Graph(uri, auth=(username, password))
+        self.uri = uri
+        self.auth = (username, password)
+        self.pool_size = pool_size
+        self.query_timeout = query_timeout
+        self._async_client = None
+        self._init_qa_state(course_key)
         print(f"Connected to Neo4j database at {uri}")
         
+    def _init_qa_state(self, course_key=None):
+        """In-memory indexes and intent handlers, all built lazily"""
+        self.course_key = course_key
+        self.text_index = None
+        self.hierarchy = None
+        self.intent_classifier = None
+        # (name, slot, keywords) of intents added with register_intent
+        self.registered_intents = []
+        self.intent_handlers = {
+            "course_info": self._answer_course_info,
+            "chapter_list": self._answer_chapter_list,
+            "topics_of_chapter": self._answer_topics_of_chapter,
+            "resources_of_topic": self._answer_resources_of_topic,
+            "prerequisites": self._answer_prerequisites,
+            "following_topics": self._answer_following_topics,
+            FALLBACK_INTENT: self._answer_keyword_search,
+        }
+        
+    @property
+    def async_client(self):
+        """Pooled client used to run independent queries concurrently, created on first use"""
+        if self._async_client is None:
+            self._async_client = AsyncGraphClient(self.uri, *self.auth, pool_size=self.pool_size)
+        return self._async_client
+        
+    def _run(self, name, query, **params):
+        """Run a Cypher query, timing it under `cypher.<name>`"""
+        with metrics.timer(f"cypher.{name}"):
+            result = self.g.run(query, **params).data()
+        metrics.increment(f"cypher.{name}.rows", len(result))
+        return result
+        
+    def run_cypher(self, name, query, **params):
+        """Run a parameterised Cypher statement on behalf of other modules, timed as `cypher.<name>`"""
+        return self._run(name, query, **params)
+        
+    def query(self, name, timeout=None, **params):
+        """Run a registered Cypher template by name
+
+        With `timeout` (default `query_timeout`) the template runs on the
+        async connection pool and raises asyncio.TimeoutError after that
+        many seconds.
+        """
+        timeout = self.query_timeout if timeout is None else timeout
+        if timeout is None:
+            return CYPHER.run(self.g, name, **params)
+        return self.async_client.call_sync(CYPHER.run, name, timeout=timeout, **params)
+        
+    def query_batch(self, name, keys, timeout=None, **params):
+        """Run a template for many keys in one round trip; returns `{key: rows}`
+
+        `timeout` works as for `query`.
+        """
+        timeout = self.query_timeout if timeout is None else timeout
+        if timeout is None:
+            return CYPHER.run_batch(self.g, name, keys, **params)
+        return self.async_client.call_sync(CYPHER.run_batch, name, keys, timeout=timeout, **params)
+        
+    def _scope(self, course_key=None):
+        """Course partition a query should use: the explicit key, else the graph's own"""
+        return course_key if course_key is not None else self.course_key
+        
+    def _create(self, name, subgraph):
+        """Create a node or relationship, timing it under `cypher.<name>`"""
+        with metrics.timer(f"cypher.{name}"):
+            self.g.create(subgraph)
+        
     def clear_database(self):
         """Clear all nodes and relationships in the database"""
-        self.g.delete_all()
+        with metrics.timer("cypher.clear_database"):
+            self.g.delete_all()
+        self.reset_indexes()
         print("Neo4j database cleared")
         
-    def create_course_node(self, course_name, course_description):
+    def reset_indexes(self):
+        """Drop the in-memory indexes after the graph was replaced underneath them
+
+        Each is rebuilt from the new graph on next use (the intent
+        classifier with the registered intents).
+        """
+        self.text_index = None
+        self.hierarchy = None
+        self.intent_classifier = None
+        
+    def create_course_node(self, course_name, course_description, course_key=None):
         """Create a course node in the knowledge graph"""
         course = Node("Course", name=course_name, description=course_description)
-        self.g.create(course)
-        print(f"Created course node: {course_name}")
+        if course_key is not None:
+            course["course_key"] = course_key
+        self._create("create_course_node", course)
+        self._node_created("Course", course)
+        log_verbose("Created course node: %s", course_name)
         return course
         
-    def create_chapter_node(self, chapter_name, chapter_description, chapter_order):
+    def create_chapter_node(self, chapter_name, chapter_description, chapter_order, course_key=None):
         """Create a chapter node in the knowledge graph"""
         chapter = Node("Chapter", name=chapter_name, description=chapter_description, order=chapter_order)
-        self.g.create(chapter)
-        print(f"Created chapter node: {chapter_name}")
+        if course_key is not None:
+            chapter["course_key"] = course_key
+        self._create("create_chapter_node", chapter)
+        self._node_created("Chapter", chapter)
+        log_verbose("Created chapter node: %s", chapter_name)
         return chapter
         
-    def create_topic_node(self, topic_name, topic_description):
+    def create_topic_node(self, topic_name, topic_description, course_key=None):
         """Create a topic node in the knowledge graph"""
         topic = Node("Topic", name=topic_name, description=topic_description)
-        self.g.create(topic)
-        print(f"Created topic node: {topic_name}")
+        if course_key is not None:
+            topic["course_key"] = course_key
+        self._create("create_topic_node", topic)
+        self._node_created("Topic", topic)
+        log_verbose("Created topic node: %s", topic_name)
         return topic
         
-    def create_resource_node(self, resource_name, resource_type, resource_url):
+    def create_resource_node(self, resource_name, resource_type, resource_url, course_key=None):
         """Create a resource node in the knowledge graph"""
         resource = Node("Resource", name=resource_name, type=resource_type, url=resource_url)
-        self.g.create(resource)
-        print(f"Created resource node: {resource_name}")
+        if course_key is not None:
+            resource["course_key"] = course_key
+        self._create("create_resource_node", resource)
+        self._node_created("Resource", resource)
+        log_verbose("Created resource node: %s", resource_name)
         return resource
         
     def create_relationship(self, start_node, relationship_type, end_node):
         """Create a relationship between two nodes"""
         rel = Relationship(start_node, relationship_type, end_node)
-        self.g.create(rel)
-        print(f"Created relationship: {start_node['name']} -{relationship_type}-> {end_node['name']}")
+        self._create("create_relationship", rel)
+        if self.hierarchy is not None and relationship_type in ("CONTAINS", "HAS_RESOURCE"):
+            self.hierarchy.add_edge(self._node_key(start_node), self._node_key(end_node))
+        log_verbose("Created relationship: %s -%s-> %s", start_node['name'], relationship_type, end_node['name'])
         return rel
         
-    def build_knowledge_graph_from_json(self, json_file_path):
-        """Build knowledge graph from JSON data"""
+    def build_knowledge_graph_from_json(self, json_file_path, resumable=False, force=False):
+        """Build knowledge graph from JSON data
+
+        The course's partition is replaced as a whole (see `load_course`).
+        With `resumable` the graph is staged in journaled batches and swapped
+        in at the end (see staged_build.py), so an interrupted build resumes
+        where it stopped instead of starting over; `force` restarts it.
+        """
         if not os.path.exists(json_file_path):
             print(f"File {json_file_path} does not exist")
             return False
             
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            course_data = json.load(f)
-            
-        # Clear existing database
-        self.clear_database()
-        
-        # Create course node
-        course = self.create_course_node(
-            course_data["course"]["name"],
-            course_data["course"]["description"]
-        )
-        
-        # Create chapter nodes and relationships
-        for chapter_data in course_data["chapters"]:
-            chapter = self.create_chapter_node(
-                chapter_data["name"],
-                chapter_data["description"],
-                chapter_data["order"]
-            )
-            
-            # Create relationship between course and chapter
-            self.create_relationship(course, "CONTAINS", chapter)
+        if resumable:
+            return StagedBuild(self).run(json_file_path, force=force)
             
-            # Create topic nodes and relationships
-            for topic_data in chapter_data["topics"]:
-                topic = self.create_topic_node(
-                    topic_data["name"],
-                    topic_data["description"]
-                )
-                
-                # Create relationship between chapter and topic
-                self.create_relationship(chapter, "CONTAINS", topic)
-                
-                # Create resource nodes and relationships
-                for resource_data in topic_data.get("resources", []):
-                    resource = self.create_resource_node(
-                        resource_data["name"],
-                        resource_data["type"],
-                        resource_data["url"]
-                    )
-                    
-                    # Create relationship between topic and resource
-                    self.create_relationship(topic, "HAS_RESOURCE", resource)
-                    
+        # Only this course's partition is replaced; other courses stay as they are
+        self.create_partition_indexes()
+        self.load_course(load_course_data(json_file_path))
+        
         print("Knowledge graph built successfully from JSON data")
         return True
         
-    def query_course_info(self):
-        """Query basic course information"""
-        query = """
-        MATCH (c:Course)
-        RETURN c.name AS course_name, c.description AS course_description
+    def create_partition_indexes(self):
+        """Indexes used by the course-anchored queries, per label
+
+        The composite (course_key, name) index serves name lookups within a
+        course; lookups by `course_key` alone (a course's chapters, deleting
+        a partition) need the single-property index.
+        """
+        for label in PARTITIONED_LABELS:
+            self.query(f"partition_index_{label.lower()}")
+            self.query(f"partition_key_index_{label.lower()}")
+            
+    def load_course(self, course_data, batch_size=1000):
+        """Replace one course's partition, leaving every other course untouched
+
+        The old partition is deleted and the new one created with batched
+        UNWIND statements in a single transaction, so readers see either the
+        old or the new course. The Course node gets a new `build_version`.
+        Returns the course key.
         """
-        result = self.g.run(query).data()
-        return result[0] if result else None
+        course = course_data["course"]
+        key = course.get("key") or make_course_key(course["name"])
+        chapters, topics, resources = [], [], []
+        for chapter in course_data["chapters"]:
+            chapters.append({"name": chapter["name"], "description": chapter.get("description"),
+                             "order": chapter.get("order")})
+            for topic in chapter["topics"]:
+                topics.append({"chapter": chapter["name"], "name": topic["name"],
+                               "description": topic.get("description")})
+                for resource in topic.get("resources", []):
+                    resources.append({"chapter": chapter["name"], "topic": topic["name"], "name": resource["name"],
+                                      "type": resource.get("type"), "url": resource.get("url")})
+                    
+        with metrics.timer("cypher.load_course"):
+            tx = self.g.begin()
+            try:
+                tx.run(CYPHER["delete_course"].query, course_key=key)
+                tx.run(CYPHER["load_course"].query, course_key=key, name=course["name"],
+                       description=course.get("description"), build_version=uuid.uuid4().hex[:16])
+                for name, rows in (("load_chapters", chapters), ("load_topics", topics),
+                                   ("load_resources", resources)):
+                    for start in range(0, len(rows), batch_size):
+                        tx.run(CYPHER[name].query, course_key=key, rows=rows[start:start + batch_size])
+                self.g.commit(tx)
+            except Exception:
+                # The old partition stays in place
+                self.g.rollback(tx)
+                raise
+        # Built again from the new partition on next use
+        self.reset_indexes()
+        metrics.increment("partition.nodes", 1 + len(chapters) + len(topics) + len(resources))
+        log_verbose("Loaded course %s (%s): %d chapters, %d topics, %d resources",
+                    course["name"], key, len(chapters), len(topics), len(resources))
+        return key
         
-    def query_chapters(self):
-        """Query all chapters with their descriptions"""
-        query = """
-        MATCH (c:Chapter)
-        RETURN c.name AS chapter_name, c.description AS chapter_description, c.order AS chapter_order
-        ORDER BY c.order
+    def load_courses(self, sources, max_workers=None):
+        """Load several courses (course data dicts or file paths) into their partitions in parallel"""
+        self.create_partition_indexes()
+        
+        def load(source):
+            course_data = load_course_data(source) if isinstance(source, (str, os.PathLike)) else source
+            return self.load_course(course_data)
+            
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_size, thread_name_prefix="course") as executor:
+            keys = list(executor.map(load, sources))
+        print(f"Loaded {len(keys)} course partitions")
+        return keys
+        
+    def migrate_unkeyed_nodes(self):
+        """One-off cleanup of a graph built before course partitions
+
+        Every Course without a `course_key` gets the key of its name, and so
+        does everything below it; if that course already has a partition, the
+        old copy is deleted instead. Nodes still without a key afterwards
+        belong to no course, so no course-anchored query can reach them, and
+        are deleted. Returns the counts.
         """
-        return self.g.run(query).data()
+        self.create_partition_indexes()
+        partitions = {course["course_key"] for course in self.list_courses() if course["course_key"] is not None}
+        summary = {"keyed_courses": 0, "keyed_nodes": 0, "duplicate_courses": 0}
+        for course in self.query("unkeyed_courses"):
+            key = make_course_key(course["name"])
+            if key in partitions:
+                self.query("delete_unkeyed_course", id=course["id"])
+                summary["duplicate_courses"] += 1
+                continue
+            result = self.query("key_unkeyed_course", id=course["id"], course_key=key)
+            partitions.add(key)
+            summary["keyed_courses"] += 1
+            summary["keyed_nodes"] += result[0]["keyed"] if result else 0
+        result = self.query("delete_unkeyed_nodes")
+        summary["orphans_deleted"] = result[0]["deleted"] if result else 0
+        self.reset_indexes()
+        print("Migrated unkeyed nodes: " + ", ".join(f"{name}={count}" for name, count in summary.items()))
+        return summary
+        
+    def delete_course(self, course_key):
+        """Remove one course and everything below it"""
+        self.query("delete_course", course_key=course_key)
+        
+    def list_courses(self):
+        """Key, name and description of every course in the graph"""
+        return self.query("list_courses")
         
-    def query_topics_by_chapter(self, chapter_name):
+    def query_course_info(self, course_key=None):
+        """Query basic course information; None if no course is in scope and the graph holds several"""
+        course_key = self._scope(course_key)
+        if course_key is not None:
+            result = self.query("course_info_by_key", course_key=course_key)
+        else:
+            result = self.query("query_course_info")
+        return result[0] if len(result) == 1 else None
+        
+    def query_chapters(self, course_key=None):
+        """Query all chapters with their descriptions"""
+        course_key = self._scope(course_key)
+        if course_key is not None:
+            return self.query("chapters_by_course", course_key=course_key)
+        return self.query("query_chapters")
+        
+    def query_topics_by_chapter(self, chapter_name, course_key=None):
         """Query all topics for a specific chapter"""
-        query = """
-        MATCH (c:Chapter {name: $chapter_name})-[:CONTAINS]->(t:Topic)
-        RETURN t.name AS topic_name, t.description AS topic_description
-        """
-        return self.g.run(query, chapter_name=chapter_name).data()
+        course_key = self._scope(course_key)
+        if course_key is not None:
+            return self.query("course_topics_by_chapter", chapter_name=chapter_name, course_key=course_key)
+        return self.query("query_topics_by_chapter", chapter_name=chapter_name)
         
-    def query_resources_by_topic(self, topic_name):
+    def query_resources_by_topic(self, topic_name, course_key=None):
         """Query all resources for a specific topic"""
-        query = """
-        MATCH (t:Topic {name: $topic_name})-[:HAS_RESOURCE]->(r:Resource)
-        RETURN r.name AS resource_name, r.type AS resource_type, r.url AS resource_url
+        course_key = self._scope(course_key)
+        if course_key is not None:
+            return self.query("course_resources_by_topic", topic_name=topic_name, course_key=course_key)
+        return self.query("query_resources_by_topic", topic_name=topic_name)
+        
+    def query_topics_by_chapters(self, chapter_names, timeout=None, course_key=None):
+        """Query topics for several chapters in one round trip, keyed by chapter name"""
+        course_key = self._scope(course_key)
+        if course_key is not None:
+            return self.query_batch("course_topics_by_chapter", chapter_names, timeout, course_key=course_key)
+        return self.query_batch("query_topics_by_chapter", chapter_names, timeout)
+        
+    def query_resources_by_topics(self, topic_names, timeout=None, course_key=None):
+        """Query resources for several topics in one round trip, keyed by topic name"""
+        course_key = self._scope(course_key)
+        if course_key is not None:
+            return self.query_batch("course_resources_by_topic", topic_names, timeout, course_key=course_key)
+        return self.query_batch("query_resources_by_topic", topic_names, timeout)
+        
+    @staticmethod
+    def _node_key(node):
+        """Key used for a node by the in-memory indexes: its graph id, unique even when names repeat"""
+        return node.identity
+        
+    def _node_created(self, label, node):
+        """Keep the in-memory indexes in step with a newly created node"""
+        self._index_node(label, node, self._node_key(node))
+        if self.hierarchy is not None:
+            self.hierarchy.add_node(self._node_key(node), label, node.get("order"), node["name"])
+        if self.intent_classifier is not None and label in ("Chapter", "Topic"):
+            self.intent_classifier.add_entities(label.lower(), [node["name"]])
+            
+    def _index_node(self, label, properties, node_id, index=None):
+        """Keep the keyword index (`text_index` unless given) in step with a created or updated node
+
+        Documents are keyed by graph node id, so same-named topics in
+        different chapters or courses are separate hits.
         """
-        return self.g.run(query, topic_name=topic_name).data()
+        index = self.text_index if index is None else index
+        if index is None:
+            return
+        text = " ".join(str(properties.get(key) or "") for key in ("name", "description", "type"))
+        payload = {
+            "label": label,
+            "name": properties.get("name"),
+            "description": properties.get("description"),
+            "type": properties.get("type"),
+            "url": properties.get("url"),
+        }
+        index.add_document(node_id, text, payload)
         
-    def answer_question(self, question):
-        """Simple question answering based on the knowledge graph"""
-        question = question.lower()
+    def build_text_index(self, course_key=None):
+        """Build the keyword index over all node names and descriptions
+
+        The index covers the graph's own scope, or the course `course_key`
+        (e.g. for a snapshot of one course); only an index of the graph's
+        own scope is kept as `text_index`.
+        """
+        course_key = self._scope(course_key)
+        index = InvertedIndex()
+        with metrics.timer("text_index.build"):
+            if course_key is not None:
+                rows = self.query("course_indexed_nodes", course_key=course_key)
+            else:
+                rows = self.query("indexed_nodes")
+            for row in rows:
+                self._index_node(row["label"], row, row["id"], index)
+        if course_key == self.course_key:
+            self.text_index = index
+        return index
         
-        # Course information
-        if "课程" in question or "智能数据工程" in question:
-            course_info = self.query_course_info()
-            if course_info:
-                return f"智能数据工程是一门{course_info['course_description']}"
-                
-        # Chapter information
-        if "章节" in question or "内容" in question:
-            chapters = self.query_chapters()
+    def search_keywords(self, question, k=5):
+        """Rank nodes whose name or description shares keywords with the question"""
+        if self.text_index is None:
+            self.build_text_index()
+        with metrics.timer("text_index.search"):
+            return [payload for _, _, payload in self.text_index.search(question, k)]
+        
+    def build_hierarchy_index(self, course_key=None):
+        """Precompute the containment closure for multi-hop queries
+
+        Scoped like `build_text_index`; only the graph's own scope is kept
+        as `hierarchy`.
+        """
+        course_key = self._scope(course_key)
+        hierarchy = HierarchyIndex()
+        prefix = "course_" if course_key is not None else ""
+        params = {"course_key": course_key} if course_key is not None else {}
+        with metrics.timer("hierarchy.build"):
+            for row in self.query(f"{prefix}hierarchy_nodes", **params):
+                hierarchy.add_node(row["id"], row["label"], row["order"], row["name"])
+            for row in self.query(f"{prefix}hierarchy_edges", **params):
+                hierarchy.add_edge(row["parent"], row["child"])
+        if course_key == self.course_key:
+            self.hierarchy = hierarchy
+        return hierarchy
+        
+    def _hierarchy(self):
+        if self.hierarchy is None:
+            self.build_hierarchy_index()
+        return self.hierarchy
+        
+    def _collect(self, label, name, lookup):
+        """Names found by `lookup(node)` over every node with this label and name, without repeats"""
+        hierarchy = self._hierarchy()
+        names = {}
+        for node in hierarchy.find(label, name):
+            names.update(dict.fromkeys(hierarchy.names[key] for key in lookup(node)))
+        return list(names)
+        
+    def query_descendants(self, label, name, descendant_label=None):
+        """Names of all nodes below a node across any number of hops, e.g. every resource of a chapter"""
+        return self._collect(label, name, lambda node: self.hierarchy.get_descendants(node, descendant_label))
+        
+    def query_ancestors(self, label, name, ancestor_label=None):
+        """Names of the nodes containing a node, nearest first"""
+        return self._collect(label, name, lambda node: self.hierarchy.get_ancestors(node, ancestor_label))
+        
+    def query_resources_by_chapter(self, chapter_name):
+        """All resources under a chapter, through its topics"""
+        return self.query_descendants("Chapter", chapter_name, "Resource")
+        
+    def query_prerequisites(self, topic_name):
+        """Topics taught before this one in course order"""
+        return self._collect("Topic", topic_name, lambda node: self.hierarchy.preceding(node))
+        
+    def query_following_topics(self, topic_name):
+        """Topics taught after this one in course order"""
+        return self._collect("Topic", topic_name, lambda node: self.hierarchy.following(node))
+        
+    def build_intent_classifier(self):
+        """Compile the question classifier with the chapter and topic names in the graph"""
+        classifier = IntentClassifier()
+        chapter_names = [chapter['chapter_name'] for chapter in self.query_chapters()]
+        classifier.add_entities("chapter", chapter_names)
+        classifier.add_entities("topic", [topic['topic_name']
+                                          for topics in self.query_topics_by_chapters(chapter_names).values()
+                                          for topic in topics])
+        for name, slot, keywords in self.registered_intents:
+            classifier.register_intent(name, slot, keywords)
+        self.intent_classifier = classifier.compile()
+        return self.intent_classifier
+        
+    def register_intent(self, name, slot, keywords, handler):
+        """Teach the QA layer a new intent; `handler(question, entities)` returns an answer or None
+
+        The intent is kept across rebuilds of the classifier.
+        """
+        self.registered_intents = [intent for intent in self.registered_intents if intent[0] != name]
+        self.registered_intents.append((name, slot, dict(keywords)))
+        if self.intent_classifier is not None:
+            self.intent_classifier.register_intent(name, slot, keywords)
+        self.intent_handlers[name] = handler
+        
+    def _answer_course_info(self, question, entities):
+        course_info = self.query_course_info()
+        if course_info:
+            return f"{course_info['course_name']}是一门{course_info['course_description']}"
+        if self.course_key is None:
+            courses = self.list_courses()
+            if len(courses) > 1:
+                return "知识图谱中有以下课程：\n" + "".join(
+                    f"- {course['course_name']}: {course['course_description']}\n" for course in courses)
+        return None
+        
+    def _answer_chapter_list(self, question, entities):
+        chapters = self.query_chapters()
+        if not chapters:
+            return None
+        response = "课程包含以下章节：\n"
+        for chapter in chapters:
+            response += f"- {chapter['chapter_name']}: {chapter['chapter_description']}\n"
+        return response
+        
+    def _answer_topics_of_chapter(self, question, entities):
+        response = ""
+        for chapter_name, topics in self.query_topics_by_chapters(entities["chapter"]).items():
+            if topics:
+                response += f"{chapter_name}章节包含以下知识点：\n"
+                for topic in topics:
+                    response += f"- {topic['topic_name']}: {topic['topic_description']}\n"
+        return response or None
+        
+    def _answer_resources_of_topic(self, question, entities):
+        response = ""
+        for topic_name, resources in self.query_resources_by_topics(entities["topic"]).items():
+            if resources:
+                response += f"{topic_name}的学习资源包括：\n"
+                for resource in resources:
+                    # link_ok is only set once the link checker has run
+                    stale = "（链接已失效）" if resource.get("link_ok") is False else ""
+                    response += f"- {resource['resource_name']} ({resource['resource_type']}): {resource['resource_url']}{stale}\n"
+        return response or None
+        
+    def _answer_prerequisites(self, question, entities):
+        response = ""
+        for topic_name in entities["topic"]:
+            earlier = self.query_prerequisites(topic_name)
+            if earlier:
+                response += f"学习{topic_name}之前建议先掌握以下知识点：\n"
+                response += "".join(f"- {name}\n" for name in earlier)
+        return response or None
+        
+    def _answer_following_topics(self, question, entities):
+        response = ""
+        for topic_name in entities["topic"]:
+            later = self.query_following_topics(topic_name)
+            if later:
+                response += f"{topic_name}之后的知识点：\n"
+                response += "".join(f"- {name}\n" for name in later)
+        return response or None
+        
+    def _answer_keyword_search(self, question, entities):
+        hits = self.search_keywords(question)
+        if not hits:
+            return None
+        response = "以下内容与您的问题相关：\n"
+        for hit in hits:
+            if hit["label"] == "Resource":
+                response += f"- [{hit['label']}] {hit['name']} ({hit['type']}): {hit['url']}\n"
+            else:
+                response += f"- [{hit['label']}] {hit['name']}: {hit['description']}\n"
+        return response
+        
+    def _remember(self, context, result):
+        """Carry the entities of this question over to the next one"""
+        context["intent"] = result.intent
+        named = [slot for slot in ("chapter", "topic")
+                 if slot in result.entities and slot not in result.remembered]
+        for slot in named:
+            context[slot] = result.entities[slot][-1]
+        # A topic places the student in its chapter
+        if "topic" in named and "chapter" not in named:
+            chapters = self.query_ancestors("Topic", context["topic"], "Chapter")
             if chapters:
-                response = "课程包含以下章节：\n"
-                for chapter in chapters:
-                    response += f"- {chapter['chapter_name']}: {chapter['chapter_description']}\n"
-                return response
+                context["chapter"] = chapters[0]
                 
-        # Topic information for a specific chapter
-        for chapter in self.query_chapters():
-            if chapter['chapter_name'] in question:
-                topics = self.query_topics_by_chapter(chapter['chapter_name'])
-                if topics:
-                    response = f"{chapter['chapter_name']}章节包含以下知识点：\n"
-                    for topic in topics:
-                        response += f"- {topic['topic_name']}: {topic['topic_description']}\n"
-                    return response
-                    
-        # Resource information for a specific topic
-        for chapter in self.query_chapters():
-            for topic in self.query_topics_by_chapter(chapter['chapter_name']):
-                if topic['topic_name'] in question:
-                    resources = self.query_resources_by_topic(topic['topic_name'])
-                    if resources:
-                        response = f"{topic['topic_name']}的学习资源包括：\n"
-                        for resource in resources:
-                            response += f"- {resource['resource_name']} ({resource['resource_type']}): {resource['resource_url']}\n"
-                        return response
-                        
-        return "抱歉，我无法理解您的问题。请尝试询问关于课程内容、章节或具体知识点的问题。" 
\ No newline at end of file
+    @metrics.timed("qa.answer_question")
+    def answer_question(self, question, context=None):
+        """Answer a question by classifying its intent once and running the matching query
+        
+        `context` is a per-conversation dict: the chapter and topic it
+        remembers fill in for a follow-up question that names neither, and
+        the ones this question names are remembered for the next.
+        """
+        if self.intent_classifier is None:
+            self.build_intent_classifier()
+        result = self.intent_classifier.classify(question, context)
+        if context is not None:
+            self._remember(context, result)
+        
+        handler = self.intent_handlers.get(result.intent)
+        answer = handler(question, result.entities) if handler else None
+        # Anything the structured queries cannot answer falls back to keyword search
+        if not answer and result.intent != FALLBACK_INTENT:
+            answer = self._answer_keyword_search(question, result.entities)
+        if answer:
+            return answer
+            
+        return "抱歉，我无法理解您的问题。请尝试询问关于课程内容、章节或具体知识点的问题。"
\ No newline at end of file
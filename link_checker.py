@@ -0,0 +1,192 @@
+import asyncio
+import html
+import json
+import os
+import re
+import socket
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlsplit
+from async_utils import run_sync
+from instrumentation import metrics, log_verbose
+
+_TITLE = re.compile(rb"<title[^>]*>(.*?)</title\s*>", re.IGNORECASE | re.DOTALL)
+_TITLE_END = re.compile(rb"</title\s*>", re.IGNORECASE)
+_CHARSET = re.compile(r"charset=([\w-]+)", re.IGNORECASE)
+
+
+def _host(url):
+    return urlsplit(url).netloc.lower()
+
+
+def _parse_title(head, content_type):
+    """Page title from the first bytes of an HTML body, or None"""
+    match = _TITLE.search(head)
+    if not match:
+        return None
+    charset = _CHARSET.search(content_type or "")
+    try:
+        title = match.group(1).decode(charset.group(1) if charset else "utf-8", errors="replace")
+    except LookupError:
+        title = match.group(1).decode("utf-8", errors="replace")
+    return " ".join(html.unescape(title).split()) or None
+
+
+class LinkChecker:
+    def __init__(self, cache_file="data/.link_cache.json", max_concurrency=16, per_host=2,
+                 timeout=10.0, max_age=86400, title_bytes=65536, batch_size=200,
+                 user_agent="data-engineering-kg-linkcheck/1.0"):
+        """Check resource URLs concurrently and remember the results on disk
+
+        At most `max_concurrency` requests are in flight overall and at most
+        `per_host` against any one host. Results are cached in `cache_file`
+        keyed by URL; entries younger than `max_age` seconds are reused
+        without a request, and older ones are revalidated with
+        If-None-Match / If-Modified-Since so unchanged pages cost a 304.
+        Bodies are not downloaded: an HTML page is read only until its
+        title (at most `title_bytes`), and the size is the Content-Length.
+        """
+        self.cache_file = cache_file
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_age = max_age
+        self.title_bytes = title_bytes
+        self.batch_size = batch_size
+        self.user_agent = user_agent
+        self.cache = self._load_cache()
+        self._opener = urllib.request.build_opener()
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        with open(self.cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_cache(self):
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = self.cache_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.cache_file)
+
+    def _fetch(self, url, cached):
+        """Blocking conditional GET; returns a cache entry for `url`"""
+        request = urllib.request.Request(url, headers={"User-Agent": self.user_agent})
+        if cached and cached.get("ok"):
+            if cached.get("etag"):
+                request.add_header("If-None-Match", cached["etag"])
+            if cached.get("last_modified"):
+                request.add_header("If-Modified-Since", cached["last_modified"])
+
+        entry = {"url": url, "checked_at": formatdate(usegmt=True), "error": None}
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                content_type = response.headers.get("Content-Type", "")
+                length = response.headers.get("Content-Length")
+                entry.update({
+                    "status": response.status,
+                    "final_url": response.geturl(),
+                    "title": self._read_title(response, content_type) if "html" in content_type else None,
+                    "size": int(length) if length and length.isdigit() else None,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                })
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached:
+                # Unchanged since the last check: keep title and size, refresh the timestamp
+                metrics.increment("linkcheck.not_modified")
+                return {**cached, "checked_at": entry["checked_at"], "not_modified": True}
+            entry.update({"status": e.code, "title": None, "size": None, "etag": None, "last_modified": None})
+        except (urllib.error.URLError, socket.timeout, ConnectionError, ValueError) as e:
+            entry.update({"status": None, "title": None, "size": None, "etag": None, "last_modified": None,
+                          "error": str(getattr(e, "reason", e))})
+        entry["ok"] = entry["status"] is not None and 200 <= entry["status"] < 400
+        entry["not_modified"] = False
+        return entry
+
+    def _read_title(self, response, content_type):
+        """Read the body only as far as the closing title tag, at most `title_bytes`"""
+        head = b""
+        while len(head) < self.title_bytes:
+            chunk = response.read1(min(65536, self.title_bytes - len(head)))
+            if not chunk:
+                break
+            head += chunk
+            if _TITLE_END.search(head):
+                break
+        return _parse_title(head, content_type)
+
+    def _is_fresh(self, cached):
+        return cached is not None and time.time() - cached.get("fetched_at", 0) < self.max_age
+
+    async def _check(self, url, executor, limit, host_limits):
+        cached = self.cache.get(url)
+        if self._is_fresh(cached):
+            metrics.increment("linkcheck.cache_hits")
+            return cached
+        host_limit = host_limits.setdefault(_host(url), asyncio.Semaphore(self.per_host))
+        async with host_limit, limit:
+            loop = asyncio.get_running_loop()
+            with metrics.timer("linkcheck.fetch"):
+                entry = await loop.run_in_executor(executor, self._fetch, url, cached)
+        entry["fetched_at"] = time.time()
+        self.cache[url] = entry
+        metrics.increment("linkcheck.requests")
+        if not entry["ok"]:
+            metrics.increment("linkcheck.broken")
+        log_verbose("Checked %s: %s", url, entry["status"] or entry["error"])
+        return entry
+
+    async def check_all(self, urls):
+        """Check URLs concurrently; returns `{url: entry}` and saves the cache"""
+        urls = list(dict.fromkeys(url for url in urls if url))
+        limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits = {}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="linkcheck") as executor:
+            entries = await asyncio.gather(*(self._check(url, executor, limit, host_limits) for url in urls))
+        self.save_cache()
+        return dict(zip(urls, entries))
+
+    def check_urls(self, urls):
+        """Blocking wrapper around `check_all`"""
+        return run_sync(self.check_all(urls))
+
+    def write_back(self, kg, results):
+        """Store status, title and size on the Resource nodes, `batch_size` URLs per statement"""
+        rows = [{"url": url, "status": entry["status"], "ok": entry["ok"], "title": entry.get("title"),
+                 "size": entry.get("size"), "checked_at": entry["checked_at"]}
+                for url, entry in results.items()]
+        for start in range(0, len(rows), self.batch_size):
+            kg.query("linkcheck_write_back", rows=rows[start:start + self.batch_size])
+        return len(rows)
+
+    def write_back_mysql(self, db_manager, results):
+        """Store status, title and size on the MySQL resources rows with these URLs"""
+        rows = [(entry["status"], entry["ok"], entry.get("title"), entry.get("size"),
+                 parsedate_to_datetime(entry["checked_at"]).replace(tzinfo=None), url)
+                for url, entry in results.items()]
+        db_manager.enable_link_status()
+        for start in range(0, len(rows), self.batch_size):
+            db_manager.update_link_status(rows[start:start + self.batch_size])
+        return len(rows)
+
+    def check_graph(self, kg, db_manager=None):
+        """Check every Resource URL in the graph (and the MySQL resources table) and update both"""
+        urls = [row["url"] for row in kg.query("linkcheck_urls")]
+        mysql_urls = db_manager.get_resource_urls() if db_manager is not None else []
+        results = self.check_urls(urls + mysql_urls)
+        self.write_back(kg, results)
+        if mysql_urls:
+            self.write_back_mysql(db_manager, {url: results[url] for url in dict.fromkeys(mysql_urls)})
+        broken = [url for url, entry in results.items() if not entry["ok"]]
+        print(f"Checked {len(results)} links, {len(broken)} broken")
+        for url in broken:
+            entry = results[url]
+            print(f"- {url}: {entry['status'] or entry['error']}")
+        return results
@@ -4,30 +4,43 @@ from db_manager import MySQLManager
 from data_generator import DataEngineeringDataGenerator
 from knowledge_graph import KnowledgeGraph
 from information_extraction import InformationExtractor
+from pipeline import PipelineScheduler
+from graph_sync import GraphSync
+from link_checker import LinkChecker
+from graph_analytics import GraphAnalytics
+from jsonl_io import load_course_data
+from entity_resolution import course_key
+from intent import classifier_from_course_data, load_eval_set, evaluate
+from generation import AnswerGenerator, StubLanguageModel, TransformersBackend
+from instrumentation import metrics, set_verbose, SamplingProfiler
+from cypher_templates import CYPHER
+from qa_server import serve
+from bulk_import import BulkExporter
 
 def setup_database():
     """Set up MySQL database and create necessary tables"""
     db_manager = MySQLManager()
     db_manager.connect()
-    db_manager.create_course_tables()
+    if not db_manager.create_course_tables():
+        raise RuntimeError("Database setup failed")
     return db_manager
 
-def generate_course_data():
+def generate_course_data(json_file_path="data/course_data.json"):
     """Generate course data and save to JSON"""
     data_generator = DataEngineeringDataGenerator()
-    json_file_path = data_generator.save_to_json()
+    json_file_path = data_generator.save_to_json(json_file_path)
     return json_file_path
 
-def build_knowledge_graph(json_file_path):
+def build_knowledge_graph(json_file_path, resumable=False, force=False):
     """Build knowledge graph from JSON data"""
     kg = KnowledgeGraph()
-    kg.build_knowledge_graph_from_json(json_file_path)
+    if not kg.build_knowledge_graph_from_json(json_file_path, resumable=resumable, force=force):
+        raise RuntimeError(f"Knowledge graph build from {json_file_path} failed")
     return kg
 
 def populate_database(db_manager, json_file_path):
     """Populate MySQL database with course data"""
-    with open(json_file_path, 'r', encoding='utf-8') as f:
-        course_data = json.load(f)
+    course_data = load_course_data(json_file_path)
         
     # Insert course data
     course_id = db_manager.insert_course_data(
@@ -65,21 +78,95 @@ def populate_database(db_manager, json_file_path):
     return course_id
 
 def extract_information_from_text(text_file_path):
-    """Extract information from text file"""
+    """Extract information from a text file, or from every text file in a folder"""
     if not os.path.exists(text_file_path):
         print(f"Text file {text_file_path} does not exist")
         return None
         
-    with open(text_file_path, 'r', encoding='utf-8') as f:
-        text = f.read()
-        
     extractor = InformationExtractor()
-    extracted_data = extractor.process_text(text)
+    if os.path.isdir(text_file_path):
+        extractor.process_folder(text_file_path)
+    else:
+        extractor.process_file(text_file_path)
+    for report in extractor.read_reports:
+        print(f"{report['path']}: {report['encoding']}, {report['malformed_count']} malformed regions")
     json_file_path = extractor.save_extracted_data()
     
     return json_file_path
 
-def interactive_qa(kg):
+def run_pipeline(args, json_file_path):
+    """Run the selected setup/generate/build-kg/populate-db steps as a DAG
+
+    Graph loading and database population both only read the generated JSON,
+    so they run concurrently once generation has finished.
+    """
+    scheduler = PipelineScheduler(state_file=os.path.join(os.path.dirname(json_file_path), ".pipeline_state.json"))
+    selected = {
+        "setup": args.setup,
+        "generate": args.generate,
+        "build-kg": args.build_kg,
+        "populate-db": args.populate_db,
+    }
+
+    def deps(*names):
+        return [name for name in names if selected[name]]
+
+    if args.setup:
+        scheduler.add_stage("setup", lambda ctx: setup_database())
+    if args.generate:
+        scheduler.add_stage(
+            "generate",
+            lambda ctx: generate_course_data(json_file_path),
+            inputs=["data_generator.py"],
+            outputs=[json_file_path],
+        )
+    if args.build_kg:
+        scheduler.add_stage(
+            "build-kg",
+            lambda ctx: build_knowledge_graph(json_file_path, args.resumable, args.force),
+            deps=deps("generate"),
+            inputs=[json_file_path],
+        )
+    if args.populate_db:
+        # Each stage opens its own connection; MySQL connections are not shared across threads
+        scheduler.add_stage(
+            "populate-db",
+            lambda ctx: populate_database(MySQLManager(), json_file_path),
+            deps=deps("setup", "generate"),
+            inputs=[json_file_path],
+        )
+
+    status = scheduler.run(force=args.force)
+    scheduler.print_summary(status)
+    return status
+
+def evaluate_intents(eval_file, json_file_path):
+    """Report intent accuracy and per-question CPU cost on a labelled question set"""
+    if os.path.exists(json_file_path):
+        course_data = load_course_data(json_file_path)
+    else:
+        course_data = DataEngineeringDataGenerator().generate_course_data()
+    classifier = classifier_from_course_data(course_data)
+    report = evaluate(classifier, load_eval_set(eval_file))
+    
+    print(f"问题数: {report['questions']}")
+    print(f"意图准确率: {report['accuracy']:.1%}  实体准确率: {report['entity_accuracy']:.1%}")
+    print(f"CPU耗时: 平均 {report['mean_cpu_us']:.1f}us  P95 {report['p95_cpu_us']:.1f}us  "
+          f"最大 {report['max_cpu_us']:.1f}us  (预算 {classifier.latency_budget_ms}ms, "
+          f"{'达标' if report['within_budget'] else '超出'})")
+    for error in report["errors"]:
+        print(f"  误判: {error['question']}  期望 {error['expected']}  实际 {error['got']}")
+    return report
+
+def create_answer_generator(kg, model_name):
+    """Generative answer layer over the graph; "stub" selects the deterministic test model"""
+    if model_name == "stub":
+        backend = StubLanguageModel()
+    else:
+        backend = TransformersBackend(model_name)
+    return AnswerGenerator(kg, backend)
+
+def interactive_qa(kg, generator=None):
     """Interactive question answering session"""
     print("\n=== 智能数据工程课程问答系统 ===")
     print("您可以询问以下类型的问题：")
@@ -87,6 +174,8 @@ def interactive_qa(kg):
     print("2. 课程包含哪些章节？")
     print("3. 某个章节包含哪些知识点？")
     print("4. 某个知识点有哪些学习资源？")
+    print("5. 某个知识点之前/之后要学什么？")
+    print("6. 关键词问题，例如：哪里讲到Kafka？")
     print("输入'退出'结束对话")
     
     while True:
@@ -94,8 +183,19 @@ def interactive_qa(kg):
         if question == "退出":
             break
             
-        answer = kg.answer_question(question)
-        print("\n回答：", answer)
+        if generator is None:
+            try:
+                answer = kg.answer_question(question)
+            except TimeoutError:
+                answer = "查询超时，请稍后再试。"
+            print("\n回答：", answer)
+            continue
+            
+        # Stream the generated answer as tokens arrive
+        print("\n回答：", end="", flush=True)
+        for delta in generator.stream(question):
+            print(delta, end="", flush=True)
+        print()
 
 def main():
     parser = argparse.ArgumentParser(description="智能数据工程课程知识图谱系统")
@@ -103,14 +203,49 @@ def main():
     parser.add_argument("--generate", action="store_true", help="Generate course data")
     parser.add_argument("--build-kg", action="store_true", help="Build knowledge graph")
     parser.add_argument("--populate-db", action="store_true", help="Populate database with course data")
-    parser.add_argument("--extract", type=str, help="Extract information from text file")
+    parser.add_argument("--extract", type=str, help="Extract information from a text file or a folder of text files (any encoding)")
     parser.add_argument("--qa", action="store_true", help="Start interactive question answering")
+    parser.add_argument("--serve", type=int, nargs="?", const=8765,
+                        help="Serve concurrent QA sessions over a local socket (JSON Lines) on this port")
+    parser.add_argument("--eval-intents", nargs="?", const="intent_eval.jsonl",
+                        help="Evaluate the question intent classifier on a labelled JSONL set")
+    parser.add_argument("--sync", action="store_true", help="Apply MySQL changes since the last checkpoint to the graph")
+    parser.add_argument("--sync-interval", type=float, help="Keep syncing, polling MySQL every N seconds")
+    parser.add_argument("--courses", nargs="+",
+                        help="Load these course data files into their own course partitions in parallel")
+    parser.add_argument("--course", type=str, help="Scope question answering to the course with this name")
+    parser.add_argument("--migrate-partitions", action="store_true",
+                        help="Give nodes built before course partitions a course_key and delete unreachable ones")
+    parser.add_argument("--analytics", action="store_true",
+                        help="Compute degree, PageRank, components and communities and store them on the nodes")
+    parser.add_argument("--check-links", action="store_true",
+                        help="Check every Resource URL and store status, title and size on the nodes")
+    parser.add_argument("--bulk-export", nargs="?", const="data/import",
+                        help="Write sharded node/relationship CSVs for neo4j-admin import to this folder and validate them")
+    parser.add_argument("--verify-import", nargs="?", const="data/import",
+                        help="Compare Neo4j node and relationship counts with a bulk export's manifest")
     parser.add_argument("--all", action="store_true", help="Run all steps")
+    parser.add_argument("--llm", type=str,
+                        help="Generate QA answers with a small local causal LM (model name, or 'stub')")
+    parser.add_argument("--query-timeout", type=float, default=10.0,
+                        help="Give up on a QA graph query after this many seconds (0 disables the limit)")
+    parser.add_argument("--export", type=str, choices=["courses", "chapters", "topics", "resources"],
+                        help="Export a MySQL table to data/export in chunks (Parquet, or gzip CSV without pyarrow)")
+    parser.add_argument("--data-file", type=str, default="data/course_data.json",
+                        help="Course data file; .jsonl, .jsonl.gz or .jsonl.zst write and read one record per line")
+    parser.add_argument("--resumable", action="store_true",
+                        help="Build the graph in journaled batches that resume after a failure, then swap it in")
+    parser.add_argument("--force", action="store_true", help="Re-run pipeline stages even if their inputs are unchanged")
+    parser.add_argument("--verbose", action="store_true", help="Log every node, relationship and SQL statement")
+    parser.add_argument("--metrics", type=str, help="Write a timing/counter snapshot to this JSON file on exit")
+    parser.add_argument("--profile", type=str, help="Sample stacks while running and write collapsed stacks to this file")
+    parser.add_argument("--profile-cypher", type=str,
+                        help="Run Cypher templates with PROFILE and write db hits per template to this JSON file")
     
     args = parser.parse_args()
     
     # If no arguments provided, show help
-    if not any(vars(args).values()):
+    if all(value == parser.get_default(name) for name, value in vars(args).items()):
         parser.print_help()
         return
         
@@ -122,28 +257,39 @@ def main():
         args.populate_db = True
         args.qa = True
         
-    json_file_path = "data/course_data.json"
+    json_file_path = args.data_file
     
-    # Set up database
-    if args.setup:
-        print("\n=== 设置数据库 ===")
-        db_manager = setup_database()
+    set_verbose(args.verbose)
+    profiler = SamplingProfiler().start() if args.profile else None
+    CYPHER.profiling = bool(args.profile_cypher)
+    try:
+        run_commands(args, json_file_path)
+    finally:
+        if profiler:
+            profiler.stop()
+            print(f"Profile samples written to {profiler.export_collapsed(args.profile)}")
+        if args.profile_cypher:
+            print(f"Cypher db hits written to {CYPHER.export_profiles(args.profile_cypher)}")
+        if args.metrics:
+            metrics.print_report()
+            print(f"Metrics snapshot written to {metrics.export(args.metrics)}")
+
+def run_commands(args, json_file_path):
+    """Run the steps selected on the command line"""
+    # One-off: key a graph built before course partitions, before anything reads it
+    if args.migrate_partitions:
+        print("\n=== 迁移旧版图谱节点到课程分区 ===")
+        KnowledgeGraph().migrate_unkeyed_nodes()
         
-    # Generate course data
-    if args.generate:
-        print("\n=== 生成课程数据 ===")
-        json_file_path = generate_course_data()
+    # Setup, generation, graph build and database population run as one DAG
+    if args.setup or args.generate or args.build_kg or args.populate_db:
+        run_pipeline(args, json_file_path)
         
-    # Build knowledge graph
-    if args.build_kg:
-        print("\n=== 构建知识图谱 ===")
-        kg = build_knowledge_graph(json_file_path)
-        
-    # Populate database
-    if args.populate_db:
-        print("\n=== 填充数据库 ===")
-        db_manager = MySQLManager()
-        course_id = populate_database(db_manager, json_file_path)
+    # Course partitions, loaded side by side without touching other courses
+    # (with --bulk-export the files are exported for an offline import instead)
+    if args.courses and not args.bulk_export:
+        print(f"\n=== 加载课程分区: {len(args.courses)} 个文件 ===")
+        KnowledgeGraph().load_courses(args.courses)
         
     # Extract information from text
     if args.extract:
@@ -152,11 +298,73 @@ def main():
         if extracted_json_path:
             print(f"提取的信息已保存到: {extracted_json_path}")
             
+    # Intent classifier evaluation
+    if args.eval_intents:
+        print(f"\n=== 评估问题意图分类: {args.eval_intents} ===")
+        evaluate_intents(args.eval_intents, json_file_path)
+        
+    # Incremental MySQL -> Neo4j sync
+    if args.sync or args.sync_interval:
+        print("\n=== 同步数据库变更到知识图谱 ===")
+        db_manager = MySQLManager()
+        db_manager.enable_change_tracking()
+        sync = GraphSync(db_manager, KnowledgeGraph())
+        if args.sync_interval:
+            sync.run_forever(args.sync_interval)
+        else:
+            sync.run_once()
+        db_manager.disconnect()
+        
+    # Graph analytics
+    if args.analytics:
+        print("\n=== 图分析：度、PageRank、连通分量与社区 ===")
+        GraphAnalytics(KnowledgeGraph()).run()
+        
+    # Resource link check
+    if args.check_links:
+        print("\n=== 检查学习资源链接 ===")
+        LinkChecker().check_graph(KnowledgeGraph())
+        
+    # Offline bulk import files
+    if args.bulk_export:
+        print(f"\n=== 生成批量导入文件: {args.bulk_export} ===")
+        sources = args.courses or [json_file_path]
+        exporter = BulkExporter(args.bulk_export)
+        manifest = exporter.export(sources)
+        problems = exporter.validate(sources)
+        for problem in problems:
+            print(f"- {problem}")
+        if not problems:
+            print(f"校验通过，在Neo4j停止时运行：\n{manifest['command']}")
+            
+    if args.verify_import:
+        print(f"\n=== 校验批量导入结果: {args.verify_import} ===")
+        BulkExporter(args.verify_import).verify_import(KnowledgeGraph())
+        
+    # Export a table in bounded chunks
+    if args.export:
+        print(f"\n=== 导出数据表: {args.export} ===")
+        db_manager = MySQLManager()
+        db_manager.export_table(args.export)
+        db_manager.disconnect()
+        
+    # Many QA sessions sharing one connection and graph snapshot
+    if args.serve:
+        print(f"\n=== 启动多会话问答服务: 端口 {args.serve} ===")
+        kg = KnowledgeGraph(course_key=course_key(args.course) if args.course else None,
+                            query_timeout=args.query_timeout or None)
+        serve(kg, port=args.serve)
+        
     # Interactive question answering
     if args.qa:
         print("\n=== 启动问答系统 ===")
-        kg = KnowledgeGraph()
-        interactive_qa(kg)
+        kg = KnowledgeGraph(course_key=course_key(args.course) if args.course else None,
+                            query_timeout=args.query_timeout or None)
+        generator = create_answer_generator(kg, args.llm) if args.llm else None
+        interactive_qa(kg, generator)
+        if generator:
+            print(generator.stats())
+            generator.close()
 
 if __name__ == "__main__":
     import json  # Import here to avoid circular import
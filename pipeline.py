@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), inputs=(), outputs=()):
+        """A single pipeline step.
+
+        `func` receives the shared context dict (results of finished stages,
+        keyed by stage name) and returns this stage's result; raising or
+        returning False fails the stage. `inputs` and `outputs` are file
+        paths; a stage whose inputs hash the same as on its last successful
+        run, and whose outputs still exist, is skipped.
+        """
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+
+class PipelineScheduler:
+    def __init__(self, state_file="data/.pipeline_state.json", max_workers=4):
+        self.state_file = state_file
+        self.max_workers = max_workers
+        self.stages = {}
+        self.timings = {}
+        self.wall_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, func, deps=(), inputs=(), outputs=()):
+        """Register a stage; dependencies must be registered before running"""
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already registered")
+        self.stages[name] = Stage(name, func, deps, inputs, outputs)
+        return self.stages[name]
+
+    def _check_graph(self):
+        """Reject unknown dependencies and cycles before anything runs"""
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle detected at stage {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        directory = os.path.dirname(self.state_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def hash_files(paths):
+        """Content hash over a list of files; missing files hash as absent"""
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(path.encode('utf-8'))
+            if not os.path.exists(path):
+                digest.update(b"\0missing")
+                continue
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def _is_up_to_date(self, stage, state):
+        # Stages without declared inputs have nothing to compare against
+        if not stage.inputs:
+            return False
+        previous = state.get(stage.name)
+        if not previous or previous.get("input_hash") != self.hash_files(stage.inputs):
+            return False
+        return all(os.path.exists(path) for path in stage.outputs)
+
+    def _run_stage(self, stage, context):
+        start = time.perf_counter()
+        result = stage.func(context)
+        return result, time.perf_counter() - start
+
+    def run(self, force=False):
+        """Run all stages, overlapping those whose dependencies are satisfied
+
+        Returns a dict mapping stage name to one of "done", "skipped",
+        "failed" or "blocked" (an upstream stage failed).
+        """
+        self._check_graph()
+        state = {} if force else self._load_state()
+        new_state = dict(state)
+        context = {}
+        status = {}
+        self.timings = {}
+        started = time.perf_counter()
+        pending = dict(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Propagate failures to everything downstream
+                for name, stage in list(pending.items()):
+                    if any(status.get(dep) in ("failed", "blocked") for dep in stage.deps):
+                        status[name] = "blocked"
+                        del pending[name]
+
+                ready = [
+                    stage for stage in pending.values()
+                    if all(status.get(dep) in ("done", "skipped") for dep in stage.deps)
+                ]
+                for stage in ready:
+                    del pending[stage.name]
+                    # Inputs are hashed only once upstream stages have finished,
+                    # so a regenerated file is seen as changed
+                    if not force and self._is_up_to_date(stage, state):
+                        status[stage.name] = "skipped"
+                        self.timings[stage.name] = 0.0
+                        print(f"[pipeline] {stage.name}: inputs unchanged, skipped")
+                        continue
+                    print(f"[pipeline] {stage.name}: started")
+                    running[executor.submit(self._run_stage, stage, context)] = stage
+
+                if not running:
+                    continue
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    try:
+                        result, elapsed = future.result()
+                        if result is False:
+                            raise RuntimeError("stage reported failure")
+                    except Exception as e:
+                        status[stage.name] = "failed"
+                        new_state.pop(stage.name, None)
+                        print(f"[pipeline] {stage.name}: failed: {e}")
+                        continue
+                    with self._lock:
+                        context[stage.name] = result
+                    status[stage.name] = "done"
+                    self.timings[stage.name] = elapsed
+                    if stage.inputs:
+                        new_state[stage.name] = {
+                            "input_hash": self.hash_files(stage.inputs),
+                            "finished_at": time.time(),
+                        }
+                    print(f"[pipeline] {stage.name}: finished in {elapsed:.2f}s")
+
+        self.wall_time = time.perf_counter() - started
+        self._save_state(new_state)
+        return status
+
+    def print_summary(self, status):
+        """Print a per-stage timing table"""
+        print("\n=== 流水线阶段耗时 ===")
+        width = max((len(name) for name in self.stages), default=0)
+        for name in self.stages:
+            elapsed = self.timings.get(name)
+            elapsed_str = f"{elapsed:8.2f}s" if elapsed is not None else "       -"
+            print(f"{name.ljust(width)}  {status.get(name, 'pending'):8}  {elapsed_str}")
+        print(f"{'sum'.ljust(width)}  {'':8}  {sum(self.timings.values()):8.2f}s")
+        print(f"{'wall'.ljust(width)}  {'':8}  {self.wall_time:8.2f}s")
@@ -0,0 +1,229 @@
+import json
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from instrumentation import metrics, log_verbose
+from knowledge_graph import KnowledgeGraph
+
+
+class GraphSnapshot(KnowledgeGraph):
+    def __init__(self, kg):
+        """Read-only, in-memory copy of one course for answering questions
+
+        Everything the QA handlers read (course, chapters, topics per
+        chapter, resources per topic) is fetched once through `kg` with
+        batched queries, and the keyword, hierarchy and intent indexes are
+        built up front. After that nothing is written, so any number of
+        threads can call `answer_question` at once without touching Neo4j.
+        The snapshot has no connection of its own: the query entry points
+        inherited from `KnowledgeGraph` raise instead of reaching Neo4j.
+
+        Topics and resources are keyed by name, so the snapshot covers a
+        single course: `kg.course_key`, or the only course in the graph.
+        """
+        key = self._snapshot_course(kg)
+        self._init_qa_state(key)
+        self.g = None
+        self._async_client = None
+        self.source = kg
+        with metrics.timer("qa_server.snapshot"):
+            self.course_info = kg.query_course_info(course_key=key)
+            self.chapters = kg.query_chapters(course_key=key)
+            chapter_names = [chapter["chapter_name"] for chapter in self.chapters]
+            self.topics = kg.query_topics_by_chapters(chapter_names, course_key=key)
+            topic_names = [topic["topic_name"] for topics in self.topics.values() for topic in topics]
+            self.resources = kg.query_resources_by_topics(topic_names, course_key=key)
+            self.text_index = kg.build_text_index(course_key=key)
+            self.hierarchy = kg.build_hierarchy_index(course_key=key)
+            self.build_intent_classifier()
+        self.loaded_at = time.time()
+        print(f"Graph snapshot loaded: {len(self.chapters)} chapters, {len(topic_names)} topics")
+
+    @staticmethod
+    def _snapshot_course(kg):
+        if kg.course_key is not None:
+            return kg.course_key
+        courses = kg.list_courses()
+        if len(courses) > 1:
+            raise ValueError(f"The graph holds {len(courses)} courses; choose one with course_key (--course)")
+        return courses[0]["course_key"] if courses else None
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("GraphSnapshot is read-only and has no Neo4j connection; query its source graph instead")
+
+    _run = run_cypher = query = query_batch = _read_only
+    build_text_index = build_hierarchy_index = reset_indexes = _read_only
+
+    @property
+    def async_client(self):
+        self._read_only()
+
+    def list_courses(self):
+        return [dict(self.course_info, course_key=self.course_key)] if self.course_info else []
+
+    def query_course_info(self, course_key=None):
+        return self.course_info
+
+    def query_chapters(self, course_key=None):
+        return self.chapters
+
+    def query_topics_by_chapter(self, chapter_name, course_key=None):
+        return self.topics.get(chapter_name, [])
+
+    def query_resources_by_topic(self, topic_name, course_key=None):
+        return self.resources.get(topic_name, [])
+
+    def query_topics_by_chapters(self, chapter_names, timeout=None, course_key=None):
+        return {name: self.topics.get(name, []) for name in dict.fromkeys(chapter_names)}
+
+    def query_resources_by_topics(self, topic_names, timeout=None, course_key=None):
+        return {name: self.resources.get(name, []) for name in dict.fromkeys(topic_names)}
+
+
+class QASession:
+    __slots__ = ("session_id", "context", "questions", "last_used", "lock")
+
+    def __init__(self, session_id):
+        """One student's conversation: the chapter/topic context carried between questions"""
+        self.session_id = session_id
+        self.context = {}
+        self.questions = 0
+        self.last_used = time.time()
+        # Questions of one session are answered in order, even from several connections
+        self.lock = threading.Lock()
+
+
+class SessionManager:
+    def __init__(self, kg, idle_timeout=1800, max_sessions=10000):
+        """Many QA sessions over one shared connection and one graph snapshot
+
+        `kg` is the only Neo4j connection (and pool); it is used to load the
+        snapshot and to reload it on `refresh()`. Reloading builds a new
+        snapshot and swaps it in, so sessions keep answering from the old
+        one meanwhile. Sessions idle for `idle_timeout` seconds are dropped,
+        and past `max_sessions` the least recently used session is evicted.
+        """
+        self.kg = kg
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.snapshot = GraphSnapshot(kg)
+
+    def refresh(self):
+        """Reload the snapshot from the graph, e.g. after a rebuild or sync"""
+        self.snapshot = GraphSnapshot(self.kg)
+        return self.snapshot
+
+    def session(self, session_id=None):
+        """The session with this id, created if new or unknown"""
+        with self._lock:
+            session = self.sessions.get(session_id) if session_id else None
+            if session is None:
+                if len(self.sessions) >= self.max_sessions:
+                    self._expire_idle()
+                while len(self.sessions) >= self.max_sessions:
+                    self.sessions.popitem(last=False)
+                    metrics.increment("qa_server.sessions_evicted")
+                session = QASession(session_id or uuid.uuid4().hex)
+                self.sessions[session.session_id] = session
+                metrics.increment("qa_server.sessions")
+            else:
+                self.sessions.move_to_end(session.session_id)
+            return session
+
+    def _expire_idle(self):
+        cutoff = time.time() - self.idle_timeout
+        for session_id in [key for key, session in self.sessions.items() if session.last_used < cutoff]:
+            del self.sessions[session_id]
+
+    def expire_idle(self):
+        with self._lock:
+            self._expire_idle()
+
+    def close(self, session_id):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def ask(self, question, session_id=None):
+        """Answer one question in a session; returns the reply sent to the client"""
+        session = self.session(session_id)
+        snapshot = self.snapshot
+        with session.lock, metrics.timer("qa_server.ask"):
+            answer = snapshot.answer_question(question, session.context)
+            session.questions += 1
+            session.last_used = time.time()
+            return {
+                "session": session.session_id,
+                "answer": answer,
+                "intent": session.context.get("intent"),
+                "chapter": session.context.get("chapter"),
+                "topic": session.context.get("topic"),
+            }
+
+
+class QARequestHandler(socketserver.StreamRequestHandler):
+    """JSON Lines protocol: one `{"question", "session"?}` object per line, one reply per line
+
+    A connection that names no session gets its own; every reply carries
+    the session id, so a client can reconnect and continue the conversation.
+    """
+
+    def handle(self):
+        manager = self.server.manager
+        connection_session = None
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                question = request["question"]
+            except (ValueError, KeyError, TypeError):
+                self._send({"error": "请求格式应为 {\"question\": \"...\"}"})
+                continue
+            session_id = request.get("session") or connection_session
+            reply = manager.ask(question, session_id)
+            if not request.get("session"):
+                connection_session = reply["session"]
+            self._send(reply)
+
+    def _send(self, reply):
+        self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class QAServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, manager, host="127.0.0.1", port=8765):
+        """Threaded local socket server, one thread per connection, all sharing `manager`"""
+        self.manager = manager
+        super().__init__((host, port), QARequestHandler)
+
+
+def serve(kg, host="127.0.0.1", port=8765):
+    """Serve QA sessions on a local socket until interrupted"""
+    manager = SessionManager(kg)
+    with QAServer(manager, host, port) as server:
+        print(f"QA server listening on {host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    log_verbose("QA server stopped after %d sessions", len(manager.sessions))
+    return manager
+
+
+def ask(question, session=None, host="127.0.0.1", port=8765, timeout=30.0):
+    """Send one question to a running QA server and return its reply"""
+    request = {"question": question}
+    if session:
+        request["session"] = session
+    with socket.create_connection((host, port), timeout=timeout) as connection:
+        connection.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        with connection.makefile("rb") as reply:
+            return json.loads(reply.readline())
@@ -0,0 +1,145 @@
+import bisect
+from collections import defaultdict
+
+
+class HierarchyIndex:
+    def __init__(self):
+        """Closure table over the Course/Chapter/Topic/Resource containment tree
+
+        Every node stores its full ancestor chain and every ancestor stores the
+        set of its descendants, so ancestor, subtree and "is under" lookups
+        are dictionary reads instead of variable-length Cypher expansions.
+        Nodes also get a sort key (the chain of `order` values from the root)
+        that puts them in course order; per root and label these keys are
+        kept in sorted lists, so "before/after" queries are a binary search.
+        Edges are added incrementally; the tree is shallow, so each insertion
+        touches only the handful of ancestors above the new subtree.
+        Nodes are keyed by a unique id; names need not be unique, and
+        `find()` returns every node with a given label and name.
+        """
+        self.labels = {}
+        self.names = {}
+        # (label, name) -> node ids, in insertion order
+        self._by_name = defaultdict(list)
+        self.parent = {}
+        # node -> ancestors, nearest first
+        self.ancestors = {}
+        self.descendants = defaultdict(set)
+        self._local_keys = {}
+        self.sort_keys = {}
+        # (root, label) -> sorted list of (sort key, node)
+        self._sequences = defaultdict(list)
+        self._counter = 0
+
+    def __contains__(self, node):
+        return node in self.labels
+
+    def __len__(self):
+        return len(self.labels)
+
+    def root_of(self, node):
+        chain = self.ancestors[node]
+        return chain[-1] if chain else node
+
+    def find(self, label, name):
+        """Ids of the nodes with this label and name"""
+        return list(self._by_name.get((label, name), ()))
+
+    def add_node(self, node, label, order=None, name=None):
+        """Register a node as its own root; `order` positions it among its siblings
+
+        Siblings without an explicit order keep their insertion order.
+        """
+        if node in self.labels:
+            return
+        self._counter += 1
+        self.labels[node] = label
+        self.names[node] = name
+        self._by_name[(label, name)].append(node)
+        self.ancestors[node] = ()
+        self._local_keys[node] = (order if order is not None else 0, self._counter)
+        self.sort_keys[node] = (self._local_keys[node],)
+        bisect.insort(self._sequences[(node, label)], (self.sort_keys[node], node))
+
+    def add_edge(self, parent, child):
+        """Attach the subtree rooted at `child` below `parent`"""
+        if parent not in self.labels or child not in self.labels:
+            raise KeyError("Both nodes must be added before they are linked")
+        if child in self.parent:
+            if self.parent[child] == parent:
+                return
+            raise ValueError(f"{child} already has parent {self.parent[child]}")
+        if child == parent or child in self.ancestors[parent]:
+            raise ValueError(f"Linking {parent} -> {child} would create a cycle")
+
+        subtree = [child, *self.descendants[child]]
+        for node in subtree:
+            self._unsequence(node)
+        self.parent[child] = parent
+        chain = (parent, *self.ancestors[parent])
+        for node in subtree:
+            self.ancestors[node] = self.ancestors[node] + chain
+            for ancestor in chain:
+                self.descendants[ancestor].add(node)
+        for node in subtree:
+            self.sort_keys[node] = tuple(self._local_keys[a] for a in reversed(self.ancestors[node])) + (self._local_keys[node],)
+            self._sequence(node)
+
+    def remove_node(self, node):
+        """Remove a node together with everything below it"""
+        if node not in self.labels:
+            return
+        subtree = [node, *self.descendants[node]]
+        for member in subtree:
+            self._unsequence(member)
+        for member in subtree:
+            for ancestor in self.ancestors[member]:
+                self.descendants[ancestor].discard(member)
+        for member in subtree:
+            key = (self.labels[member], self.names.pop(member))
+            self._by_name[key].remove(member)
+            if not self._by_name[key]:
+                del self._by_name[key]
+            self.labels.pop(member)
+            self.parent.pop(member, None)
+            self.ancestors.pop(member)
+            self.descendants.pop(member, None)
+            self._local_keys.pop(member)
+            self.sort_keys.pop(member)
+
+    def _sequence(self, node):
+        bisect.insort(self._sequences[(self.root_of(node), self.labels[node])], (self.sort_keys[node], node))
+
+    def _unsequence(self, node):
+        sequence = self._sequences[(self.root_of(node), self.labels[node])]
+        position = bisect.bisect_left(sequence, (self.sort_keys[node], node))
+        if position < len(sequence) and sequence[position][1] == node:
+            del sequence[position]
+
+    def get_ancestors(self, node, label=None):
+        """Ancestors nearest first, optionally restricted to one label"""
+        return [a for a in self.ancestors.get(node, ()) if label is None or self.labels[a] == label]
+
+    def get_descendants(self, node, label=None):
+        """Every node below `node` in course order, optionally restricted to one label"""
+        found = [d for d in self.descendants.get(node, ()) if label is None or self.labels[d] == label]
+        return sorted(found, key=self.sort_keys.__getitem__)
+
+    def is_ancestor(self, ancestor, node):
+        return node in self.descendants.get(ancestor, ())
+
+    def preceding(self, node):
+        """Nodes with the same label and root that come before `node` in course order"""
+        if node not in self.labels:
+            return []
+        sequence = self._sequences[(self.root_of(node), self.labels[node])]
+        position = bisect.bisect_left(sequence, (self.sort_keys[node], node))
+        return [member for _, member in sequence[:position]]
+
+    def following(self, node):
+        """Nodes with the same label and root that come after `node` in course order"""
+        if node not in self.labels:
+            return []
+        sequence = self._sequences[(self.root_of(node), self.labels[node])]
+        position = bisect.bisect_right(sequence, (self.sort_keys[node], node))
+        return [member for _, member in sequence[position:]]
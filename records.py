@@ -0,0 +1,116 @@
+from collections.abc import MutableMapping
+
+# Short, highly repetitive fields that are shared through the string pool
+INTERNED_FIELDS = frozenset(("name", "type", "number", "chapter", "topic", "source", "target"))
+
+
+class StringPool:
+    def __init__(self):
+        """Intern table for repeated strings such as names, types and parent names
+
+        Unlike `sys.intern` the pool is owned by one extractor and is freed
+        together with it.
+        """
+        self._strings = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def intern(self, value):
+        if not isinstance(value, str):
+            return value
+        return self._strings.setdefault(value, value)
+
+
+class Record(MutableMapping):
+    """Fixed-field record with `__slots__` storage and a dict-compatible interface
+
+    Unset fields hold None and behave like missing dict keys, so existing
+    code using `record["name"]`, `record.get("chapter")` or `record.items()`
+    keeps working. `to_dict()` returns a plain dict for serialisation.
+    Values of `INTERNED_FIELDS` go through the record's string pool whether
+    set at construction or later; unknown fields raise instead of being lost.
+    """
+    __slots__ = ("_pool",)
+    fields = ()
+
+    def __init__(self, pool=None, **values):
+        unknown = set(values).difference(self.fields)
+        if unknown:
+            raise TypeError(f"{type(self).__name__} has no fields {sorted(unknown)}")
+        object.__setattr__(self, "_pool", pool)
+        for field in self.fields:
+            value = values.get(field)
+            if pool is not None and field in INTERNED_FIELDS:
+                value = pool.intern(value)
+            object.__setattr__(self, field, value)
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        if self._pool is not None and key in INTERNED_FIELDS:
+            value = self._pool.intern(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self.fields or getattr(self, key) is None:
+            raise KeyError(key)
+        setattr(self, key, None)
+
+    def __iter__(self):
+        return (field for field in self.fields if getattr(self, field) is not None)
+
+    def __len__(self):
+        return sum(1 for field in self.fields if getattr(self, field) is not None)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.fields if getattr(self, field) is not None}
+
+
+class CourseRecord(Record):
+    __slots__ = ("id", "name", "description")
+    fields = __slots__
+
+
+class ChapterRecord(Record):
+    __slots__ = ("id", "name", "description", "order")
+    fields = __slots__
+
+
+class TopicRecord(Record):
+    __slots__ = ("id", "name", "description", "number", "chapter")
+    fields = __slots__
+
+
+class ResourceRecord(Record):
+    __slots__ = ("id", "name", "type", "url", "topic")
+    fields = __slots__
+
+
+class RelationshipRecord(Record):
+    __slots__ = ("source", "target", "type")
+    fields = __slots__
+
+
+RECORD_TYPES = {
+    "Course": CourseRecord,
+    "Chapter": ChapterRecord,
+    "Topic": TopicRecord,
+    "Resource": ResourceRecord,
+}
+
+
+def make_record(entity_type, pool=None, **values):
+    """Build the record class for `entity_type`; fields it does not define raise TypeError"""
+    return RECORD_TYPES[entity_type](pool, **values)
@@ -0,0 +1,180 @@
+import json
+import os
+import uuid
+from instrumentation import metrics, log_verbose
+from entity_resolution import canonical_id, course_key as make_course_key
+from jsonl_io import load_course_data
+from pipeline import PipelineScheduler
+
+# Live label -> (staging label, parent label, relationship from the parent)
+STAGED_LABELS = {
+    "Course": ("StagedCourse", None, None),
+    "Chapter": ("StagedChapter", "StagedCourse", "CONTAINS"),
+    "Topic": ("StagedTopic", "StagedChapter", "CONTAINS"),
+    "Resource": ("StagedResource", "StagedTopic", "HAS_RESOURCE"),
+}
+
+# Promotion steps in order, each run in batches until it reports nothing left
+PROMOTE_STEPS = (
+    "promote_delete_resources",
+    "promote_delete_topics",
+    "promote_delete_chapters",
+    "promote_relabel_chapters",
+    "promote_relabel_topics",
+    "promote_relabel_resources",
+    "promote_swap_course",
+)
+
+
+class StagedBuild:
+    def __init__(self, kg, journal_dir="data", batch_size=1000):
+        """Resumable graph build: stage in batches, then promote in batches
+
+        Nodes are first written under staging labels (`StagedChapter`, ...)
+        with `MERGE` on a canonical `uid`, so replaying a batch is harmless
+        and live queries never see a half-staged course. Each course has its
+        own journal file in `journal_dir`, recording how far the build got
+        after every committed batch; rerunning the same input resumes after
+        the last committed batch.
+
+        Promotion replaces this course's partition only, in bounded
+        transactions (see `PROMOTE_STEPS`) whose progress is journaled too,
+        so a promotion that fails part way resumes instead of restarting.
+        Unlike staging it is not invisible: until the Course node is swapped
+        at the end, live queries can see the course with some or none of its
+        chapters. The promoted nodes keep their `build_version`, new for
+        every build, which tells a rerun whether the live course is still
+        this build.
+        """
+        self.kg = kg
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.journal_file = None
+        self.journal = {}
+
+    def journal_path(self, key):
+        return os.path.join(self.journal_dir, f".build_journal.{key}.json")
+
+    def _load_journal(self, key):
+        self.journal_file = self.journal_path(key)
+        if not os.path.exists(self.journal_file):
+            return {}
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_journal(self):
+        directory = os.path.dirname(self.journal_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_file = self.journal_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.journal, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.journal_file)
+
+    def iter_batches(self, course_data):
+        """`(label, rows)` batches in a fixed order, every parent in an earlier batch than its children"""
+        course = course_data["course"]
+        key = course.get("key") or make_course_key(course["name"])
+        rows = {label: [] for label in STAGED_LABELS}
+
+        def add(label, name, parent_uid, properties):
+            uid = canonical_id(label, name, parent_uid)
+            rows[label].append({"uid": uid, "parent_uid": parent_uid,
+                                "properties": {"name": name, "course_key": key, **properties}})
+            return uid
+
+        course_uid = add("Course", course["name"], None, {"description": course.get("description")})
+        for chapter in course_data["chapters"]:
+            chapter_uid = add("Chapter", chapter["name"], course_uid,
+                              {"description": chapter.get("description"), "order": chapter.get("order")})
+            for topic in chapter["topics"]:
+                topic_uid = add("Topic", topic["name"], chapter_uid, {"description": topic.get("description")})
+                for resource in topic.get("resources", []):
+                    add("Resource", resource["name"], topic_uid,
+                        {"type": resource.get("type"), "url": resource.get("url")})
+
+        for label, label_rows in rows.items():
+            for start in range(0, len(label_rows), self.batch_size):
+                yield label, label_rows[start:start + self.batch_size]
+
+    def _ensure_indexes(self):
+        for label in STAGED_LABELS:
+            self.kg.query(f"staged_index_{label.lower()}")
+
+    def _clear_staging(self, key, keep_version=None):
+        """Drop this course's staged nodes left by an abandoned build; other courses' builds are untouched"""
+        for label in STAGED_LABELS:
+            self.kg.query(f"staged_clear_{label.lower()}", course_key=key, version=keep_version)
+
+    def _live_version(self, key):
+        """`build_version` of the live course with this key, or None if it was not staged or is gone"""
+        rows = self.kg.query("staged_live_version", course_key=key)
+        return rows[0]["version"] if len(rows) == 1 else None
+
+    def _promote(self, version, key):
+        """Swap the staged course in for its live partition, resuming after the last finished step"""
+        journal = self.journal
+        with metrics.timer("cypher.staged_promote"):
+            for step_number, name in enumerate(PROMOTE_STEPS, 1):
+                if step_number <= journal.get("promoted_steps", 0):
+                    continue
+                while True:
+                    rows = self.kg.query(name, course_key=key, version=version, limit=self.batch_size)
+                    done = rows[0]["done"] if rows else 0
+                    metrics.increment(f"staged.{name}", done)
+                    if done < self.batch_size or name == "promote_swap_course":
+                        break
+                journal["promoted_steps"] = step_number
+                self._save_journal()
+                log_verbose("Promotion step %s finished", name)
+
+    def run(self, json_file_path, force=False):
+        """Build the graph from course data, resuming an interrupted build of the same input"""
+        source_hash = PipelineScheduler.hash_files([json_file_path])
+        course_data = load_course_data(json_file_path)
+        key = course_data["course"].get("key") or make_course_key(course_data["course"]["name"])
+        journal = self.journal = self._load_journal(key)
+        restart = force or journal.get("source_hash") != source_hash
+        if not restart and journal["phase"] == "promoted":
+            version = journal["version"]
+            if self._live_version(key) == version:
+                print(f"Knowledge graph is already built from {json_file_path} (version {version})")
+                return True
+            # The live course was deleted or replaced since this build was promoted
+            print(f"Live graph no longer holds version {version}, rebuilding")
+            restart = True
+        if restart:
+            journal = self.journal = {"source": json_file_path, "source_hash": source_hash,
+                                      "version": uuid.uuid4().hex[:16], "course_key": key,
+                                      "committed": 0, "phase": "staging"}
+        version = journal["version"]
+
+        self._ensure_indexes()
+        self.kg.create_partition_indexes()
+        if journal["committed"] == 0:
+            self._clear_staging(key, keep_version=version)
+        elif journal["phase"] == "promoting":
+            print(f"Resuming promotion of {json_file_path} (version {version})")
+        else:
+            print(f"Resuming build of {json_file_path} after batch {journal['committed']}")
+
+        batch_number = 0
+        for label, rows in self.iter_batches(course_data):
+            batch_number += 1
+            if batch_number <= journal["committed"]:
+                continue
+            with metrics.timer(f"staged.batch.{label}"):
+                self.kg.query(f"staged_upsert_{label.lower()}", rows=rows, version=version)
+            journal["committed"] = batch_number
+            self._save_journal()
+            metrics.increment("staged.rows", len(rows))
+            log_verbose("Committed batch %d (%d %s rows)", batch_number, len(rows), label)
+
+        journal["phase"] = "promoting"
+        self._save_journal()
+        self._promote(version, key)
+        journal["phase"] = "promoted"
+        self._save_journal()
+        self.kg.reset_indexes()
+        print(f"Knowledge graph built from {json_file_path} in {batch_number} batches (version {version})")
+        return True
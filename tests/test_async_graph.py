@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+import pytest
+from async_graph import AsyncGraphClient
+from async_utils import run_sync
+
+
+class FakeGraph:
+    """Blocking stand-in for py2neo's Graph that records concurrency"""
+
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def run(self, query, **params):
+        with FakeGraph.lock:
+            FakeGraph.active += 1
+            FakeGraph.peak = max(FakeGraph.peak, FakeGraph.active)
+        try:
+            time.sleep(params.get("delay", 0.02))
+            if query == "FAIL":
+                raise RuntimeError("bad query")
+            return Result([{"graph": id(self), "tag": params.get("tag")}])
+        finally:
+            with FakeGraph.lock:
+                FakeGraph.active -= 1
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+
+@pytest.fixture
+def client():
+    FakeGraph.active = FakeGraph.peak = 0
+    created = []
+
+    def factory():
+        created.append(FakeGraph())
+        return created[-1]
+
+    client = AsyncGraphClient(pool_size=2, timeout=5.0, graph_factory=factory)
+    client.created = created
+    yield client
+    client.close()
+
+
+def test_pool_bounds_connections_and_concurrency(client):
+    client.run_many_sync([(f"q{i}", "RETURN 1", {}) for i in range(8)])
+    assert len(client.created) == 2
+    assert FakeGraph.peak == 2
+
+
+def test_run_many_preserves_order(client):
+    # Later queries finish first
+    queries = [(f"q{i}", "RETURN 1", {"delay": 0.02 * (4 - i), "tag": i}) for i in range(4)]
+    assert [rows[0]["tag"] for rows in client.run_many_sync(queries)] == [0, 1, 2, 3]
+
+
+def test_timeout_raises(client):
+    with pytest.raises(asyncio.TimeoutError):
+        client.run_many_sync([("slow", "RETURN 1", {"delay": 0.5})], timeout=0.05)
+
+
+def test_return_exceptions(client):
+    results = client.run_many_sync([("ok", "RETURN 1", {}), ("bad", "FAIL", {})], return_exceptions=True)
+    assert results[0][0]["graph"]
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_call_sync_passes_a_pooled_graph(client):
+    def template(graph, name, value=None):
+        return (graph in client.created, name, value)
+
+    assert client.call_sync(template, "course_info", value=3) == (True, "course_info", 3)
+
+
+def test_run_sync_inside_a_running_loop():
+    async def inner():
+        return 42
+
+    async def outer():
+        return run_sync(inner())
+
+    assert asyncio.run(outer()) == 42
@@ -0,0 +1,76 @@
+import csv
+import json
+import os
+import pytest
+from bulk_import import BulkExporter
+
+COURSE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "course.json")
+
+
+def read_files(directory):
+    contents = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'rb') as f:
+            contents[name] = f.read()
+    return contents
+
+
+def export(directory, shard_rows=4):
+    exporter = BulkExporter(str(directory), shard_rows=shard_rows, max_workers=2)
+    return exporter, exporter.export([COURSE_FILE])
+
+
+def test_expected_counts():
+    # The repeated chapter is one node; the two ETL流程 topics are in different chapters
+    assert BulkExporter.expected_counts([COURSE_FILE]) == {
+        "Course": 1, "Chapter": 2, "Topic": 5, "Resource": 5, "CONTAINS": 7, "HAS_RESOURCE": 5,
+    }
+
+
+def test_export_matches_course_data(tmp_path):
+    exporter, manifest = export(tmp_path)
+    assert manifest["shards"] > 1
+    assert manifest["nodes"] == {"Course": 1, "Chapter": 2, "Topic": 5, "Resource": 5}
+    assert manifest["relationships"] == {"CONTAINS": 7, "HAS_RESOURCE": 5}
+    assert exporter.validate([COURSE_FILE]) == []
+    with open(os.path.join(tmp_path, "manifest.json"), encoding='utf-8') as f:
+        assert json.load(f)["command"] == manifest["command"]
+
+
+def test_export_is_deterministic(tmp_path):
+    export(tmp_path / "a")
+    export(tmp_path / "b")
+    first, second = read_files(tmp_path / "a"), read_files(tmp_path / "b")
+    first.pop("manifest.json"), second.pop("manifest.json")
+    assert first == second
+    # Exporting again into the same directory produces the same files
+    export(tmp_path / "a")
+    assert {name: data for name, data in read_files(tmp_path / "a").items() if name != "manifest.json"} == first
+
+
+def test_validate_reports_broken_shards(tmp_path):
+    exporter, manifest = export(tmp_path)
+    topic_shard = manifest["files"]["Topic"][0]
+    with open(topic_shard, 'a', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerow(["only-an-id"])
+    problems = exporter.validate([COURSE_FILE])
+    assert any("1 fields" in problem for problem in problems)
+    assert any(problem.startswith("Topic: ") for problem in problems)
+
+
+def test_reexport_removes_only_exported_files(tmp_path):
+    exporter, manifest = export(tmp_path, shard_rows=2)
+    notes = tmp_path / "notes.txt"
+    notes.write_text("keep me", encoding='utf-8')
+    export(tmp_path, shard_rows=1000)
+    assert notes.read_text(encoding='utf-8') == "keep me"
+    leftovers = set(path for paths in manifest["files"].values() for path in paths) - set(
+        path for paths in exporter.load_manifest()["files"].values() for path in paths)
+    assert leftovers and not any(os.path.exists(path) for path in leftovers)
+
+
+def test_refuses_non_empty_directory_without_manifest(tmp_path):
+    (tmp_path / "other.csv").write_text("a,b\n", encoding='utf-8')
+    with pytest.raises(ValueError):
+        export(tmp_path)
+    assert (tmp_path / "other.csv").exists()
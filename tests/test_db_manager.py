@@ -0,0 +1,93 @@
+import gzip
+import pandas as pd
+import pytest
+
+pytest.importorskip("mysql.connector")
+import db_manager
+from db_manager import MySQLManager, export_dtypes
+
+# (name, MySQL type code) pairs as in a cursor description: LONG, VAR_STRING, DATETIME
+DESCRIPTION = [("topic_id", 3), ("topic_name", 253), ("score", 3), ("note", 253), ("seen_at", 12)]
+ROWS = [(i, f"知识点{i}", i * 10, None if i % 2 else "x", None) for i in range(7)]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.description = None
+        self.fetches = []
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.description = DESCRIPTION
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        self.fetches.append(len(batch))
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursor_ = FakeCursor(rows)
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, buffered=True):
+        assert not buffered
+        return self.cursor_
+
+
+def manager(rows):
+    db = MySQLManager()
+    db.connection = FakeConnection(rows)
+    return db
+
+
+def test_export_dtypes_prefers_declared_then_sql_type():
+    dtypes = export_dtypes(DESCRIPTION, {"score": "Int16"})
+    assert dtypes == {"topic_id": "Int32", "topic_name": "string", "score": "Int16",
+                      "note": "string", "seen_at": "datetime64[ns]"}
+
+
+def test_parquet_export_in_chunks(tmp_path):
+    pytest.importorskip("pyarrow")
+    db = manager(ROWS)
+    result = db.export_in_chunks("SELECT", str(tmp_path / "topics.parquet"), chunk_size=3)
+    assert (result["rows"], result["chunks"], result["format"]) == (7, 3, "parquet")
+    assert db.connection.cursor_.fetches == [3, 3, 1, 0]
+    assert db.connection.cursor_.closed
+    frame = pd.read_parquet(result["path"])
+    assert frame["topic_id"].tolist() == list(range(7))
+    assert str(frame["topic_id"].dtype) == "Int32"
+    assert str(frame["score"].dtype) == "Int64"
+
+
+def test_csv_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_manager, "pq", None)
+    result = manager(ROWS).export_in_chunks("SELECT", str(tmp_path / "topics.csv.gz"), chunk_size=4)
+    assert (result["rows"], result["chunks"], result["format"]) == (7, 2, "csv")
+    with gzip.open(result["path"], "rt", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "topic_id,topic_name,score,note,seen_at"
+    assert len(lines) == 8
+    assert lines[2] == "1,知识点1,10,,"
+
+
+def test_empty_result_writes_schema_only(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    result = manager([]).export_in_chunks("SELECT", str(tmp_path / "empty.parquet"))
+    assert (result["rows"], result["chunks"]) == (0, 0)
+    frame = pd.read_parquet(result["path"])
+    assert frame.empty
+    assert list(frame.columns) == [column[0] for column in DESCRIPTION]
+    assert str(frame["topic_id"].dtype) == "Int32"
+
+    monkeypatch.setattr(db_manager, "pq", None)
+    result = manager([]).export_in_chunks("SELECT", str(tmp_path / "empty.csv.gz"))
+    with gzip.open(result["path"], "rt", encoding="utf-8") as f:
+        assert f.read().splitlines() == ["topic_id,topic_name,score,note,seen_at"]
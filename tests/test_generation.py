@@ -0,0 +1,136 @@
+import threading
+import pytest
+from generation import AnswerGenerator, StubLanguageModel
+
+
+class BlockingModel(StubLanguageModel):
+    """Stub whose first decode step waits until the test releases it"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.entered = threading.Event()
+
+    def step(self, caches):
+        self.entered.set()
+        self.release.wait(5)
+        return super().step(caches)
+
+
+def test_generate_returns_context():
+    generator = AnswerGenerator(backend=StubLanguageModel())
+    try:
+        assert generator.generate("什么是数据清洗？", context="数据清洗") == "数据清洗"
+    finally:
+        generator.close()
+
+
+def test_concurrent_requests_share_decode_steps():
+    backend = BlockingModel()
+    generator = AnswerGenerator(backend=backend, max_batch_size=8)
+    try:
+        first = generator.submit("问题一", context="第一章")
+        assert backend.entered.wait(5)
+        # These arrive while the first step is running and join the batch at the next step
+        others = [generator.submit(f"问题{i}", context=f"第{i}章内容") for i in range(3)]
+        backend.release.set()
+        assert first.result(5) == "第一章"
+        assert [request.result(5) for request in others] == [f"第{i}章内容" for i in range(3)]
+    finally:
+        generator.close()
+    stats = generator.stats()
+    assert stats["requests"] == 4
+    assert stats["mean_batch_size"] > 1
+    # Longest answer plus its end token, and not one run of steps per request
+    assert backend.steps < sum(len(text) + 1 for text in ["第一章"] + [f"第{i}章内容" for i in range(3)])
+
+
+def test_prefix_cache_reuses_system_prompt_and_context():
+    generator = AnswerGenerator(backend=StubLanguageModel())
+    try:
+        generator.generate("问题一", context="相同内容")
+        generator.generate("问题二", context="相同内容")
+    finally:
+        generator.close()
+    assert generator.prefix_cache.misses == 2
+    assert generator.prefix_cache.hits == 2
+
+
+def test_stream_yields_deltas_in_order():
+    generator = AnswerGenerator(backend=StubLanguageModel())
+    try:
+        deltas = list(generator.stream("问题", context="数据工程"))
+    finally:
+        generator.close()
+    assert deltas == ["数", "据", "工", "程"]
+
+
+def test_max_new_tokens_truncates():
+    generator = AnswerGenerator(backend=StubLanguageModel(), max_new_tokens=2)
+    try:
+        assert generator.generate("问题", context="数据工程") == "数据"
+    finally:
+        generator.close()
+
+
+def test_close_answers_queued_requests():
+    backend = BlockingModel()
+    generator = AnswerGenerator(backend=backend, max_batch_size=1)
+    first = generator.submit("问题一", context="第一章")
+    assert backend.entered.wait(5)
+    queued = [generator.submit(f"问题{i}", context=f"内容{i}") for i in range(3)]
+    closer = threading.Thread(target=generator.close)
+    closer.start()
+    backend.release.set()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert first.result(0) == "第一章"
+    assert [request.result(0) for request in queued] == [f"内容{i}" for i in range(3)]
+
+
+def test_backend_error_fails_the_batch():
+    class FailingModel(StubLanguageModel):
+        def step(self, caches):
+            raise RuntimeError("out of memory")
+
+    generator = AnswerGenerator(backend=FailingModel())
+    try:
+        request = generator.submit("问题", context="内容")
+        with pytest.raises(RuntimeError, match="out of memory"):
+            request.result(5)
+        with pytest.raises(RuntimeError):
+            list(generator.submit("问题", context="内容").stream())
+    finally:
+        generator.close()
+
+
+def tiny_transformers_backend():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from generation import TransformersBackend
+
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(vocab_size=64, n_positions=64, n_embd=32, n_layer=2, n_head=2)
+    backend = TransformersBackend.__new__(TransformersBackend)
+    backend.torch = torch
+    backend.model = transformers.GPT2LMHeadModel(config).eval()
+    backend.eos_token_id = None
+    return backend
+
+
+def test_transformers_step_batches_mixed_lengths():
+    backend = tiny_transformers_backend()
+    caches = [backend.prefill([1, 2, 3, 4, 5, 6]), backend.prefill([7, 8]), backend.prefill([9, 10, 11])]
+    calls = []
+    forward = backend.model.forward
+    backend.model.forward = lambda *args, **kwargs: calls.append(1) or forward(*args, **kwargs)
+    tokens, batched = backend.step(caches)
+    backend.model.forward = forward
+    assert len(calls) == 1
+
+    for cache, token, new_cache in zip(caches, tokens, batched):
+        alone_tokens, [alone] = backend.step([cache])
+        assert alone_tokens == [token]
+        # Padding is stripped again: each cache grows by exactly one position
+        assert new_cache[0][0][0].shape == alone[0][0][0].shape
+        assert backend.torch.allclose(new_cache[1], alone[1], atol=1e-4)
@@ -0,0 +1,25 @@
+import numpy as np
+from graph_analytics import CSRGraph, GraphAnalytics, connected_components, label_propagation, pagerank
+
+
+def test_empty_graph():
+    graph = CSRGraph.from_edges([], [])
+    scores = GraphAnalytics(kg=None).compute(graph)
+    assert all(len(values) == 0 for values in scores.values())
+
+
+def test_nodes_without_edges():
+    graph = CSRGraph.from_edges([], [], node_ids=[7, 3, 5], labels=[0, 1, 2])
+    assert connected_components(graph).tolist() == [0, 1, 2]
+    assert label_propagation(graph).tolist() == [0, 1, 2]
+    assert np.allclose(pagerank(graph), 1 / 3)
+
+
+def test_components_and_communities():
+    # Two separate stars: 1 -> 2, 3 and 10 -> 11, 12
+    graph = CSRGraph.from_edges([1, 1, 10, 10], [2, 3, 11, 12])
+    assert connected_components(graph).tolist() == [0, 0, 0, 1, 1, 1]
+    assert label_propagation(graph).tolist() == [0, 0, 0, 1, 1, 1]
+    scores = GraphAnalytics(kg=None).compute(graph)
+    assert scores["degree"].tolist() == [2, 1, 1, 2, 1, 1]
+    assert scores["pagerank"][0] > scores["pagerank"][1]
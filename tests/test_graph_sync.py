@@ -0,0 +1,150 @@
+import uuid
+from graph_sync import GraphSync, SYNC_TABLES
+from entity_resolution import course_key
+from cypher_templates import CYPHER
+
+LABELS = {spec["table"]: spec for spec in SYNC_TABLES}
+
+
+class FakeGraph:
+    """In-memory stand-in for the sync's Cypher: MERGE on mysql_id, backfill on natural keys"""
+
+    def __init__(self):
+        self.nodes = []
+        self.calls = []
+
+    def create_partition_indexes(self):
+        pass
+
+    def count(self, label):
+        return sum(node["label"] == label for node in self.nodes)
+
+    def find(self, label, **properties):
+        return [node for node in self.nodes
+                if node["label"] == label and all(node.get(k) == v for k, v in properties.items())]
+
+    def build_course(self, name, chapters):
+        """What load_course or a staged promotion leaves behind: fresh nodes without mysql_id"""
+        key = course_key(name)
+        self.nodes = [node for node in self.nodes if node.get("course_key") != key]
+        course = {"label": "Course", "name": name, "course_key": key, "build_version": uuid.uuid4().hex[:16]}
+        self.nodes.append(course)
+        for chapter_name, topics in chapters.items():
+            chapter = {"label": "Chapter", "name": chapter_name, "course_key": key, "parent": course}
+            self.nodes.append(chapter)
+            for topic_name in topics:
+                self.nodes.append({"label": "Topic", "name": topic_name, "course_key": key, "parent": chapter})
+
+    def query(self, name, **params):
+        self.calls.append(name)
+        if name == "course_build_versions":
+            return [{"course_key": node["course_key"], "version": node["build_version"]}
+                    for node in self.find("Course") if node.get("build_version")]
+        table = name.rsplit("_", 1)[-1]
+        if name.startswith("sync_backfill_"):
+            return [{"mapped": sum(self._backfill(LABELS[table], row) for row in params["rows"])}]
+        if name.startswith("sync_upsert_"):
+            for row in params["rows"]:
+                self._upsert(LABELS[table], row)
+        return []
+
+    def _backfill(self, spec, row):
+        for node in self.find(spec["label"], name=row["name"], mysql_id=None):
+            if spec["parent"] is None:
+                if node.get("course_key") == row["course_key"]:
+                    node["mysql_id"] = row["id"]
+                    return 1
+            elif node["parent"].get("mysql_id") == row["parent_id"]:
+                node["mysql_id"] = row["id"]
+                return 1
+        return 0
+
+    def _upsert(self, spec, row):
+        matches = self.find(spec["label"], mysql_id=row["id"])
+        node = matches[0] if matches else {"label": spec["label"], "mysql_id": row["id"]}
+        if not matches:
+            self.nodes.append(node)
+        node.update({prop: row[prop] for prop in spec["properties"]})
+        if spec["parent"] is None:
+            node.setdefault("course_key", row["course_key"])
+            return
+        parents = self.find(spec["parent"][1], mysql_id=row["parent_id"])
+        if not parents:
+            parents = [{"label": spec["parent"][1], "mysql_id": row["parent_id"]}]
+            self.nodes.append(parents[0])
+        node["parent"] = parents[0]
+        node["course_key"] = parents[0].get("course_key")
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.tables = {
+            "courses": [{"course_id": 1, "course_name": "数据工程", "description": None}],
+            "chapters": [{"chapter_id": 10, "course_id": 1, "chapter_name": "第一章", "description": None,
+                          "chapter_order": 1}],
+            "topics": [{"topic_id": 100, "chapter_id": 10, "topic_name": "数据清洗", "description": None},
+                       {"topic_id": 101, "chapter_id": 10, "topic_name": "数据集成", "description": None}],
+            "resources": [],
+        }
+        for rows in self.tables.values():
+            for row in rows:
+                row["updated_at"] = "2026-01-01 00:00:00"
+
+    def fetch_changed_rows(self, table, since_updated_at=None, since_id=0, limit=1000, lag_seconds=1.0,
+                           course_id=None):
+        key = LABELS[table]["key"]
+        rows = sorted(self.tables[table], key=lambda row: (row["updated_at"], row[key]))
+        if since_updated_at is not None:
+            rows = [row for row in rows if (row["updated_at"], row[key]) > (since_updated_at, since_id)]
+        return [dict(row) for row in rows[:limit]]
+
+    def fetch_tombstones(self, since_id=0, limit=1000):
+        return []
+
+
+def build(graph):
+    graph.build_course("数据工程", {"第一章": ["数据清洗", "数据集成"]})
+
+
+def test_first_sync_maps_nodes_built_from_json(tmp_path):
+    graph, database = FakeGraph(), FakeDatabase()
+    build(graph)
+    GraphSync(database, graph, checkpoint_file=str(tmp_path / "sync.json")).run_once()
+    assert (graph.count("Course"), graph.count("Chapter"), graph.count("Topic")) == (1, 1, 2)
+    assert graph.find("Topic", name="数据清洗")[0]["mysql_id"] == 100
+
+
+def test_backfill_runs_once_per_build(tmp_path):
+    graph, database = FakeGraph(), FakeDatabase()
+    build(graph)
+    GraphSync(database, graph, checkpoint_file=str(tmp_path / "sync.json")).run_once()
+    graph.calls.clear()
+    GraphSync(database, graph, checkpoint_file=str(tmp_path / "sync.json")).run_once()
+    assert not [name for name in graph.calls if name.startswith("sync_backfill_")]
+
+
+def test_rebuild_then_sync_does_not_duplicate(tmp_path):
+    graph, database = FakeGraph(), FakeDatabase()
+    build(graph)
+    sync = GraphSync(database, graph, checkpoint_file=str(tmp_path / "sync.json"))
+    sync.run_once()
+    # The partition is rebuilt from JSON, then a topic changes in MySQL
+    build(graph)
+    database.tables["topics"][0].update(topic_name="数据清洗", description="新描述", updated_at="2026-01-02 00:00:00")
+    sync.run_once()
+    assert (graph.count("Course"), graph.count("Chapter"), graph.count("Topic")) == (1, 1, 2)
+    assert graph.find("Topic", mysql_id=100)[0]["description"] == "新描述"
+    assert all(node.get("mysql_id") for node in graph.nodes)
+
+
+def test_templates_match_sync_tables():
+    for spec in SYNC_TABLES:
+        upsert = CYPHER[f"sync_upsert_{spec['table']}"].query
+        assert f"MERGE (n:{spec['label']} {{mysql_id: row.id}})" in upsert
+        assert all(f"n.{prop} = row.{prop}" in upsert for prop in spec["properties"])
+        if spec["parent"] is not None:
+            _, parent_label, rel_type = spec["parent"]
+            assert f"MERGE (p:{parent_label} {{mysql_id: row.parent_id}})" in upsert
+            assert f"MERGE (p)-[:{rel_type}]->(n)" in upsert
+        assert f"(n:{spec['label']} " in CYPHER[f"sync_backfill_{spec['table']}"].query
+        assert f"MATCH (n:{spec['label']} {{mysql_id: id}})" in CYPHER[f"sync_delete_{spec['table']}"].query
@@ -0,0 +1,47 @@
+import pytest
+from information_extraction import InformationExtractor
+
+TEXT = """课程名称：智能数据工程
+课程描述：数据工程入门
+
+第1章 数据采集：采集方法
+1.1 网络爬虫：抓取网页
+资源：爬虫教程 类型：视频 链接：http://example.com/crawl
+知识点 网络爬虫 有 资源 爬虫教程
+
+第2章 数据清洗：清洗方法
+2.1 缺失值处理：填补缺失值
+课程 智能数据工程 包含 章节 数据清洗
+章节 数据清洗 包含 知识点 缺失值处理
+"""
+
+
+@pytest.fixture
+def extractor():
+    extractor = InformationExtractor()
+    extractor.process_text(TEXT)
+    return extractor
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz"])
+def test_jsonl_round_trip_matches_json(extractor, tmp_path, suffix):
+    extractor.save_extracted_data(str(tmp_path / "extracted.json"))
+    extractor.save_extracted_data(str(tmp_path / f"extracted{suffix}"))
+    from_json = InformationExtractor().load_extracted_data(str(tmp_path / "extracted.json"))
+    from_jsonl = InformationExtractor().load_extracted_data(str(tmp_path / f"extracted{suffix}"))
+    assert from_jsonl == from_json == extractor.as_dict()
+    assert type(from_jsonl["entities"]["Topic"][0]) is dict
+    assert type(from_jsonl["relationships"][0]) is dict
+
+
+def test_loaded_records_merge_with_new_text(extractor, tmp_path):
+    path = str(tmp_path / "extracted.jsonl")
+    extractor.save_extracted_data(path)
+    loaded = InformationExtractor()
+    loaded.load_extracted_data(path)
+    loaded.process_text(TEXT)
+    assert loaded.as_dict() == extractor.as_dict()
+
+
+def test_missing_file(tmp_path):
+    assert InformationExtractor().load_extracted_data(str(tmp_path / "missing.jsonl")) is None
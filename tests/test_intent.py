@@ -0,0 +1,39 @@
+import os
+import pytest
+from data_generator import DataEngineeringDataGenerator
+from intent import IntentClassifier, classifier_from_course_data, evaluate, load_eval_set
+
+
+@pytest.fixture
+def classifier():
+    classifier = IntentClassifier()
+    classifier.add_entities("chapter", ["数据采集与预处理", "数据存储与管理"])
+    classifier.add_entities("topic", ["数据清洗技术", "ETL流程"])
+    return classifier.compile()
+
+
+def test_named_entities(classifier):
+    result = classifier.classify("数据清洗技术有哪些学习资源？")
+    assert result.intent == "resources_of_topic"
+    assert result.entities["topic"] == ["数据清洗技术"]
+
+
+def test_follow_up_uses_remembered_entity(classifier):
+    result = classifier.classify("这一章有哪些知识点？", {"chapter": "数据采集与预处理"})
+    assert result.intent == "topics_of_chapter"
+    assert result.entities["chapter"] == ["数据采集与预处理"]
+    assert result.remembered == {"chapter"}
+
+
+@pytest.mark.parametrize("question", ["你好", "天气怎么样"])
+def test_remembered_entity_alone_does_not_decide(classifier, question):
+    context = {"chapter": "数据采集与预处理", "topic": "ETL流程"}
+    assert classifier.classify(question, context).intent == "keyword_search"
+
+
+def test_labelled_question_set():
+    classifier = classifier_from_course_data(DataEngineeringDataGenerator().generate_course_data())
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "intent_eval.jsonl")
+    report = evaluate(classifier, load_eval_set(path), repeat=1)
+    assert report["accuracy"] == 1.0
+    assert report["entity_accuracy"] == 1.0
@@ -0,0 +1,100 @@
+import pytest
+import knowledge_graph
+from cypher_templates import CYPHER
+from knowledge_graph import KnowledgeGraph
+
+TEMPLATE_NAMES = {template.query: template.name for template in CYPHER}
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+
+class FakeGraph:
+    """py2neo Graph stand-in that answers registered templates by name"""
+
+    def __init__(self, uri=None, auth=None):
+        self.calls = []
+        self.answers = {}
+        self.committed = []
+        self.rolled_back = []
+        self.fail_on = None
+
+    def run(self, query, **params):
+        name = TEMPLATE_NAMES.get(query, query)
+        self.calls.append((name, params))
+        if name == self.fail_on:
+            raise RuntimeError("write failed")
+        return Result(self.answers.get(name, []))
+
+    def begin(self):
+        return Transaction(self)
+
+    def commit(self, tx):
+        self.committed.append(tx)
+
+    def rollback(self, tx):
+        self.rolled_back.append(tx)
+
+
+class Transaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, query, **params):
+        return self.graph.run(query, **params)
+
+
+@pytest.fixture
+def kg(monkeypatch):
+    monkeypatch.setattr(knowledge_graph, "Graph", FakeGraph)
+    return KnowledgeGraph()
+
+
+COURSE = {
+    "course": {"name": "智能数据工程", "description": "入门"},
+    "chapters": [{"name": "数据采集", "order": 1, "topics": [{"name": "网络爬虫", "resources": [
+        {"name": "爬虫教程", "type": "视频", "url": "http://example.com"}]}]}],
+}
+
+
+def test_load_course_runs_in_one_transaction(kg):
+    key = kg.load_course(COURSE)
+    names = [name for name, _ in kg.g.calls]
+    assert names == ["delete_course", "load_course", "load_chapters", "load_topics", "load_resources"]
+    assert all(params["course_key"] == key for _, params in kg.g.calls)
+    assert len(kg.g.committed) == 1 and not kg.g.rolled_back
+
+
+def test_load_course_rolls_back_on_failure(kg):
+    kg.g.fail_on = "load_topics"
+    with pytest.raises(RuntimeError):
+        kg.load_course(COURSE)
+    assert len(kg.g.rolled_back) == 1
+    assert not kg.g.committed
+
+
+def test_partition_indexes_include_course_key_alone(kg):
+    kg.create_partition_indexes()
+    names = [name for name, _ in kg.g.calls]
+    for label in ("course", "chapter", "topic", "resource"):
+        assert f"partition_key_index_{label}" in names
+        assert "ON (n.course_key)\n" in CYPHER[f"partition_key_index_{label}"].query
+
+
+def test_migrate_unkeyed_nodes(kg):
+    kg.g.answers = {
+        "list_courses": [{"course_key": "existing", "course_name": "已有课程", "course_description": None}],
+        "unkeyed_courses": [{"id": 1, "name": "智能数据工程"}, {"id": 2, "name": "智能数据工程"}],
+        "key_unkeyed_course": [{"keyed": 5}],
+        "delete_unkeyed_nodes": [{"deleted": 3}],
+    }
+    summary = kg.migrate_unkeyed_nodes()
+    assert summary == {"keyed_courses": 1, "keyed_nodes": 5, "duplicate_courses": 1, "orphans_deleted": 3}
+    keyed = [params for name, params in kg.g.calls if name == "key_unkeyed_course"]
+    assert keyed == [{"id": 1, "course_key": knowledge_graph.make_course_key("智能数据工程")}]
+    assert [params for name, params in kg.g.calls if name == "delete_unkeyed_course"] == [{"id": 2}]
@@ -0,0 +1,150 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from link_checker import LinkChecker
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.2)
+            if self.path == "/missing":
+                self.send_error(404)
+                return
+            if self.path == "/cached" and self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = (b"<html><head><title>  \xe6\x95\xb0\xe6\x8d\xae &amp; \xe5\xb7\xa5\xe7\xa8\x8b </title>"
+                    b"</head><body>" + b"x" * 200000 + b"</body></html>")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except ConnectionError:
+                pass
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.in_flight = 0
+    httpd.max_in_flight = 0
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    httpd.base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def checker(tmp_path):
+    return LinkChecker(cache_file=str(tmp_path / "links.json"), timeout=5.0)
+
+
+def test_page_title_and_size(server, checker):
+    url = server.base + "/page"
+    entry = checker.check_urls([url])[url]
+    assert entry["status"] == 200
+    assert entry["ok"]
+    assert entry["title"] == "数据 & 工程"
+    assert entry["size"] > 200000
+
+
+def test_not_found(server, checker):
+    url = server.base + "/missing"
+    entry = checker.check_urls([url])[url]
+    assert entry["status"] == 404
+    assert not entry["ok"]
+
+
+def test_connection_refused(checker):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    url = f"http://127.0.0.1:{port}/"
+    entry = checker.check_urls([url])[url]
+    assert entry["status"] is None
+    assert entry["error"]
+    assert not entry["ok"]
+
+
+def test_fresh_entries_skip_the_request(server, checker):
+    url = server.base + "/page"
+    checker.check_urls([url])
+    checker.check_urls([url])
+    assert server.requests == ["/page"]
+
+
+def test_revalidation_with_etag(server, tmp_path):
+    url = server.base + "/cached"
+    LinkChecker(cache_file=str(tmp_path / "links.json")).check_urls([url])
+    # A new checker reads the saved cache; max_age=0 forces a conditional request
+    entry = LinkChecker(cache_file=str(tmp_path / "links.json"), max_age=0).check_urls([url])[url]
+    assert server.requests == ["/cached", "/cached"]
+    assert entry["not_modified"]
+    assert entry["status"] == 200
+    assert entry["title"] == "数据 & 工程"
+
+
+def test_per_host_limit(server, tmp_path):
+    checker = LinkChecker(cache_file=str(tmp_path / "links.json"), max_concurrency=8, per_host=2)
+    results = checker.check_urls([f"{server.base}/slow{i}" for i in range(6)])
+    assert all(entry["ok"] for entry in results.values())
+    assert server.max_in_flight == 2
+
+
+def test_check_graph_writes_back_to_graph_and_mysql(server, checker):
+    class Graph:
+        def __init__(self):
+            self.writes = []
+
+        def query(self, name, **params):
+            if name == "linkcheck_urls":
+                return [{"url": server.base + "/page"}]
+            self.writes.extend(params["rows"])
+            return []
+
+    class Database:
+        def __init__(self):
+            self.updates = []
+            self.migrated = False
+
+        def get_resource_urls(self):
+            return [server.base + "/missing", server.base + "/page"]
+
+        def enable_link_status(self):
+            self.migrated = True
+
+        def update_link_status(self, rows):
+            self.updates.extend(rows)
+
+    graph, database = Graph(), Database()
+    checker.check_graph(graph, database)
+    assert sorted(row["url"] for row in graph.writes) == [server.base + "/missing", server.base + "/page"]
+    assert database.migrated
+    assert {row[-1]: (row[0], row[1]) for row in database.updates} == {
+        server.base + "/missing": (404, False),
+        server.base + "/page": (200, True),
+    }
@@ -0,0 +1,80 @@
+import threading
+import time
+import pytest
+from pipeline import PipelineScheduler
+
+
+def make_scheduler(tmp_path):
+    return PipelineScheduler(state_file=str(tmp_path / "state.json"))
+
+
+def test_stages_run_after_their_dependencies(tmp_path):
+    order = []
+    lock = threading.Lock()
+
+    def stage(name, delay=0.0):
+        def run(context):
+            time.sleep(delay)
+            with lock:
+                order.append(name)
+            return name
+        return run
+
+    scheduler = make_scheduler(tmp_path)
+    scheduler.add_stage("generate", stage("generate", 0.05))
+    scheduler.add_stage("build", stage("build"), deps=["generate"])
+    scheduler.add_stage("populate", stage("populate"), deps=["generate", "setup"])
+    scheduler.add_stage("setup", stage("setup"))
+    status = scheduler.run()
+    assert set(status.values()) == {"done"}
+    assert order.index("generate") < order.index("build")
+    assert order.index("generate") < order.index("populate")
+    assert order.index("setup") < order.index("populate")
+
+
+def test_unchanged_inputs_are_skipped(tmp_path):
+    source = tmp_path / "course.json"
+    source.write_text("{}", encoding='utf-8')
+    runs = []
+
+    def scheduler():
+        scheduler = make_scheduler(tmp_path)
+        scheduler.add_stage("build", lambda context: runs.append("build") or True, inputs=[str(source)])
+        return scheduler
+
+    assert scheduler().run() == {"build": "done"}
+    assert scheduler().run() == {"build": "skipped"}
+    source.write_text('{"changed": true}', encoding='utf-8')
+    assert scheduler().run() == {"build": "done"}
+    assert scheduler().run(force=True) == {"build": "done"}
+    assert len(runs) == 3
+
+
+def test_failed_stage_is_not_checkpointed(tmp_path):
+    source = tmp_path / "course.json"
+    source.write_text("{}", encoding='utf-8')
+
+    def failing(context):
+        raise RuntimeError("Neo4j is down")
+
+    for func in (failing, lambda context: False):
+        scheduler = make_scheduler(tmp_path)
+        scheduler.add_stage("build", func, inputs=[str(source)])
+        scheduler.add_stage("analyse", lambda context: True, deps=["build"])
+        assert scheduler.run() == {"build": "failed", "analyse": "blocked"}
+
+    scheduler = make_scheduler(tmp_path)
+    scheduler.add_stage("build", lambda context: True, inputs=[str(source)])
+    assert scheduler.run() == {"build": "done"}
+
+
+def test_cycles_and_unknown_dependencies_are_rejected(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    scheduler.add_stage("a", lambda context: True, deps=["b"])
+    scheduler.add_stage("b", lambda context: True, deps=["a"])
+    with pytest.raises(ValueError, match="cycle"):
+        scheduler.run()
+    scheduler = make_scheduler(tmp_path)
+    scheduler.add_stage("a", lambda context: True, deps=["missing"])
+    with pytest.raises(ValueError, match="unknown"):
+        scheduler.run()
@@ -0,0 +1,91 @@
+import pytest
+from qa_server import GraphSnapshot, SessionManager
+from reachability import HierarchyIndex
+from text_index import InvertedIndex
+
+
+class SourceGraph:
+    """Stands in for the KnowledgeGraph a snapshot is loaded from"""
+
+    def __init__(self, courses=(), course_key=None):
+        self.courses = list(courses)
+        self.course_key = course_key
+        self.scopes = []
+
+    def list_courses(self):
+        return self.courses
+
+    def query_course_info(self, course_key=None):
+        self.scopes.append(course_key)
+        return {"course_name": "智能数据工程", "course_description": "数据工程课程"}
+
+    def query_chapters(self, course_key=None):
+        self.scopes.append(course_key)
+        return [{"chapter_name": "数据采集", "chapter_description": "采集", "chapter_order": 1}]
+
+    def query_topics_by_chapters(self, chapter_names, course_key=None):
+        self.scopes.append(course_key)
+        return {"数据采集": [{"topic_name": "数据清洗", "topic_description": "清洗脏数据"}]}
+
+    def query_resources_by_topics(self, topic_names, course_key=None):
+        self.scopes.append(course_key)
+        return {"数据清洗": [{"resource_name": "清洗教程", "resource_type": "视频", "resource_url": "http://x"}]}
+
+    def build_text_index(self, course_key=None):
+        self.scopes.append(course_key)
+        return InvertedIndex()
+
+    def build_hierarchy_index(self, course_key=None):
+        self.scopes.append(course_key)
+        hierarchy = HierarchyIndex()
+        hierarchy.add_node(1, "Course", None, "智能数据工程")
+        hierarchy.add_node(2, "Chapter", 1, "数据采集")
+        hierarchy.add_node(3, "Topic", None, "数据清洗")
+        hierarchy.add_edge(1, 2)
+        hierarchy.add_edge(2, 3)
+        return hierarchy
+
+
+def test_snapshot_uses_the_only_course():
+    source = SourceGraph([{"course_key": "k1", "course_name": "智能数据工程", "course_description": ""}])
+    snapshot = GraphSnapshot(source)
+    assert snapshot.course_key == "k1"
+    assert set(source.scopes) == {"k1"}
+    assert "清洗教程" in snapshot.answer_question("数据清洗有哪些学习资源？")
+
+
+def test_snapshot_needs_a_course_when_there_are_several():
+    with pytest.raises(ValueError):
+        GraphSnapshot(SourceGraph([{"course_key": "k1"}, {"course_key": "k2"}]))
+    assert GraphSnapshot(SourceGraph([{"course_key": "k1"}, {"course_key": "k2"}], "k2")).course_key == "k2"
+
+
+def test_snapshot_never_queries_neo4j():
+    snapshot = GraphSnapshot(SourceGraph(course_key="k1"))
+    assert snapshot.g is None
+    with pytest.raises(RuntimeError):
+        snapshot.query("list_courses")
+    with pytest.raises(RuntimeError):
+        snapshot.run_cypher("any", "MATCH (n) RETURN n")
+
+
+def test_sessions_keep_their_own_context():
+    manager = SessionManager(SourceGraph(course_key="k1"))
+    first = manager.ask("数据采集有哪些知识点？")
+    assert "数据清洗" in first["answer"]
+    follow_up = manager.ask("这一章有哪些知识点？", first["session"])
+    assert follow_up["chapter"] == "数据采集"
+    assert "数据清洗" in follow_up["answer"]
+    other = manager.ask("你好")
+    assert other["session"] != first["session"]
+    assert other["chapter"] is None
+
+
+def test_max_sessions_evicts_the_least_recently_used():
+    manager = SessionManager(SourceGraph(course_key="k1"), max_sessions=2)
+    first = manager.ask("你好")["session"]
+    second = manager.ask("你好")["session"]
+    manager.ask("你好", first)
+    third = manager.ask("你好")["session"]
+    assert list(manager.sessions) == [first, third]
+    assert second not in manager.sessions
@@ -0,0 +1,89 @@
+import json
+import tracemalloc
+import pytest
+from records import StringPool, TopicRecord, RelationshipRecord, make_record
+from information_extraction import InformationExtractor
+
+
+def fresh(text):
+    # A new str object with the same value, as each regex match produces
+    return "".join(list(text))
+
+
+def test_pool_shares_repeated_strings():
+    pool = StringPool()
+    first = make_record("Topic", pool, name=fresh("数据清洗"), chapter=fresh("第一章"), description=fresh("描述"))
+    second = make_record("Topic", pool, name=fresh("数据清洗"), chapter=fresh("第一章"), description=fresh("描述"))
+    assert first["name"] is second["name"]
+    assert first["chapter"] is second["chapter"]
+    # Free text is not pooled
+    assert first["description"] is not second["description"]
+    assert len(pool) == 2
+
+
+def test_pool_applies_to_later_assignment():
+    pool = StringPool()
+    first = make_record("Resource", pool, name="视频", topic=fresh("数据清洗"))
+    second = make_record("Resource", pool, name="文档")
+    second["topic"] = fresh("数据清洗")
+    assert second["topic"] is first["topic"]
+
+
+def test_record_behaves_like_a_dict():
+    record = TopicRecord(name="数据清洗", number="1.1")
+    assert record["name"] == "数据清洗"
+    assert record.get("chapter") is None
+    assert "chapter" not in record
+    assert dict(record.items()) == {"name": "数据清洗", "number": "1.1"}
+    del record["number"]
+    assert len(record) == 1
+    with pytest.raises(KeyError):
+        record["number"]
+    with pytest.raises(KeyError):
+        record["url"] = "x"
+    with pytest.raises(TypeError):
+        make_record("Chapter", url="x")
+
+
+def test_to_dict_is_plain_and_serialisable():
+    relationship = RelationshipRecord(source="课程", target="第一章", type="CONTAINS")
+    data = relationship.to_dict()
+    assert type(data) is dict
+    assert data == {"source": "课程", "target": "第一章", "type": "CONTAINS"}
+    assert json.loads(json.dumps(TopicRecord(name="数据清洗").to_dict())) == {"name": "数据清洗"}
+
+
+def test_process_methods_do_not_copy():
+    extractor = InformationExtractor()
+    assert extractor.process_text("课程名称：数据工程\n课程描述：入门\n") is None
+    assert extractor.as_dict()["entities"]["Course"] == [{"id": extractor.entities["Course"][0]["id"],
+                                                         "name": "数据工程", "description": "入门"}]
+
+
+def measure(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = build()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return size / len(kept)
+
+
+def test_records_use_much_less_memory_than_dicts():
+    count = 20000
+    names = [f"知识点{i % 200}" for i in range(count)]
+
+    def dicts():
+        return [{"name": fresh(name), "number": fresh(f"{i % 50}.{i % 200}"), "chapter": fresh(f"第{i % 50}章"),
+                 "description": "描述"} for i, name in enumerate(names)]
+
+    def records():
+        pool = StringPool()
+        return [make_record("Topic", pool, name=fresh(name), number=fresh(f"{i % 50}.{i % 200}"),
+                            chapter=fresh(f"第{i % 50}章"), description="描述") for i, name in enumerate(names)]
+
+    # README: about 424 vs 181 bytes per record
+    assert measure(records) < 0.6 * measure(dicts)
@@ -0,0 +1,188 @@
+import json
+import pytest
+from staged_build import StagedBuild, STAGED_LABELS
+from entity_resolution import course_key
+from cypher_templates import CYPHER
+
+STAGED = {staged: live for live, (staged, _, _) in STAGED_LABELS.items()}
+PLURALS = {"chapters": "Chapter", "topics": "Topic", "resources": "Resource"}
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FakeGraph:
+    """In-memory stand-in for the Cypher a staged build runs, one node dict per node"""
+
+    def __init__(self):
+        self.nodes = []
+        self.calls = []
+        self.fail_at = None
+
+    def create_partition_indexes(self):
+        pass
+
+    def reset_indexes(self):
+        pass
+
+    def live(self, label, key):
+        return sorted(node["name"] for node in self.nodes if node["label"] == label and node["course_key"] == key)
+
+    def _check(self, name):
+        self.calls.append(name)
+        if self.fail_at and self.fail_at[0] == name:
+            self.fail_at[1] -= 1
+            if self.fail_at[1] < 0:
+                self.fail_at = None
+                raise Interrupted(name)
+
+    def query(self, name, **params):
+        self._check(name)
+        if name.startswith("promote_"):
+            return self._promote(name, **params)
+        if name.startswith("staged_upsert_"):
+            staged = STAGED_LABELS[name[len("staged_upsert_"):].capitalize()][0]
+            for row in params["rows"]:
+                node = next((n for n in self.nodes if n["label"] == staged and n["uid"] == row["uid"]), None)
+                if node is None:
+                    node = {"label": staged, "uid": row["uid"], "parent": row["parent_uid"]}
+                    self.nodes.append(node)
+                node.update(row["properties"], build_version=params["version"])
+        elif name.startswith("staged_clear_"):
+            staged = "Staged" + name[len("staged_clear_"):].capitalize()
+            self.nodes = [n for n in self.nodes if not (
+                n["label"] == staged and n["course_key"] == params["course_key"]
+                and (params["version"] is None or n["build_version"] != params["version"]))]
+        elif name == "staged_live_version":
+            return [{"version": n.get("build_version")} for n in self.nodes
+                    if n["label"] == "Course" and n["course_key"] == params["course_key"]]
+        return []
+
+    def _promote(self, name, course_key, version, limit):
+        if name == "promote_swap_course":
+            staged = [n for n in self.nodes if n["label"] == "StagedCourse" and n["build_version"] == version]
+            if staged:
+                self.nodes = [n for n in self.nodes if not (
+                    n["label"] == "Course" and n["course_key"] == course_key and n.get("build_version") != version)]
+                staged[0]["label"] = "Course"
+            return [{"done": len(staged)}]
+        action, plural = name.split("_")[1:]
+        label = PLURALS[plural]
+        if action == "delete":
+            matched = [n for n in self.nodes if n["label"] == label and n["course_key"] == course_key
+                       and n.get("build_version") != version][:limit]
+            self.nodes = [n for n in self.nodes if n not in matched]
+        else:
+            matched = [n for n in self.nodes if n["label"] == "Staged" + label
+                       and n["build_version"] == version][:limit]
+            for node in matched:
+                node["label"] = label
+        return [{"done": len(matched)}]
+
+
+def course_file(tmp_path, name, chapters):
+    data = {"course": {"name": name, "description": ""},
+            "chapters": [{"name": chapter, "order": i + 1, "description": "",
+                          "topics": [{"name": f"{chapter}-{t}", "description": "", "resources": []}
+                                     for t in range(topics)]}
+                         for i, (chapter, topics) in enumerate(chapters.items())]}
+    path = tmp_path / f"{course_key(name)}.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def graph():
+    graph = FakeGraph()
+    # An earlier build of the course, and another course that must survive
+    key = course_key("数据工程")
+    graph.nodes += [{"label": "Course", "name": "数据工程", "course_key": key},
+                    {"label": "Chapter", "name": "旧章节", "course_key": key},
+                    {"label": "Topic", "name": "旧知识点", "course_key": key},
+                    {"label": "Course", "name": "机器学习", "course_key": course_key("机器学习")},
+                    {"label": "Chapter", "name": "回归", "course_key": course_key("机器学习")}]
+    return graph
+
+
+def test_promote_replaces_only_this_course(graph, tmp_path):
+    path = course_file(tmp_path, "数据工程", {"采集": 3, "清洗": 2})
+    StagedBuild(graph, journal_dir=str(tmp_path), batch_size=2).run(path)
+    key = course_key("数据工程")
+    assert graph.live("Chapter", key) == ["清洗", "采集"]
+    assert len(graph.live("Topic", key)) == 5
+    assert graph.live("Course", key) == ["数据工程"]
+    assert graph.live("Chapter", course_key("机器学习")) == ["回归"]
+    assert not [n for n in graph.nodes if n["label"] in STAGED]
+    # Bounded batches: 5 topics to relabel with batch_size=2 take three statements
+    assert graph.calls.count("promote_relabel_topics") == 3
+
+
+def test_interrupted_staging_resumes_after_last_batch(graph, tmp_path):
+    path = course_file(tmp_path, "数据工程", {"采集": 3, "清洗": 2})
+    graph.fail_at = ["staged_upsert_topic", 1]
+    with pytest.raises(Interrupted):
+        StagedBuild(graph, journal_dir=str(tmp_path), batch_size=2).run(path)
+    assert graph.live("Chapter", course_key("数据工程")) == ["旧章节"]
+    graph.calls.clear()
+    StagedBuild(graph, journal_dir=str(tmp_path), batch_size=2).run(path)
+    # Course, chapters and the first topic batch were committed before the failure
+    assert graph.calls.count("staged_upsert_course") == 0
+    assert graph.calls.count("staged_upsert_topic") == 2
+    assert len(graph.live("Topic", course_key("数据工程"))) == 5
+
+
+def test_interrupted_promotion_resumes(graph, tmp_path):
+    path = course_file(tmp_path, "数据工程", {"采集": 3, "清洗": 2})
+    graph.fail_at = ["promote_relabel_topics", 1]
+    build = StagedBuild(graph, journal_dir=str(tmp_path), batch_size=2)
+    with pytest.raises(Interrupted):
+        build.run(path)
+    journal = json.loads(open(build.journal_path(course_key("数据工程")), encoding="utf-8").read())
+    assert journal["phase"] == "promoting"
+    assert journal["promoted_steps"] == 4
+    graph.calls.clear()
+    StagedBuild(graph, journal_dir=str(tmp_path), batch_size=2).run(path)
+    assert not [name for name in graph.calls if name.startswith(("staged_upsert_", "promote_delete_"))]
+    key = course_key("数据工程")
+    assert graph.live("Chapter", key) == ["清洗", "采集"]
+    assert len(graph.live("Topic", key)) == 5
+    assert not [n for n in graph.nodes if n["label"] in STAGED]
+
+
+def test_rerun_checks_the_live_version(graph, tmp_path):
+    path = course_file(tmp_path, "数据工程", {"采集": 1})
+    StagedBuild(graph, journal_dir=str(tmp_path)).run(path)
+    graph.calls.clear()
+    StagedBuild(graph, journal_dir=str(tmp_path)).run(path)
+    assert graph.calls == ["staged_live_version"]
+    # Someone reloads the course another way: the next run builds it again
+    for node in graph.nodes:
+        if node["label"] == "Course":
+            node["build_version"] = "other"
+    graph.calls.clear()
+    StagedBuild(graph, journal_dir=str(tmp_path)).run(path)
+    assert "promote_swap_course" in graph.calls
+    assert graph.live("Course", course_key("数据工程")) == ["数据工程"]
+
+
+def test_journals_are_per_course(graph, tmp_path):
+    first = course_file(tmp_path, "数据工程", {"采集": 1})
+    second = course_file(tmp_path, "机器学习", {"分类": 1})
+    build = StagedBuild(graph, journal_dir=str(tmp_path))
+    build.run(first)
+    build.run(second)
+    graph.calls.clear()
+    build.run(first)
+    assert graph.calls == ["staged_live_version"]
+    assert graph.live("Chapter", course_key("数据工程")) == ["采集"]
+    assert graph.live("Chapter", course_key("机器学习")) == ["分类"]
+
+
+def test_templates_match_staged_labels():
+    for label, (staged_label, parent_label, rel_type) in STAGED_LABELS.items():
+        upsert = CYPHER[f"staged_upsert_{label.lower()}"].query
+        assert f"MERGE (n:{staged_label} {{uid: row.uid}})" in upsert
+        if parent_label is not None:
+            assert f"MATCH (p:{parent_label} {{uid: row.parent_uid}})" in upsert
+            assert f"MERGE (p)-[:{rel_type}]->(n)" in upsert
@@ -0,0 +1,25 @@
+from text_loader import TextReader
+
+
+def write(tmp_path, data):
+    path = tmp_path / "chapter.txt"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_malformed_runs_are_one_region_each(tmp_path):
+    path = write(tmp_path, "数据工程".encode("utf-8") + b"ok\xff\xfe\xfdok" * 5)
+    with TextReader(path, encoding="utf-8") as reader:
+        text = "".join(reader.chunks())
+    assert reader.malformed_count == 5
+    assert [region["offset"] for region in reader.malformed] == [14, 21, 28, 35, 42]
+    assert all(region["length"] == 3 for region in reader.malformed)
+    assert text.startswith("数据工程ok")
+
+
+def test_count_is_exact_past_max_recorded(tmp_path):
+    path = write(tmp_path, b"ok\xff\xfe\xfdok" * 5)
+    with TextReader(path, encoding="utf-8", max_recorded=1) as reader:
+        "".join(reader.chunks())
+    assert reader.malformed_count == 5
+    assert reader.malformed == [{"offset": 2, "length": 3, "bytes": "fffefd"}]
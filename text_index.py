@@ -0,0 +1,103 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+# Latin words and digits are kept whole; CJK runs are split into character n-grams
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*|[一-鿿]+")
+
+# Question words that would otherwise match almost every description
+STOPWORDS = {
+    "哪里", "哪些", "什么", "怎么", "如何", "哪个", "讲到", "提到", "介绍", "关于", "一下", "可以", "有没有",
+    "的", "了", "是", "在", "有", "和", "与", "吗", "呢", "哪", "里", "讲", "到", "么", "请", "我", "你",
+}
+
+
+def tokenize(text, ngram=2, query=False):
+    """Split text into index terms
+
+    Latin tokens are lower-cased words; each run of CJK characters yields its
+    single characters plus all `ngram`-character windows, which matches
+    Chinese words without a dictionary segmenter. With `query` set, runs of
+    two or more characters yield only their windows: single characters
+    match nearly every Chinese description and would make any question a hit.
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token[0] < "一":
+            terms.append(token.rstrip("."))
+            continue
+        if not query or len(token) == 1:
+            terms.extend(token)
+        for size in range(2, ngram + 1):
+            terms.extend(token[i:i + size] for i in range(len(token) - size + 1))
+    return [term for term in terms if term not in STOPWORDS]
+
+
+class InvertedIndex:
+    def __init__(self, k1=1.5, b=0.75, ngram=2):
+        """BM25-ranked inverted index that supports adding, updating and removing documents"""
+        self.k1 = k1
+        self.b = b
+        self.ngram = ngram
+        # term -> {doc_id: term frequency}
+        self.postings = defaultdict(dict)
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.payloads = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def add_document(self, doc_id, text, payload=None):
+        """Index `text` under `doc_id`, replacing any previous version of the document"""
+        if doc_id in self.doc_lengths:
+            self.remove_document(doc_id)
+        terms = Counter(tokenize(text, self.ngram))
+        for term, frequency in terms.items():
+            self.postings[term][doc_id] = frequency
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.doc_terms[doc_id] = tuple(terms)
+        self.payloads[doc_id] = payload
+        self._total_length += length
+
+    def update_document(self, doc_id, text, payload=None):
+        """Alias of `add_document`, for readability at call sites that modify existing nodes"""
+        self.add_document(doc_id, text, payload)
+
+    def remove_document(self, doc_id):
+        """Drop a document; unknown ids are ignored"""
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return False
+        self._total_length -= length
+        self.payloads.pop(doc_id, None)
+        for term in self.doc_terms.pop(doc_id):
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        return True
+
+    def search(self, query, k=5):
+        """Return up to `k` `(doc_id, score, payload)` tuples ranked by BM25"""
+        if not self.doc_lengths:
+            return []
+        doc_count = len(self.doc_lengths)
+        average_length = self._total_length / doc_count or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query, self.ngram, query=True)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, frequency in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(doc_id, score, self.payloads[doc_id]) for doc_id, score in best]
@@ -0,0 +1,183 @@
+import codecs
+import os
+import threading
+from instrumentation import metrics, log_verbose
+
+# gb18030 is a superset of gbk and gb2312, so one attempt covers all three
+CANDIDATE_ENCODINGS = ("utf-8", "gb18030", "big5")
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+TEXT_SUFFIXES = (".txt", ".md", ".json")
+
+_ERROR_HANDLER = "kg-record-malformed"
+_active = threading.local()
+
+
+def _record_malformed(error):
+    """Codec error handler: report the bad bytes to the reader decoding on this thread"""
+    _active.reader._malformed(error)
+    return "\ufffd", error.end
+
+
+codecs.register_error(_ERROR_HANDLER, _record_malformed)
+
+
+class _ErrorCounter:
+    def __init__(self):
+        self.count = 0
+
+    def _malformed(self, error):
+        self.count += 1
+
+
+def _count_errors(sample, encoding):
+    """Decoding errors in a sample; a multibyte character cut off at its end does not count"""
+    counter = _ErrorCounter()
+    _active.reader = counter
+    try:
+        codecs.getincrementaldecoder(encoding)(_ERROR_HANDLER).decode(sample, False)
+    finally:
+        _active.reader = None
+    return counter.count
+
+
+def detect_encoding(sample, candidates=CANDIDATE_ENCODINGS):
+    """Guess the encoding of a byte sample: BOM first, then the candidate with fewest errors
+
+    Candidates are tried in order and the first one that decodes the whole
+    sample cleanly wins, so pure ASCII comes out as UTF-8.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    best, best_errors = candidates[0], None
+    for encoding in candidates:
+        errors = _count_errors(sample, encoding)
+        if errors == 0:
+            return encoding
+        if best_errors is None or errors < best_errors:
+            best, best_errors = encoding, errors
+    return best
+
+
+class TextReader:
+    def __init__(self, path, encoding=None, sample_size=64 * 1024, chunk_size=1 << 20,
+                 candidates=CANDIDATE_ENCODINGS, max_recorded=100):
+        """Line iterator over a text file of unknown encoding, decoded in one pass
+
+        The encoding is guessed from the first `sample_size` bytes unless
+        given; the sample is then decoded as the first chunk, so the file is
+        read once. Bytes that do not decode are replaced with U+FFFD and
+        their byte offsets collected in `malformed` (the first
+        `max_recorded` of them) instead of aborting the read. Line endings
+        are normalised to "\\n" as in text-mode `open()`.
+        """
+        self.path = path
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size
+        self.max_recorded = max_recorded
+        self.malformed = []
+        self.malformed_count = 0
+        # Latest region, recorded or not, so adjacent pieces merge past max_recorded too
+        self._last_region = None
+        self._file = open(path, 'rb')
+        self._sample = self._file.read(sample_size)
+        self.encoding = encoding or detect_encoding(self._sample, candidates)
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(_ERROR_HANDLER)
+        self._fed = 0
+        self._base = 0
+        log_verbose("Reading %s as %s", path, self.encoding)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _malformed(self, error):
+        offset = self._base + error.start
+        raw = bytes(error.object[error.start:error.end])
+        last = self._last_region
+        # Codecs report a run of bad bytes piecemeal; adjacent pieces form one region
+        if last is not None and last["offset"] + last["length"] == offset:
+            last["length"] += len(raw)
+            last["bytes"] = (last["bytes"] + raw.hex())[:32]
+            return
+        self.malformed_count += 1
+        self._last_region = {"offset": offset, "length": len(raw), "bytes": raw[:16].hex()}
+        if len(self.malformed) < self.max_recorded:
+            self.malformed.append(self._last_region)
+
+    def _decode(self, data, final=False):
+        # The decoder may hold back the start of a split character; offsets are
+        # relative to those pending bytes plus the new data
+        pending = self._decoder.getstate()[0]
+        self._base = self._fed - len(pending)
+        self._fed += len(data)
+        _active.reader = self
+        try:
+            return self._decoder.decode(data, final)
+        finally:
+            _active.reader = None
+
+    def chunks(self):
+        """Decoded text in chunks of about `chunk_size` bytes"""
+        data = self._sample
+        self._sample = b""
+        while data:
+            yield self._decode(data)
+            data = self._file.read(self.chunk_size)
+        tail = self._decode(b"", final=True)
+        if tail:
+            yield tail
+        if self.malformed_count:
+            metrics.increment("text.malformed_regions", self.malformed_count)
+
+    def __iter__(self):
+        carry = ""
+        for text in self.chunks():
+            lines = (carry + text).split("\n")
+            carry = lines.pop()
+            for line in lines:
+                yield (line[:-1] if line.endswith("\r") else line) + "\n"
+        if carry:
+            yield carry
+
+    def read(self):
+        return "".join(self)
+
+    def summary(self):
+        """Encoding and malformed-region report for this file"""
+        return {
+            "path": str(self.path),
+            "encoding": self.encoding,
+            "malformed_count": self.malformed_count,
+            "malformed": self.malformed,
+        }
+
+
+def read_text(path, encoding=None, **kwargs):
+    """Whole text of a file in whatever encoding it uses; malformed bytes are reported, not fatal"""
+    with TextReader(path, encoding, **kwargs) as reader:
+        text = reader.read()
+    if reader.malformed_count:
+        print(f"Warning: {reader.malformed_count} malformed byte regions in {path} "
+              f"(read as {reader.encoding}), first at byte {reader.malformed[0]['offset']}")
+    return text
+
+
+def iter_text_files(folder, suffixes=TEXT_SUFFIXES):
+    """Paths of the text files under a folder, in sorted order"""
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(suffixes):
+                yield os.path.join(root, name)